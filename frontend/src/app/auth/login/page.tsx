@@ -3,6 +3,7 @@
 import { useState } from 'react';
 import { useRouter } from 'next/navigation';
 import Link from 'next/link';
+import { getGuestId, clearGuestId } from '@/lib/cart';
 
 export default function LoginPage() {
   const router = useRouter();
@@ -25,7 +26,8 @@ export default function LoginPage() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(formData)
+        // A guest cart is merged into the user's cart as part of login
+        body: JSON.stringify({ ...formData, guest_id: getGuestId() || undefined })
       });
 
       const data = await response.json();
@@ -39,6 +41,7 @@ export default function LoginPage() {
       localStorage.setItem('user_id', data.user_id);
       localStorage.setItem('user_email', data.email);
       localStorage.setItem('user_type', data.user_type);
+      clearGuestId();
 
       // Redirect based on user type
       if (data.user_type === 'seller') {
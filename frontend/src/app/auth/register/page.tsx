@@ -6,6 +6,7 @@ import Link from 'next/link';
 import { Button } from '@/components/ui/Button';
 import { Input } from '@/components/ui/Input';
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/Card';
+import { getGuestId, clearGuestId } from '@/lib/cart';
 
 export default function CustomerSignUpPage() {
   const router = useRouter();
@@ -44,13 +45,15 @@ export default function CustomerSignUpPage() {
         headers: {
           'Content-Type': 'application/json',
         },
+        // A guest cart is merged into the new user's cart as part of sign up
         body: JSON.stringify({
           email: formData.email,
           password: formData.password,
           first_name: formData.firstName,
           last_name: formData.lastName,
           phone: formData.phone,
-          user_type: formData.userType
+          user_type: formData.userType,
+          guest_id: getGuestId() || undefined
         }),
       });
 
@@ -64,6 +67,7 @@ export default function CustomerSignUpPage() {
       if (data.access_token) {
         localStorage.setItem('token', data.access_token);
         localStorage.setItem('userType', formData.userType);
+        clearGuestId();
       }
 
       router.push('/products');
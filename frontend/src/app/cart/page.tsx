@@ -5,28 +5,30 @@ import { useRouter } from 'next/navigation';
 import { Trash2, Plus, Minus } from 'lucide-react';
 import { Button } from '@/components/ui/Button';
 import { API_URL } from '@/lib/config';
+import { cartHeaders } from '@/lib/cart';
 
 interface CartItem {
   product_id: string;
+  product_name?: string;
+  price: number;
+  price_cents: number;
   quantity: number;
   added_at: string;
+  price_changed?: boolean;
+  current_price?: number;
+  out_of_stock?: boolean;
+  available_quantity?: number;
+  unavailable?: boolean;
 }
 
 interface Cart {
   user_id: string;
   items: CartItem[];
-}
-
-interface Product {
-  product_id: string;
-  title: string;
-  price: number;
-  image_url?: string;
+  issue_count?: number;
 }
 
 export default function CartPage() {
   const [cart, setCart] = useState<Cart | null>(null);
-  const [products, setProducts] = useState<Map<string, Product>>(new Map());
   const [loading, setLoading] = useState(true);
   const router = useRouter();
 
@@ -38,31 +40,14 @@ export default function CartPage() {
 
   const fetchCart = async () => {
     try {
-      const token = localStorage.getItem('access_token');
-      if (!token) {
-        router.push('/auth/login');
-        return;
-      }
-
-      const response = await fetch(`${API}/api/cart`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
+      // The cart API checks every line's price and stock in one batch read
+      const response = await fetch(`${API}/api/cart?revalidate=true`, {
+        headers: await cartHeaders()
       });
 
       if (response.ok) {
         const data = await response.json();
         setCart(data);
-
-        if (data.items && data.items.length > 0) {
-          const uniqueIds = Array.from(new Set((data.items as CartItem[]).map((i) => i.product_id)));
-          const prodResults = await Promise.all(uniqueIds.map((pid) => fetch(`${API}/api/products/${pid}`).then(r => r.json())));
-          const map = new Map<string, Product>();
-          prodResults.forEach((p: Product) => map.set(p.product_id, p));
-          setProducts(map);
-        } else {
-          setProducts(new Map());
-        }
       }
     } catch (error) {
       console.error('Error fetching cart:', error);
@@ -73,12 +58,9 @@ export default function CartPage() {
 
   const removeItem = async (productId: string) => {
     try {
-      const token = localStorage.getItem('access_token');
       const response = await fetch(`${API}/api/cart/items/${productId}`, {
         method: 'DELETE',
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
+        headers: await cartHeaders()
       });
 
       if (response.ok) {
@@ -93,11 +75,10 @@ export default function CartPage() {
     if (newQuantity < 1) return;
 
     try {
-      const token = localStorage.getItem('access_token');
       const response = await fetch(`${API}/api/cart/items/${productId}`, {
         method: 'PUT',
         headers: {
-          'Authorization': `Bearer ${token}`,
+          ...(await cartHeaders()),
           'Content-Type': 'application/json'
         },
         body: JSON.stringify({ quantity: newQuantity })
@@ -111,10 +92,8 @@ export default function CartPage() {
     }
   };
 
-  const subtotal = cart?.items?.reduce((sum, i) => {
-    const unit = Number((i as any).price) || 0;
-    return sum + unit * Number(i.quantity || 0);
-  }, 0) || 0;
+  // Sum in integer cents so the subtotal is exact
+  const subtotal = (cart?.items?.reduce((sum, i) => sum + Number(i.price_cents || 0) * Number(i.quantity || 0), 0) || 0) / 100;
 
   if (loading) {
     return (
@@ -147,16 +126,24 @@ export default function CartPage() {
         <div className="lg:col-span-2">
           <div className="bg-white rounded-lg shadow">
             {cart.items.map((item) => {
-              const product = products.get(item.product_id);
-              const price = Number((item as any).price) || 0;
+              const price = Number(item.price) || 0;
               return (
                 <div key={item.product_id} className="p-6 border-b border-gray-200 last:border-b-0">
                   <div className="flex items-center justify-between">
                     <div className="flex-1">
                       <h3 className="text-lg font-semibold text-gray-900">
-                        {(item as any).product_name || (product ? product.title : `Product ${item.product_id.substring(0,8)}...`)}
+                        {item.product_name || `Product ${item.product_id.substring(0,8)}...`}
                       </h3>
                       <p className="text-sm text-gray-500">Unit price: ${price.toFixed(2)}</p>
+                      {item.price_changed && (
+                        <p className="text-sm text-amber-600">Price is now ${Number(item.current_price).toFixed(2)}</p>
+                      )}
+                      {item.out_of_stock && (
+                        <p className="text-sm text-red-600">Only {item.available_quantity} left in stock</p>
+                      )}
+                      {item.unavailable && (
+                        <p className="text-sm text-red-600">No longer available</p>
+                      )}
                       <p className="text-sm text-gray-500">Added: {new Date(item.added_at).toLocaleDateString()}</p>
                     </div>
 
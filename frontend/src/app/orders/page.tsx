@@ -13,6 +13,7 @@ interface OrderItem {
 
 interface Order {
   order_id: string;
+  display_id?: string;
   buyer_id: string;
   seller_id?: string;
   items: OrderItem[];
@@ -42,7 +43,7 @@ export default function OrdersPage() {
         });
         if (!res.ok) throw new Error('Failed to load orders');
         const data = await res.json();
-        setOrders(Array.isArray(data) ? data : []);
+        setOrders(Array.isArray(data.orders) ? data.orders : []);
       } catch (e: any) {
         setError(e?.message || 'Failed to load orders');
       } finally {
@@ -88,7 +89,7 @@ export default function OrdersPage() {
                 <div className="flex items-start justify-between flex-wrap gap-4 mb-4">
                   <div>
                     <p className="text-sm text-gray-500">Order ID</p>
-                    <p className="font-mono text-sm">{order.order_id}</p>
+                    <p className="font-mono text-sm">{order.display_id || order.order_id}</p>
                   </div>
                   <div>
                     <p className="text-sm text-gray-500">Placed</p>
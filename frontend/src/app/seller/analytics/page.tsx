@@ -2,13 +2,14 @@
 
 import { useEffect, useState } from 'react';
 import Link from 'next/link';
+import { API_URL } from '@/lib/config';
 import { TrendingUp, DollarSign, ShoppingBag, Users } from 'lucide-react';
 
 interface Analytics {
   totalSales: number;
   totalOrders: number;
   totalProducts: number;
-  totalCustomers: number;
+  unitsSold: number;
   recentSales: Array<{
     date: string;
     amount: number;
@@ -26,47 +27,27 @@ export default function SellerAnalyticsPage() {
   const fetchAnalytics = async () => {
     try {
       const token = localStorage.getItem('access_token');
-      const response = await fetch('http://localhost:8000/api/sellers/analytics/', {
+      const response = await fetch(`${API_URL}/api/sellers/analytics`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
       
       if (response.ok) {
+        // Last 30 days of precomputed daily rollups
         const data = await response.json();
-        setAnalytics(data);
-      } else {
-        // Mock data for demonstration
         setAnalytics({
-          totalSales: 12450.00,
-          totalOrders: 45,
-          totalProducts: 12,
-          totalCustomers: 38,
-          recentSales: [
-            { date: '2025-10-10', amount: 450 },
-            { date: '2025-10-09', amount: 320 },
-            { date: '2025-10-08', amount: 890 },
-            { date: '2025-10-07', amount: 560 },
-            { date: '2025-10-06', amount: 780 },
-          ]
+          totalSales: Number(data.total_sales) || 0,
+          totalOrders: data.total_orders || 0,
+          totalProducts: data.products_sold || 0,
+          unitsSold: data.units_sold || 0,
+          recentSales: (data.daily || [])
+            .map((day: { date: string; sales: number }) => ({ date: day.date, amount: Number(day.sales) || 0 }))
+            .reverse()
         });
       }
     } catch (error) {
       console.error('Error fetching analytics:', error);
-      // Mock data on error
-      setAnalytics({
-        totalSales: 12450.00,
-        totalOrders: 45,
-        totalProducts: 12,
-        totalCustomers: 38,
-        recentSales: [
-          { date: '2025-10-10', amount: 450 },
-          { date: '2025-10-09', amount: 320 },
-          { date: '2025-10-08', amount: 890 },
-          { date: '2025-10-07', amount: 560 },
-          { date: '2025-10-06', amount: 780 },
-        ]
-      });
     } finally {
       setLoading(false);
     }
@@ -133,7 +114,7 @@ export default function SellerAnalyticsPage() {
           <div className="bg-white rounded-lg shadow p-6">
             <div className="flex items-center justify-between">
               <div>
-                <p className="text-gray-500 text-sm">Total Products</p>
+                <p className="text-gray-500 text-sm">Products Sold</p>
                 <p className="text-2xl font-bold text-gray-900">{analytics.totalProducts}</p>
               </div>
               <div className="bg-purple-100 p-3 rounded-full">
@@ -145,8 +126,8 @@ export default function SellerAnalyticsPage() {
           <div className="bg-white rounded-lg shadow p-6">
             <div className="flex items-center justify-between">
               <div>
-                <p className="text-gray-500 text-sm">Total Customers</p>
-                <p className="text-2xl font-bold text-gray-900">{analytics.totalCustomers}</p>
+                <p className="text-gray-500 text-sm">Units Sold</p>
+                <p className="text-2xl font-bold text-gray-900">{analytics.unitsSold}</p>
               </div>
               <div className="bg-yellow-100 p-3 rounded-full">
                 <Users className="w-6 h-6 text-yellow-600" />
@@ -6,9 +6,11 @@ import Link from 'next/link';
 import { Button } from '@/components/ui/Button';
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/Card';
 import { Package, DollarSign, ShoppingCart, TrendingUp, Plus } from 'lucide-react';
+import { API_URL } from '@/lib/config';
 
 interface SellerStats {
   totalProducts: number;
+  lowStockProducts: number;
   totalOrders: number;
   totalRevenue: number;
   pendingOrders: number;
@@ -27,6 +29,7 @@ export default function SellerDashboard() {
   const router = useRouter();
   const [stats, setStats] = useState<SellerStats>({
     totalProducts: 0,
+    lowStockProducts: 0,
     totalOrders: 0,
     totalRevenue: 0,
     pendingOrders: 0
@@ -47,15 +50,21 @@ export default function SellerDashboard() {
 
   const fetchSellerData = async () => {
     try {
-      // Fetch seller's products
-      const response = await fetch('http://localhost:8000/api/products/');
-      if (response.ok) {
-        const allProducts = await response.json();
-        setProducts(allProducts.slice(0, 5)); // Show first 5 products
-        
-        // Calculate stats
+      const sellerId = encodeURIComponent(localStorage.getItem('user_id') || '');
+
+      // Counts come from the seller's catalog counters; only a few products are listed
+      const [summaryResponse, productsResponse] = await Promise.all([
+        fetch(`${API_URL}/api/products/summary?seller_id=${sellerId}`),
+        fetch(`${API_URL}/api/products?seller_id=${sellerId}&limit=5`)
+      ]);
+      if (productsResponse.ok) {
+        setProducts(await productsResponse.json());
+      }
+      if (summaryResponse.ok) {
+        const summary = await summaryResponse.json();
         setStats({
-          totalProducts: allProducts.length,
+          totalProducts: summary.product_count,
+          lowStockProducts: summary.low_stock_count,
           totalOrders: 0, // TODO: Fetch from orders API
           totalRevenue: 0, // TODO: Calculate from orders
           pendingOrders: 0 // TODO: Fetch from orders API
@@ -115,6 +124,9 @@ export default function SellerDashboard() {
                 <div>
                   <p className="text-sm font-medium text-gray-600">Total Products</p>
                   <p className="text-3xl font-bold text-gray-900">{stats.totalProducts}</p>
+                  {stats.lowStockProducts > 0 && (
+                    <p className="text-xs text-red-600">{stats.lowStockProducts} low on stock</p>
+                  )}
                 </div>
                 <div className="p-3 bg-blue-100 rounded-full">
                   <Package className="w-6 h-6 text-blue-600" />
@@ -5,11 +5,14 @@ import { ShoppingCart, User, Search, LogOut } from 'lucide-react';
 import { Button } from '@/components/ui/Button';
 import { useEffect, useState } from 'react';
 import { useRouter } from 'next/navigation';
+import { API_URL } from '@/lib/config';
+import { cartHeaders, getGuestId } from '@/lib/cart';
 
 export default function Header() {
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const [userEmail, setUserEmail] = useState('');
   const [userType, setUserType] = useState('');
+  const [cartCount, setCartCount] = useState(0);
   const router = useRouter();
 
   useEffect(() => {
@@ -20,6 +23,15 @@ export default function Header() {
     setIsLoggedIn(!!token);
     setUserEmail(email || '');
     setUserType(type || '');
+
+    if (token || getGuestId()) {
+      // The summary endpoint returns only the counters, not the cart lines
+      cartHeaders()
+        .then((headers) => fetch(`${API_URL}/api/cart/summary`, { headers }))
+        .then((r) => (r.ok ? r.json() : null))
+        .then((summary) => summary && setCartCount(Number(summary.item_count) || 0))
+        .catch((error) => console.error('Error fetching cart summary:', error));
+    }
   }, []);
 
   const handleLogout = () => {
@@ -28,6 +40,7 @@ export default function Header() {
     localStorage.removeItem('user_email');
     localStorage.removeItem('user_type');
     setIsLoggedIn(false);
+    setCartCount(0);
     router.push('/');
   };
 
@@ -61,7 +74,7 @@ export default function Header() {
               <Button variant="ghost" className="relative">
                 <ShoppingCart className="w-5 h-5" />
                 <span className="absolute -top-1 -right-1 bg-red-500 text-white text-xs rounded-full w-5 h-5 flex items-center justify-center">
-                  0
+                  {cartCount}
                 </span>
               </Button>
             </Link>
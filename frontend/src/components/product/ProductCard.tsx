@@ -5,6 +5,7 @@ import Link from 'next/link';
 import { ShoppingCart } from 'lucide-react';
 import { Button } from '@/components/ui/Button';
 import { useState } from 'react';
+import { cartHeaders } from '@/lib/cart';
 
 interface Product {
   product_id: string;
@@ -31,13 +32,6 @@ export default function ProductCard({ product }: ProductCardProps) {
     e.preventDefault();
     e.stopPropagation();
     
-    const token = localStorage.getItem('access_token');
-    if (!token) {
-      alert('Please login to add items to cart');
-      window.location.href = '/auth/login';
-      return;
-    }
-
     setAdding(true);
     try {
       const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
@@ -45,7 +39,7 @@ export default function ProductCard({ product }: ProductCardProps) {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${token}`
+          ...(await cartHeaders())
         },
         body: JSON.stringify({
           product_id: product.product_id,
@@ -0,0 +1,26 @@
+import { API_URL } from '@/lib/config';
+
+const GUEST_ID_KEY = 'guest_cart_id';
+
+export const getGuestId = () => localStorage.getItem(GUEST_ID_KEY);
+
+export const clearGuestId = () => localStorage.removeItem(GUEST_ID_KEY);
+
+// Headers identifying the cart owner: the logged-in user, or a signed guest ID.
+// Anonymous shoppers get a guest ID from the cart API on their first cart call.
+export const cartHeaders = async (): Promise<Record<string, string>> => {
+    const token = localStorage.getItem('access_token');
+    if (token) {
+        return { 'Authorization': `Bearer ${token}` };
+    }
+    let guestId = getGuestId();
+    if (!guestId) {
+        const response = await fetch(`${API_URL}/api/cart/guest`, { method: 'POST' });
+        if (!response.ok) {
+            return {};
+        }
+        guestId = (await response.json()).guest_id as string;
+        localStorage.setItem(GUEST_ID_KEY, guestId);
+    }
+    return { 'X-Guest-Id': guestId };
+};
@@ -8,6 +8,10 @@ import os
 import hmac
 import hashlib
 import base64
+import time
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from botocore.exceptions import ClientError
 
 # AWS clients
 endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
@@ -18,6 +22,16 @@ USER_POOL_ID = os.getenv('USER_POOL_ID')
 CLIENT_ID = os.getenv('CLIENT_ID')
 CLIENT_SECRET = os.getenv('CLIENT_SECRET', '')
 USERS_TABLE = os.getenv('USERS_TABLE', 'ekart-users-dev')
+CARTS_TABLE = os.getenv('CARTS_TABLE', 'ekart-carts-dev')
+GUEST_CART_SECRET = os.getenv('GUEST_CART_SECRET', 'ekart-dev-guest-cart-secret')
+CART_TTL_DAYS = int(os.getenv('CART_TTL_DAYS', '30'))
+DEFAULT_CURRENCY = os.getenv('CURRENCY', 'USD')
+# cart-api's soft stock holds, one item per (product_id, holder); a merge moves the guest's to the user
+STOCK_HOLDS_TABLE = os.getenv('STOCK_HOLDS_TABLE', 'ekart-stock-holds-dev')
+STOCK_RESERVATIONS_ENABLED = os.getenv('STOCK_RESERVATIONS_ENABLED', 'false').lower() == 'true'
+MAX_MERGE_ATTEMPTS = 3
+# DynamoDB limit on items in one TransactWriteItems call
+MAX_TRANSACTION_ITEMS = 100
 
 def get_secret_hash(username):
     """Calculate SECRET_HASH for Cognito"""
@@ -41,6 +55,148 @@ def cors_response(status_code, body):
         'body': json.dumps(body)
     }
 
+def guest_cart_key(guest_id):
+    """Cart key (guest#<uuid>) for a guest ID signed by cart-api, else None"""
+    guest_uuid = (guest_id or '').split('.')[0]
+    signature = hmac.new(GUEST_CART_SECRET.encode(), guest_uuid.encode(), hashlib.sha256).hexdigest()[:32]
+    if not guest_uuid or not hmac.compare_digest(f"{guest_uuid}.{signature}", guest_id):
+        return None
+    return f"guest#{guest_uuid}"
+
+def to_cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def cart_line_map(cart):
+    """Cart lines keyed by product_id with price_cents, whatever format the cart was stored in"""
+    items = (cart or {}).get('items') or {}
+    lines = {}
+    for line in (items.values() if isinstance(items, dict) else items):
+        line = dict(line)
+        if 'price_cents' not in line:
+            line['price_cents'] = to_cents(line.pop('price'))
+        if line['product_id'] in lines:
+            lines[line['product_id']]['quantity'] += line['quantity']
+        else:
+            lines[line['product_id']] = line
+    return lines
+
+def version_condition(cart, key_name='user_id'):
+    """Condition that the cart is still exactly what was read"""
+    if cart is None:
+        return {'ConditionExpression': f'attribute_not_exists({key_name})'}
+    if 'version' not in cart:
+        return {'ConditionExpression': 'attribute_not_exists(version)'}
+    return {'ConditionExpression': 'version = :version', 'ExpressionAttributeValues': {':version': cart['version']}}
+
+def hold_transfers(user_id, guest_key, product_ids, limit):
+    """
+    Transaction items moving the guest cart's stock holds to the user: each
+    guest hold is deleted (conditional on the quantity read) and its units
+    added to the user's hold on the product, keeping the later expiry. At
+    most `limit` items; holds left over stay with the guest and lapse.
+    """
+    if not STOCK_RESERVATIONS_ENABLED or not product_ids:
+        return []
+    client = dynamodb.meta.client
+    holds = {}
+    keys = [{'product_id': pid, 'holder': holder} for pid in product_ids for holder in (guest_key, user_id)]
+    for start in range(0, len(keys), 100):
+        response = client.batch_get_item(RequestItems={
+            STOCK_HOLDS_TABLE: {'Keys': keys[start:start + 100], 'ConsistentRead': True}
+        })
+        for hold in response['Responses'].get(STOCK_HOLDS_TABLE, []):
+            holds[(hold['product_id'], hold['holder'])] = hold
+
+    transfers = []
+    for product_id in product_ids:
+        guest_hold = holds.get((product_id, guest_key))
+        if not guest_hold or len(transfers) + 2 > limit:
+            continue
+        user_hold = holds.get((product_id, user_id)) or {}
+        transfers.append({'Delete': {
+            'TableName': STOCK_HOLDS_TABLE,
+            'Key': {'product_id': product_id, 'holder': guest_key},
+            'ConditionExpression': 'quantity = :held',
+            'ExpressionAttributeValues': {':held': guest_hold['quantity']}
+        }})
+        transfers.append({'Update': {
+            'TableName': STOCK_HOLDS_TABLE,
+            'Key': {'product_id': product_id, 'holder': user_id},
+            'UpdateExpression': 'SET expires_at = :exp ADD quantity :held',
+            'ExpressionAttributeValues': {
+                ':held': guest_hold['quantity'],
+                ':exp': max(int(guest_hold['expires_at']), int(user_hold.get('expires_at', 0)))
+            }
+        }})
+    return transfers
+
+def merge_guest_cart(user_id, guest_id):
+    """
+    Folds a guest cart into the user's cart. Both carts are read in one
+    BatchGetItem, then one transaction writes the merged cart and deletes the
+    guest cart, each conditional on the version that was read, and moves the
+    guest's stock holds to the user so they follow the merged lines.
+    Returns the merged item count, or None if there was nothing to merge.
+    """
+    guest_key = guest_cart_key(guest_id)
+    if not guest_key:
+        return None
+    client = dynamodb.meta.client
+    for attempt in range(MAX_MERGE_ATTEMPTS):
+        response = client.batch_get_item(RequestItems={
+            CARTS_TABLE: {'Keys': [{'user_id': user_id}, {'user_id': guest_key}], 'ConsistentRead': True}
+        })
+        carts = {cart['user_id']: cart for cart in response['Responses'].get(CARTS_TABLE, [])}
+        guest_cart = carts.get(guest_key)
+        if not guest_cart:
+            return None
+        user_cart = carts.get(user_id)
+
+        lines = cart_line_map(user_cart)
+        for product_id, line in cart_line_map(guest_cart).items():
+            if product_id in lines:
+                lines[product_id]['quantity'] += line['quantity']
+            else:
+                lines[product_id] = line
+        merged = {
+            'user_id': user_id,
+            'items': lines,
+            'item_count': sum(int(line['quantity']) for line in lines.values()),
+            'total_cents': sum(int(line['price_cents']) * int(line['quantity']) for line in lines.values()),
+            'currency': (user_cart or guest_cart).get('currency', DEFAULT_CURRENCY),
+            'version': int(user_cart.get('version', 0)) + 1 if user_cart else 1,
+            'updated_at': datetime.utcnow().isoformat(),
+            'expires_at': int(time.time()) + CART_TTL_DAYS * 86400
+        }
+        transact_items = [
+            {'Put': {'TableName': CARTS_TABLE, 'Item': merged, **version_condition(user_cart)}},
+            {'Delete': {'TableName': CARTS_TABLE, 'Key': {'user_id': guest_key}, **version_condition(guest_cart)}}
+        ]
+        transact_items += hold_transfers(
+            user_id, guest_key, list(cart_line_map(guest_cart)), MAX_TRANSACTION_ITEMS - len(transact_items)
+        )
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+            return merged['item_count']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            print(f"Cart merge for {user_id} lost a race, retrying")
+    print(f"Cart merge for {user_id} gave up after {MAX_MERGE_ATTEMPTS} attempts")
+    return None
+
+def attach_guest_cart(result, user_id, guest_id):
+    """Merges the guest cart (if any) into the login response; never fails the login"""
+    if not guest_id:
+        return result
+    try:
+        item_count = merge_guest_cart(user_id, guest_id)
+        if item_count is not None:
+            result['cart_item_count'] = item_count
+    except Exception as e:
+        print(f"Guest cart merge error: {e}")
+    return result
+
 def register_user(body):
     """Register a new user in Cognito and DynamoDB"""
     try:
@@ -114,7 +270,7 @@ def register_user(body):
             AuthParameters=auth_params
         )
         
-        return cors_response(200, {
+        return cors_response(200, attach_guest_cart({
             'access_token': auth_response['AuthenticationResult']['AccessToken'],
             'id_token': auth_response['AuthenticationResult']['IdToken'],
             'refresh_token': auth_response['AuthenticationResult']['RefreshToken'],
@@ -122,7 +278,7 @@ def register_user(body):
             'user_id': user_sub,
             'email': email,
             'user_type': user_type
-        })
+        }, user_sub, body.get('guest_id')))
         
     except cognito.exceptions.UsernameExistsException:
         return cors_response(400, {'error': 'Email already registered'})
@@ -164,7 +320,8 @@ def login_user(body):
         attributes = {attr['Name']: attr['Value'] for attr in user_info['UserAttributes']}
         user_type = attributes.get('custom:user_type', 'customer')
         
-        return cors_response(200, {
+        # Carts are keyed by the token subject, which cart-api reads from the JWT
+        return cors_response(200, attach_guest_cart({
             'access_token': access_token,
             'id_token': response['AuthenticationResult']['IdToken'],
             'refresh_token': response['AuthenticationResult']['RefreshToken'],
@@ -172,7 +329,7 @@ def login_user(body):
             'user_id': user_info['Username'],
             'email': attributes.get('email'),
             'user_type': user_type
-        })
+        }, attributes.get('sub', user_info['Username']), body.get('guest_id')))
         
     except cognito.exceptions.NotAuthorizedException:
         return cors_response(401, {'error': 'Invalid email or password'})
@@ -1,9 +1,15 @@
+import copy
+import hashlib
+import hmac
 import json
+import time
+import uuid
 import boto3
 import os
 import jwt
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
+from botocore.exceptions import ClientError
 
 def extract_user_from_token(event):
     """Extracts user ID from Authorization (JWT) header."""
@@ -22,10 +28,30 @@ def extract_user_from_token(event):
         print("Token extraction error", str(e))
         return None
 
+def sign_guest_id(guest_uuid):
+    """Signed anonymous cart ID handed to the browser: <uuid>.<hmac>."""
+    signature = hmac.new(GUEST_CART_SECRET.encode(), guest_uuid.encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{guest_uuid}.{signature}"
+
+def guest_cart_key(guest_id):
+    """Cart key (guest#<uuid>) for a validly signed guest ID, else None."""
+    guest_uuid = (guest_id or "").split(".")[0]
+    if not guest_uuid or not hmac.compare_digest(sign_guest_id(guest_uuid), guest_id):
+        return None
+    return f"guest#{guest_uuid}"
+
+def extract_cart_owner(event):
+    """Cart key for the request: the JWT user, or a signed X-Guest-Id for anonymous shoppers."""
+    user_id = extract_user_from_token(event)
+    if user_id:
+        return user_id
+    headers = event.get("headers") or {}
+    return guest_cart_key(headers.get("X-Guest-Id") or headers.get("x-guest-id"))
+
 def decimal_default(obj):
     """JSON serializer for Decimal objects."""
     if isinstance(obj, Decimal):
-        return float(obj)
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
     raise TypeError
 
 def cors_response(status_code, body):
@@ -34,7 +60,7 @@ def cors_response(status_code, body):
         "headers": {
             "Content-Type": "application/json",
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,Authorization",
+            "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Guest-Id",
             "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS"
         },
         "body": json.dumps(body, default=decimal_default)
@@ -42,92 +68,609 @@ def cors_response(status_code, body):
 
 endpoint_url = os.getenv("AWS_ENDPOINT_URL") or None
 dynamodb = boto3.resource("dynamodb", endpoint_url=endpoint_url)
+sqs = boto3.client("sqs", endpoint_url=endpoint_url)
 CARTS_TABLE = os.getenv("CARTS_TABLE", "ekart-carts-dev")
 PRODUCTS_TABLE = os.getenv("PRODUCTS_TABLE", "ekart-products-dev")
+ACTIVITY_QUEUE_URL = os.getenv("ACTIVITY_QUEUE_URL")
+GUEST_CART_SECRET = os.getenv("GUEST_CART_SECRET", "ekart-dev-guest-cart-secret")
+INVENTORY_TABLE = os.getenv("INVENTORY_TABLE", "ekart-inventory-dev")
+# One item per (product_id, holder) cart hold; the inventory item keeps only the `available` counter
+STOCK_HOLDS_TABLE = os.getenv("STOCK_HOLDS_TABLE", "ekart-stock-holds-dev")
+# Opt-in soft stock holds taken on add-to-cart; inventory-updater releases them once they lapse
+STOCK_RESERVATIONS_ENABLED = os.getenv("STOCK_RESERVATIONS_ENABLED", "false").lower() == "true"
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+DEFAULT_CURRENCY = os.getenv("CURRENCY", "USD")
+# Carts untouched for this long are removed by the table TTL (expires_at)
+CART_TTL_DAYS = int(os.getenv("CART_TTL_DAYS", "30"))
+
+def publish_activity(event_type, product_id):
+    """Sends an activity event to the trending worker (best effort)."""
+    publish_activities(event_type, [product_id])
+
+def publish_activities(event_type, product_ids):
+    """Sends activity events in SQS batches of 10 (best effort)."""
+    if not ACTIVITY_QUEUE_URL:
+        return
+    ts = int(time.time())
+    try:
+        for start in range(0, len(product_ids), 10):
+            sqs.send_message_batch(
+                QueueUrl=ACTIVITY_QUEUE_URL,
+                Entries=[
+                    {"Id": str(i), "MessageBody": json.dumps({"type": event_type, "product_id": pid, "ts": ts})}
+                    for i, pid in enumerate(product_ids[start:start + 10])
+                ]
+            )
+    except Exception as e:
+        print("Error publishing activity event", e)
+
+# Attempts before giving up when concurrent writers keep winning a conditional update
+MAX_CART_ATTEMPTS = 3
+
+# Distinct products accepted by one batch request (one BatchGetItem call)
+MAX_BATCH_PRODUCTS = 100
+
+def is_conditional_failure(error):
+    return isinstance(error, ClientError) and error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+def cart_expiry():
+    """expires_at for a cart mutated now (epoch seconds, as DynamoDB TTL expects)."""
+    return int(time.time()) + CART_TTL_DAYS * 86400
+
+def to_cents(amount):
+    """Converts a decimal money amount (e.g. product price) to integer minor units."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents):
+    """Exact decimal amount for integer minor units (2 decimal places)."""
+    return Decimal(int(cents)).scaleb(-2)
+
+def cart_lines(cart):
+    """Returns cart lines as a list, oldest first. Accepts map or legacy list carts."""
+    items = cart.get("items") or {}
+    if isinstance(items, list):
+        return items
+    return sorted(items.values(), key=lambda line: line.get("added_at", ""))
+
+def serialize_cart(cart):
+    """Shapes a stored cart for API responses (items as a list, amounts derived from cents)."""
+    total_cents = int(cart.get("total_cents", 0))
+    return {
+        "user_id": cart["user_id"],
+        "items": [dict(line, price=from_cents(line["price_cents"])) for line in cart_lines(cart)],
+        "item_count": cart.get("item_count", 0),
+        "total_cents": total_cents,
+        "total_amount": from_cents(total_cents),
+        "currency": cart.get("currency", DEFAULT_CURRENCY),
+        "version": cart.get("version", 0),
+        "updated_at": cart.get("updated_at")
+    }
+
+def report_cart_conflicts(operation, conflicts):
+    """Emits version conflicts as a CloudWatch embedded metric (one log line)."""
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": "EKart/Cart",
+                "Dimensions": [["Operation"]],
+                "Metrics": [{"Name": "CartVersionConflicts", "Unit": "Count"}]
+            }]
+        },
+        "Operation": operation,
+        "CartVersionConflicts": conflicts
+    }))
 
-def get_cart(user_id):
-    """Returns the user's cart."""
+class CartConflictError(Exception):
+    """Raised when a cart keeps changing underneath a commit."""
+
+def commit_cart(table, user_id, mutate, operation):
+    """
+    Read-modify-write of a whole cart document with optimistic concurrency.
+    mutate(cart) gets the stored cart (None if there is none) and returns the
+    new document, or None to leave the cart untouched. The put only succeeds if
+    the version is still the one that was read; otherwise the cart is re-read
+    and mutate re-applied, at most MAX_CART_ATTEMPTS times.
+    """
+    conflicts = 0
+    try:
+        for attempt in range(MAX_CART_ATTEMPTS):
+            current = table.get_item(Key={"user_id": user_id}, ConsistentRead=True).get("Item")
+            cart = mutate(copy.deepcopy(current) if current else None)
+            if cart is None:
+                return current
+
+            if current is None:
+                condition = {"ConditionExpression": "attribute_not_exists(user_id)"}
+            elif "version" in current:
+                condition = {
+                    "ConditionExpression": "version = :version",
+                    "ExpressionAttributeValues": {":version": current["version"]}
+                }
+            else:
+                condition = {"ConditionExpression": "attribute_not_exists(version)"}
+            cart["version"] = int(current.get("version", 0)) + 1 if current else 1
+            cart["expires_at"] = cart_expiry()
+
+            try:
+                table.put_item(Item=cart, **condition)
+                return cart
+            except ClientError as e:
+                if not is_conditional_failure(e):
+                    raise
+                conflicts += 1
+        raise CartConflictError("Cart was modified concurrently, please retry")
+    finally:
+        report_cart_conflicts(operation, conflicts)
+
+def needs_migration(cart):
+    """Carts written before integer cents (list or map items) have no total_cents."""
+    return "total_cents" not in cart
+
+def convert_legacy_cart(cart):
+    """commit_cart mutation: brings a list-of-items or decimal-priced cart to the current format."""
+    if not cart or not needs_migration(cart):
+        return None
+    lines = cart.get("items") or []
+    if isinstance(lines, dict):
+        lines = lines.values()
+    items = {}
+    for line in lines:
+        if line["product_id"] in items:
+            items[line["product_id"]]["quantity"] += line["quantity"]
+            continue
+        line = dict(line, added_at=line.get("added_at", cart.get("updated_at", "")))
+        if "price_cents" not in line:
+            line["price_cents"] = to_cents(line.pop("price"))
+        items[line["product_id"]] = line
+    cart["items"] = items
+    cart["item_count"] = sum(int(line["quantity"]) for line in items.values())
+    cart["total_cents"] = sum(int(line["price_cents"]) * int(line["quantity"]) for line in items.values())
+    cart["currency"] = cart.get("currency", DEFAULT_CURRENCY)
+    cart.pop("total_amount", None)
+    cart["updated_at"] = datetime.utcnow().isoformat()
+    return cart
+
+def revalidate_lines(lines):
+    """Flags lines whose price, stock or availability changed since they were added."""
+    products = fetch_products(
+        {line["product_id"] for line in lines},
+        {"ProjectionExpression": "product_id, price, stock_quantity, is_active"}
+    )
+    issues = 0
+    for line in lines:
+        product = products.get(line["product_id"])
+        if product is None or product.get("is_active") is False:
+            line["unavailable"] = True
+        else:
+            current_cents = to_cents(product.get("price"))
+            if current_cents != int(line["price_cents"]):
+                line["price_changed"] = True
+                line["current_price_cents"] = current_cents
+                line["current_price"] = from_cents(current_cents)
+            if int(product.get("stock_quantity", 0)) < int(line["quantity"]):
+                line["out_of_stock"] = True
+                line["available_quantity"] = int(product.get("stock_quantity", 0))
+        if any(line.get(flag) for flag in ("unavailable", "price_changed", "out_of_stock")):
+            issues += 1
+    return issues
+
+def get_cart(user_id, revalidate=False):
+    """Returns the user's cart, optionally checked against current product data."""
     try:
         table = dynamodb.Table(CARTS_TABLE)
         response = table.get_item(Key={"user_id": user_id})
         if "Item" not in response:
-            return cors_response(200, {"user_id": user_id, "items": [], "total_amount": 0, "updated_at": datetime.utcnow().isoformat()})
-        return cors_response(200, response["Item"])
+            return cors_response(200, serialize_cart({"user_id": user_id, "updated_at": datetime.utcnow().isoformat()}))
+        cart = response["Item"]
+        if needs_migration(cart):
+            cart = commit_cart(table, user_id, convert_legacy_cart, "migrate")
+        response = serialize_cart(cart)
+        if revalidate and response["items"]:
+            response["issue_count"] = revalidate_lines(response["items"])
+        return cors_response(200, response)
+    except CartConflictError as e:
+        return cors_response(409, {"error": str(e)})
     except Exception as e:
         print("Error getting cart", e)
         return cors_response(500, {"error": str(e)})
 
+def get_cart_summary(user_id):
+    """Returns just the cart counters (for the header badge) via a projected read."""
+    try:
+        table = dynamodb.Table(CARTS_TABLE)
+        cart = table.get_item(
+            Key={"user_id": user_id},
+            ProjectionExpression="user_id, item_count, total_cents, currency, version, updated_at"
+        ).get("Item")
+        if cart and needs_migration(cart):
+            cart = commit_cart(table, user_id, convert_legacy_cart, "migrate")
+        cart = cart or {"user_id": user_id}
+        total_cents = int(cart.get("total_cents", 0))
+        return cors_response(200, {
+            "user_id": user_id,
+            "item_count": cart.get("item_count", 0),
+            "total_cents": total_cents,
+            "total_amount": from_cents(total_cents),
+            "currency": cart.get("currency", DEFAULT_CURRENCY),
+            "version": cart.get("version", 0),
+            "updated_at": cart.get("updated_at")
+        })
+    except CartConflictError as e:
+        return cors_response(409, {"error": str(e)})
+    except Exception as e:
+        print("Error getting cart summary", e)
+        return cors_response(500, {"error": str(e)})
+
+def read_cart_line(table, user_id, product_id):
+    """Reads just one line of the cart (plus total_cents). Returns the partial cart or None."""
+    response = table.get_item(
+        Key={"user_id": user_id},
+        ProjectionExpression="user_id, total_cents, #items.#pid",
+        ExpressionAttributeNames={"#items": "items", "#pid": product_id},
+        ConsistentRead=True
+    )
+    return response.get("Item")
+
+def hold_key(product_id, holder):
+    """Key of one cart's stock hold on a product (a stock-holds item)."""
+    return {"product_id": product_id, "holder": holder}
+
+def is_transaction_conflict(error):
+    """True when a transaction lost to a concurrent write on one of its items rather than failing a condition."""
+    if not isinstance(error, ClientError) or error.response["Error"]["Code"] != "TransactionCanceledException":
+        return False
+    return "TransactionConflict" in [reason.get("Code") for reason in error.response.get("CancellationReasons", [])]
+
+def reserve_stock(product_id, stock_quantity, holder, quantity):
+    """
+    Takes a soft hold on quantity units: one transaction decrements the
+    product's `available` counter (seeded from stock_quantity on first use)
+    and adds to the cart's own hold item, pushing its expiry out. Returns
+    False when there is not enough unreserved stock.
+    """
+    if not STOCK_RESERVATIONS_ENABLED or quantity <= 0:
+        return True
+    if int(stock_quantity) < quantity:
+        return False
+    for attempt in range(MAX_CART_ATTEMPTS):
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {"Update": {
+                    "TableName": INVENTORY_TABLE,
+                    "Key": {"product_id": product_id},
+                    "UpdateExpression": "SET available = if_not_exists(available, :stock) - :q",
+                    "ConditionExpression": "attribute_not_exists(available) OR available >= :q",
+                    "ExpressionAttributeValues": {":stock": int(stock_quantity), ":q": quantity}
+                }},
+                {"Update": {
+                    "TableName": STOCK_HOLDS_TABLE,
+                    "Key": hold_key(product_id, holder),
+                    "UpdateExpression": "SET expires_at = :exp ADD quantity :q",
+                    "ExpressionAttributeValues": {":q": quantity, ":exp": int(time.time()) + RESERVATION_TTL_SECONDS}
+                }}
+            ])
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+            if not is_transaction_conflict(e):
+                return False
+    return False
+
+def release_stock(product_id, holder, quantity=None):
+    """Gives back up to quantity held units (the whole hold if None). Best effort: lapsed holds are swept anyway."""
+    if not STOCK_RESERVATIONS_ENABLED or quantity == 0:
+        return
+    try:
+        for attempt in range(MAX_CART_ATTEMPTS):
+            item = dynamodb.Table(STOCK_HOLDS_TABLE).get_item(Key=hold_key(product_id, holder), ConsistentRead=True).get("Item") or {}
+            held = int(item.get("quantity", 0))
+            if not held:
+                return
+            released = held if quantity is None else min(quantity, held)
+            if released == held:
+                hold_write = {"Delete": {
+                    "TableName": STOCK_HOLDS_TABLE,
+                    "Key": hold_key(product_id, holder),
+                    "ConditionExpression": "quantity = :held",
+                    "ExpressionAttributeValues": {":held": held}
+                }}
+            else:
+                hold_write = {"Update": {
+                    "TableName": STOCK_HOLDS_TABLE,
+                    "Key": hold_key(product_id, holder),
+                    "UpdateExpression": "SET quantity = :rest",
+                    "ConditionExpression": "quantity = :held",
+                    "ExpressionAttributeValues": {":held": held, ":rest": held - released}
+                }}
+            try:
+                dynamodb.meta.client.transact_write_items(TransactItems=[hold_write, {"Update": {
+                    "TableName": INVENTORY_TABLE,
+                    "Key": {"product_id": product_id},
+                    "UpdateExpression": "SET available = available + :r",
+                    "ExpressionAttributeValues": {":r": released}
+                }}])
+                return
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TransactionCanceledException":
+                    raise
+    except Exception as e:
+        print("Error releasing stock hold", product_id, holder, e)
+
+def fetch_products(product_ids, projection=None):
+    """Loads products with BatchGetItem. Returns {product_id: product}."""
+    products = {}
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 100):
+        request = {"Keys": [{"product_id": pid} for pid in product_ids[start:start + 100]]}
+        if projection:
+            request.update(projection)
+        pending = {PRODUCTS_TABLE: request}
+        while pending:
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            for product in response.get("Responses", {}).get(PRODUCTS_TABLE, []):
+                products[product["product_id"]] = product
+            pending = response.get("UnprocessedKeys") or None
+    return products
+
+def build_cart_line(product, quantity, now):
+    return {
+        "product_id": product["product_id"],
+        "product_name": product.get("name") or product.get("title", "Unknown Product"),
+        "price_cents": to_cents(product.get("price")),
+        "quantity": quantity,
+        "seller_id": product.get("seller_id"),
+        "added_at": now
+    }
+
 def add_to_cart(user_id, body):
     """Adds an item to the user's cart."""
+    held = 0
     try:
         product_id = body['product_id']
         quantity = int(body.get("quantity", 1))
+        if quantity <= 0:
+            return cors_response(400, {"error": "Quantity must be positive"})
         product_table = dynamodb.Table(PRODUCTS_TABLE)
         prod_response = product_table.get_item(Key={"product_id": product_id})
         if "Item" not in prod_response:
             return cors_response(404, {"error": "Product not found"})
         product = prod_response["Item"]
+        if not reserve_stock(product_id, product.get("stock_quantity", 0), user_id, quantity):
+            return cors_response(409, {"error": "Not enough stock available"})
+        held = quantity
 
-        cart_table = dynamodb.Table(CARTS_TABLE)
-        cart_response = cart_table.get_item(Key={"user_id": user_id})
-        items = cart_response.get("Item", {}).get("items", [])
+        now = datetime.utcnow().isoformat()
+        line = build_cart_line(product, quantity, now)
+        names = {"#items": "items", "#pid": product_id}
+        values = {":qty": quantity, ":delta": line["price_cents"] * quantity, ":now": now, ":exp": cart_expiry(), ":one": 1}
+        # Price an existing line was added at; the total must grow by that, not the current price
+        line_price = line["price_cents"]
 
-        # See if product already in cart
-        for item in items:
-            if item["product_id"] == product_id:
-                item["quantity"] += quantity
+        cart_table = dynamodb.Table(CARTS_TABLE)
+        conflicts = 0
+        for attempt in range(MAX_CART_ATTEMPTS):
+            # Each branch is a single conditional write touching only this line and the counters
+            try:
+                # New line in an existing cart
+                response = cart_table.update_item(
+                    Key={"user_id": user_id},
+                    UpdateExpression="SET #items.#pid = :line, updated_at = :now, expires_at = :exp ADD item_count :qty, total_cents :delta, version :one",
+                    ConditionExpression="attribute_exists(total_cents) AND attribute_not_exists(#items.#pid)",
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues={**values, ":line": line},
+                    ReturnValues="ALL_NEW"
+                )
+                break
+            except ClientError as e:
+                if not is_conditional_failure(e):
+                    raise
+            try:
+                # Product already in cart
+                response = cart_table.update_item(
+                    Key={"user_id": user_id},
+                    UpdateExpression="SET #items.#pid.quantity = #items.#pid.quantity + :qty, updated_at = :now, expires_at = :exp ADD item_count :qty, total_cents :delta, version :one",
+                    ConditionExpression="attribute_exists(total_cents) AND #items.#pid.price_cents = :price",
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues={**values, ":price": line_price},
+                    ReturnValues="ALL_NEW"
+                )
                 break
+            except ClientError as e:
+                if not is_conditional_failure(e):
+                    raise
+            try:
+                # No cart yet
+                cart = {
+                    "user_id": user_id,
+                    "items": {product_id: line},
+                    "item_count": quantity,
+                    "total_cents": line["price_cents"] * quantity,
+                    "currency": DEFAULT_CURRENCY,
+                    "updated_at": now,
+                    "expires_at": values[":exp"],
+                    "version": 1
+                }
+                cart_table.put_item(Item=cart, ConditionExpression="attribute_not_exists(user_id)")
+                response = {"Attributes": cart}
+                break
+            except ClientError as e:
+                if not is_conditional_failure(e):
+                    raise
+            # The cart exists but matched no branch: the line was added at another
+            # price, a concurrent writer got in between, or it is a legacy cart
+            stored = ((read_cart_line(cart_table, user_id, product_id) or {}).get("items") or {}).get(product_id)
+            if stored and "price_cents" in stored and int(stored["price_cents"]) != line_price:
+                line_price = int(stored["price_cents"])
+                values[":delta"] = line_price * quantity
+                continue
+            conflicts += 1
+            commit_cart(cart_table, user_id, convert_legacy_cart, "migrate")
         else:
-            items.append({
-                "product_id": product_id,
-                "product_name": product.get("name") or product.get("title", "Unknown Product"),
-                "price": Decimal(str(product.get("price"))),
-                "quantity": int(quantity),
-                "seller_id": product.get("seller_id")
-            })
-
-        total_amount = sum(Decimal(str(item["price"])) * Decimal(str(item["quantity"])) for item in items)
-        cart = {
-            "user_id": user_id,
-            "items": items,
-            "total_amount": Decimal(str(total_amount)),
-            "updated_at": datetime.utcnow().isoformat()
-        }
-        cart_table.put_item(Item=cart)
-        return cors_response(200, cart)
+            report_cart_conflicts("add_item", conflicts)
+            release_stock(product_id, user_id, held)
+            return cors_response(409, {"error": "Cart was modified concurrently, please retry"})
+        report_cart_conflicts("add_item", conflicts)
+        held = 0
+
+        publish_activity("add_to_cart", product_id)
+        return cors_response(200, serialize_cart(response["Attributes"]))
+    except CartConflictError as e:
+        if held:
+            release_stock(product_id, user_id, held)
+        return cors_response(409, {"error": str(e)})
     except Exception as e:
         print("Error adding to cart", e)
+        if held:
+            release_stock(product_id, user_id, held)
         return cors_response(500, {"error": str(e)})
 
+def add_items_to_cart(user_id, body):
+    """Adds several products to the cart with one product fetch and one cart commit."""
+    held = {}
+    try:
+        requested = {}
+        for entry in body.get("items", []):
+            quantity = int(entry.get("quantity", 1))
+            if quantity <= 0:
+                return cors_response(400, {"error": "Quantity must be positive"})
+            requested[entry["product_id"]] = requested.get(entry["product_id"], 0) + quantity
+        if not requested:
+            return cors_response(400, {"error": "No items to add"})
+        if len(requested) > MAX_BATCH_PRODUCTS:
+            return cors_response(400, {"error": f"At most {MAX_BATCH_PRODUCTS} distinct products per batch"})
+
+        products = fetch_products(requested)
+        missing = [pid for pid in requested if pid not in products]
+        if len(missing) == len(requested):
+            return cors_response(404, {"error": "Product not found", "missing": missing})
+        for product_id, product in products.items():
+            if not reserve_stock(product_id, product.get("stock_quantity", 0), user_id, requested[product_id]):
+                for reserved_id, quantity in held.items():
+                    release_stock(reserved_id, user_id, quantity)
+                return cors_response(409, {"error": "Not enough stock available", "product_id": product_id})
+            held[product_id] = requested[product_id]
+
+        def merge_items(cart):
+            if cart is None:
+                cart = {"user_id": user_id, "items": {}, "item_count": 0, "total_cents": 0, "currency": DEFAULT_CURRENCY}
+            elif needs_migration(cart):
+                cart = convert_legacy_cart(cart)
+            now = datetime.utcnow().isoformat()
+            for product_id, product in products.items():
+                quantity = requested[product_id]
+                line = cart["items"].get(product_id)
+                if line:
+                    line["quantity"] += quantity
+                else:
+                    line = cart["items"][product_id] = build_cart_line(product, quantity, now)
+                cart["item_count"] += quantity
+                cart["total_cents"] += int(line["price_cents"]) * quantity
+            cart["updated_at"] = now
+            return cart
+
+        cart = commit_cart(dynamodb.Table(CARTS_TABLE), user_id, merge_items, "add_items")
+        held = {}
+        publish_activities("add_to_cart", list(products))
+        response = serialize_cart(cart)
+        if missing:
+            response["missing"] = missing
+        return cors_response(200, response)
+    except CartConflictError as e:
+        for product_id, quantity in held.items():
+            release_stock(product_id, user_id, quantity)
+        return cors_response(409, {"error": str(e)})
+    except Exception as e:
+        print("Error adding items to cart", e)
+        for product_id, quantity in held.items():
+            release_stock(product_id, user_id, quantity)
+        return cors_response(500, {"error": str(e)})
+
+def change_line_quantity(table, user_id, product_id, quantity):
+    """
+    Sets a line's quantity (0 removes it) and adjusts the counters in one
+    conditional update. The condition on the previously read quantity makes
+    the counter delta exact even when other writers touch the same line.
+    Stock holds follow the quantity: taken before the update, given back if it fails.
+    Returns (status, cart) where status is "ok", "no_cart", "no_line", "no_stock" or "conflict".
+    """
+    names = {"#items": "items", "#pid": product_id}
+    operation = "remove_item" if quantity == 0 else "update_item"
+    for attempt in range(MAX_CART_ATTEMPTS):
+        cart = read_cart_line(table, user_id, product_id)
+        if cart is None:
+            return "no_cart", None
+        if needs_migration(cart):
+            commit_cart(table, user_id, convert_legacy_cart, "migrate")
+            cart = read_cart_line(table, user_id, product_id) or {}
+        line = (cart.get("items") or {}).get(product_id)
+        if line is None:
+            return "no_line", None
+
+        old_quantity = int(line["quantity"])
+        delta = quantity - old_quantity
+        if delta > 0 and STOCK_RESERVATIONS_ENABLED:
+            product = dynamodb.Table(PRODUCTS_TABLE).get_item(
+                Key={"product_id": product_id}, ProjectionExpression="stock_quantity"
+            ).get("Item") or {}
+            if not reserve_stock(product_id, product.get("stock_quantity", 0), user_id, delta):
+                return "no_stock", None
+        values = {
+            ":old": old_quantity,
+            ":dq": delta,
+            ":dt": int(line["price_cents"]) * delta,
+            ":now": datetime.utcnow().isoformat(),
+            ":exp": cart_expiry(),
+            ":one": 1
+        }
+        if quantity == 0:
+            expression = "REMOVE #items.#pid SET updated_at = :now, expires_at = :exp ADD item_count :dq, total_cents :dt, version :one"
+        else:
+            expression = "SET #items.#pid.quantity = :qty, updated_at = :now, expires_at = :exp ADD item_count :dq, total_cents :dt, version :one"
+            values[":qty"] = quantity
+        try:
+            response = table.update_item(
+                Key={"user_id": user_id},
+                UpdateExpression=expression,
+                ConditionExpression="#items.#pid.quantity = :old",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW"
+            )
+        except ClientError as e:
+            if delta > 0:
+                release_stock(product_id, user_id, delta)
+            if not is_conditional_failure(e):
+                raise
+            print("Cart line changed concurrently, retrying", user_id, product_id)
+            continue
+        if delta < 0:
+            release_stock(product_id, user_id, -delta if quantity else None)
+        report_cart_conflicts(operation, attempt)
+        return "ok", response["Attributes"]
+    report_cart_conflicts(operation, MAX_CART_ATTEMPTS)
+    return "conflict", None
+
 def update_cart_item(user_id, product_id, body):
     """Updates the quantity for a cart item."""
     try:
         quantity = int(body.get("quantity", 1))
+        if quantity < 0:
+            return cors_response(400, {"error": "Quantity cannot be negative"})
         table = dynamodb.Table(CARTS_TABLE)
-        response = table.get_item(Key={"user_id": user_id})
-        if "Item" not in response:
+        status, cart = change_line_quantity(table, user_id, product_id, quantity)
+        if status == "no_cart":
             return cors_response(404, {"error": "Cart not found"})
-        cart = response["Item"]
-        items = cart.get("items", [])
-
-        found = False
-        for item in items:
-            if item["product_id"] == product_id:
-                if quantity == 0:
-                    items.remove(item)
-                else:
-                    item["quantity"] = quantity
-                found = True
-                break
-        if not found:
+        if status == "no_line":
             return cors_response(404, {"error": "Item not found in cart"})
-
-        total_amount = sum(Decimal(str(item["price"])) * Decimal(str(item["quantity"])) for item in items)
-        cart["items"] = items
-        cart["total_amount"] = Decimal(str(total_amount))
-        cart["updated_at"] = datetime.utcnow().isoformat()
-        table.put_item(Item=cart)
-        return cors_response(200, cart)
+        if status == "no_stock":
+            return cors_response(409, {"error": "Not enough stock available"})
+        if status == "conflict":
+            return cors_response(409, {"error": "Cart was modified concurrently, please retry"})
+        return cors_response(200, serialize_cart(cart))
+    except CartConflictError as e:
+        return cors_response(409, {"error": str(e)})
     except Exception as e:
         print("Error updating cart", e)
         return cors_response(500, {"error": str(e)})
@@ -136,25 +679,31 @@ def remove_from_cart(user_id, product_id):
     """Removes a product from the cart."""
     try:
         table = dynamodb.Table(CARTS_TABLE)
-        response = table.get_item(Key={"user_id": user_id})
-        if "Item" not in response:
+        status, cart = change_line_quantity(table, user_id, product_id, 0)
+        if status == "no_cart":
             return cors_response(404, {"error": "Cart not found"})
-        cart = response["Item"]
-        items = [item for item in cart.get("items", []) if item["product_id"] != product_id]
-        cart["items"] = items
-        cart["total_amount"] = Decimal(str(sum(Decimal(str(item["price"])) * Decimal(str(item["quantity"])) for item in items)))
-        cart["updated_at"] = datetime.utcnow().isoformat()
-        table.put_item(Item=cart)
+        if status == "conflict":
+            return cors_response(409, {"error": "Cart was modified concurrently, please retry"})
         return cors_response(200, {"message": "Item removed from cart"})
+    except CartConflictError as e:
+        return cors_response(409, {"error": str(e)})
     except Exception as e:
         print("Error removing from cart", e)
         return cors_response(500, {"error": str(e)})
 
+def create_guest_cart_id():
+    """Issues a signed guest ID; the cart itself is created by the first add."""
+    guest_id = sign_guest_id(str(uuid.uuid4()))
+    return cors_response(201, {"guest_id": guest_id})
+
 def clear_cart(user_id):
     """Clears the user's cart."""
     try:
         table = dynamodb.Table(CARTS_TABLE)
-        table.delete_item(Key={"user_id": user_id})
+        response = table.delete_item(Key={"user_id": user_id}, ReturnValues="ALL_OLD")
+        if STOCK_RESERVATIONS_ENABLED and "Attributes" in response:
+            for line in cart_lines(response["Attributes"]):
+                release_stock(line["product_id"], user_id)
         return cors_response(200, {"message": "Cart cleared"})
     except Exception as e:
         print("Error clearing cart", e)
@@ -176,12 +725,20 @@ def lambda_handler(event, context):
     if http_method == "OPTIONS":
         return cors_response(200, {})
 
-    user_id = extract_user_from_token(event)
+    if http_method == "POST" and path.rstrip("/").endswith("/guest"):
+        return create_guest_cart_id()
+
+    user_id = extract_cart_owner(event)
     if not user_id:
         return cors_response(401, {"error": "Authentication required"})
 
-    if http_method == "GET" and "items" not in path:
-        return get_cart(user_id)
+    if http_method == "GET" and path.rstrip("/").endswith("/summary"):
+        return get_cart_summary(user_id)
+    elif http_method == "GET" and "items" not in path:
+        query_params = event.get("queryStringParameters") or {}
+        return get_cart(user_id, query_params.get("revalidate") == "true")
+    elif http_method == "POST" and path.rstrip("/").endswith("items:batch"):
+        return add_items_to_cart(user_id, body or {})
     elif http_method == "POST" and "items" in path:
         return add_to_cart(user_id, body or {})
     elif http_method == "PUT" and product_id:
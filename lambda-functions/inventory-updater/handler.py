@@ -1,17 +1,86 @@
+"""
+Inventory updater
+Runs on a schedule and releases lapsed stock holds. cart-api takes a hold
+(a stock-holds item keyed by product_id and holder, next to the product's
+`available` counter in the inventory table) when an item is added to a cart;
+a hold nobody confirmed at checkout is returned to `available` here once it
+expires.
+"""
 import json
 import boto3
 import os
+import time
+from botocore.exceptions import ClientError
+
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+INVENTORY_TABLE = os.getenv('INVENTORY_TABLE', 'ekart-inventory-dev')
+STOCK_HOLDS_TABLE = os.getenv('STOCK_HOLDS_TABLE', 'ekart-stock-holds-dev')
+
+def release_hold(hold):
+    """
+    Returns one expired hold to available and deletes it, unless the cart
+    refreshed it meanwhile. A hold whose product was deleted is just dropped.
+    """
+    delete = {
+        'TableName': STOCK_HOLDS_TABLE,
+        'Key': {'product_id': hold['product_id'], 'holder': hold['holder']},
+        'ConditionExpression': 'quantity = :held AND expires_at = :expires_at',
+        'ExpressionAttributeValues': {':held': hold['quantity'], ':expires_at': hold['expires_at']}
+    }
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {'Delete': delete},
+            {'Update': {
+                'TableName': INVENTORY_TABLE,
+                'Key': {'product_id': hold['product_id']},
+                'UpdateExpression': 'SET available = available + :held',
+                'ConditionExpression': 'attribute_exists(available)',
+                'ExpressionAttributeValues': {':held': hold['quantity']}
+            }}
+        ])
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        if reasons[:2] != ['None', 'ConditionalCheckFailed']:
+            return False
+    try:
+        dynamodb.meta.client.delete_item(**delete)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
 
 def lambda_handler(event, context):
     """
-    Update inventory levels based on orders
+    Release expired stock holds
     """
     print(f"Inventory updater invoked with event: {json.dumps(event)}")
-    
+
     try:
+        table = dynamodb.Table(STOCK_HOLDS_TABLE)
+        now = int(time.time())
+        released = 0
+        scan_kwargs = {
+            'FilterExpression': 'expires_at < :now',
+            'ExpressionAttributeValues': {':now': now},
+            'ConsistentRead': True
+        }
+        while True:
+            response = table.scan(**scan_kwargs)
+            for hold in response.get('Items', []):
+                released += int(release_hold(hold))
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        print(f"Released {released} expired stock holds")
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Inventory updated successfully'})
+            'body': json.dumps({'message': 'Inventory updated successfully', 'released': released})
         }
     except Exception as e:
         print(f"Error updating inventory: {str(e)}")
@@ -0,0 +1,158 @@
+"""
+Order archiver
+Runs daily and moves delivered orders that have not changed for
+ARCHIVE_AFTER_DAYS out of the orders table into gzip column-major JSON files
+in S3, partitioned as orders/seller_id=<seller>/month=<YYYY-MM>/<run>.json.gz.
+A file is a run of gzip members, each one JSON line holding a row group of
+up to ARCHIVE_ROW_GROUP_SIZE orders, so readers can stream it group by group.
+Each archived order is replaced by a small stub (no seller_id, so it drops
+out of both seller indexes) that points at its file and the byte range of
+its row group; orders-api reads the files back when a history query reaches
+archived orders.
+"""
+import gzip
+import json
+import boto3
+import os
+import secrets
+import time
+from decimal import Decimal
+from datetime import datetime, timedelta
+from botocore.exceptions import ClientError
+
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+s3 = boto3.client('s3', endpoint_url=endpoint_url)
+ORDERS_TABLE = os.getenv('ORDERS_TABLE', 'ekart-orders-dev')
+ARCHIVE_BUCKET = os.getenv('ARCHIVE_BUCKET', 'ekart-order-archive-dev')
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+
+ARCHIVE_FORMAT = 'ekart-orders-columnar/1'
+# Orders buffered before their partitions are written out
+ARCHIVE_BATCH_SIZE = 1000
+# Orders per row group: the most a reader decodes at once
+ARCHIVE_ROW_GROUP_SIZE = 100
+# Attributes kept on the stub: enough for buyer-created-index listings and to find the file
+STUB_ATTRIBUTES = ['order_id', 'buyer_id', 'created_at', 'display_id', 'status', 'currency', 'total_cents', 'total_amount']
+
+def decimal_default(obj):
+    """JSON serializer for Decimal objects"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError
+
+def columnar(orders):
+    """One list per attribute instead of one object per order; absent attributes are null"""
+    columns = sorted({name for order in orders for name in order})
+    return {
+        'format': ARCHIVE_FORMAT,
+        'rows': len(orders),
+        'columns': columns,
+        'data': {name: [order.get(name) for order in orders] for name in columns}
+    }
+
+def partition_key(seller_id, month, batch_id):
+    return f"orders/seller_id={seller_id}/month={month}/{batch_id}.json.gz"
+
+def stub_order(order, key, byte_range):
+    """Replaces the order with its stub unless it changed since it was read"""
+    stub = {name: order[name] for name in STUB_ATTRIBUTES if name in order}
+    stub.update({'archive_key': key, 'archive_range': byte_range, 'archived_at': datetime.utcnow().isoformat()})
+    try:
+        dynamodb.Table(ORDERS_TABLE).put_item(
+            Item=stub,
+            ConditionExpression='updated_at = :updated_at AND attribute_exists(seller_id)',
+            ExpressionAttributeValues={':updated_at': order['updated_at']}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+def put_partition(key, orders):
+    """Writes the file; returns each order's row group as an HTTP byte range ('bytes=<first>-<last>')"""
+    members, ranges, offset = [], [], 0
+    for start in range(0, len(orders), ARCHIVE_ROW_GROUP_SIZE):
+        group = orders[start:start + ARCHIVE_ROW_GROUP_SIZE]
+        member = gzip.compress(json.dumps(columnar(group), default=decimal_default).encode('utf-8') + b'\n')
+        members.append(member)
+        ranges += [f"bytes={offset}-{offset + len(member) - 1}"] * len(group)
+        offset += len(member)
+    s3.put_object(Bucket=ARCHIVE_BUCKET, Key=key, Body=b''.join(members), ContentType='application/json', ContentEncoding='gzip')
+    return ranges
+
+def move_stub_range(order_id, key, byte_range):
+    """Points a stub at its row group in the rewritten file (readers fall back to the whole file until then)"""
+    try:
+        dynamodb.Table(ORDERS_TABLE).update_item(
+            Key={'order_id': order_id},
+            UpdateExpression='SET archive_range = :range',
+            ConditionExpression='archive_key = :key',
+            ExpressionAttributeValues={':range': byte_range, ':key': key}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+def write_partitions(orders, batch_id):
+    """Writes one file per (seller, month) and stubs the orders it holds. Returns orders stubbed"""
+    partitions = {}
+    for order in orders:
+        partitions.setdefault((order['seller_id'], order['created_at'][:7]), []).append(order)
+
+    archived = 0
+    for (seller_id, month), partition in partitions.items():
+        key = partition_key(seller_id, month, batch_id)
+        # The file is written before any stub points at it
+        ranges = put_partition(key, partition)
+        stubbed = [order for order, byte_range in zip(partition, ranges) if stub_order(order, key, byte_range)]
+        if len(stubbed) < len(partition):
+            # Orders that changed since the scan stay live; the file must only hold archived ones
+            if stubbed:
+                for order, byte_range in zip(stubbed, put_partition(key, stubbed)):
+                    move_stub_range(order['order_id'], key, byte_range)
+            else:
+                s3.delete_object(Bucket=ARCHIVE_BUCKET, Key=key)
+        archived += len(stubbed)
+    return archived
+
+def lambda_handler(event, context):
+    """
+    Archive delivered orders older than ARCHIVE_AFTER_DAYS
+    """
+    print(f"Order archiver invoked with event: {json.dumps(event)}")
+
+    try:
+        cutoff = (datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+        # Sortable and unique per run, so a rerun never overwrites an earlier file
+        run_id = f"{int(time.time() * 1000):013d}-{secrets.token_hex(4)}"
+        table = dynamodb.Table(ORDERS_TABLE)
+        scan_kwargs = {
+            'FilterExpression': '#status = :delivered AND updated_at < :cutoff AND attribute_exists(seller_id)',
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': {':delivered': 'delivered', ':cutoff': cutoff}
+        }
+        pending, archived, batches = [], 0, 0
+        while True:
+            response = table.scan(**scan_kwargs)
+            pending.extend(response.get('Items', []))
+            last_page = 'LastEvaluatedKey' not in response
+            if pending and (len(pending) >= ARCHIVE_BATCH_SIZE or last_page):
+                archived += write_partitions(pending, f"{run_id}-{batches:04d}")
+                pending, batches = [], batches + 1
+            if last_page:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        print(f"Archived {archived} orders delivered before {cutoff}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Orders archived successfully', 'archived': archived})
+        }
+    except Exception as e:
+        print(f"Error archiving orders: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
@@ -1,32 +1,577 @@
+"""
+Order processor
+Orchestrates asynchronous checkout as a saga, one per order, kept in the
+checkout sagas table. The orders queue carries the saga's steps:
+
+  start     creates the saga and queues the forward steps together; its
+            message is the order's OrderCreated event, routed from the
+            order events bus
+  reserve   takes the order's stock              (undone by release)
+  pay       charges the card                     (undone by refund)
+
+Each message is handled on its own, so reserve and pay run in parallel and
+checkout takes as long as the slower of the two. When both are done the
+order is confirmed; when either failed (out of stock, card declined,
+payment still failing after MAX_STEP_ATTEMPTS deliveries) the order is
+cancelled and whatever did succeed is compensated. Every step moves its saga field conditionally in the
+same transaction as its effect, so a redelivered message never applies twice.
+"""
 import json
 import boto3
 import os
+import time
+import secrets
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 
-def lambda_handler(event, context):
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+lambda_client = boto3.client('lambda', endpoint_url=endpoint_url)
+sqs = boto3.client('sqs', endpoint_url=endpoint_url)
+ORDERS_TABLE = os.getenv('ORDERS_TABLE', 'ekart-orders-dev')
+PRODUCTS_TABLE = os.getenv('PRODUCTS_TABLE', 'ekart-products-dev')
+INVENTORY_TABLE = os.getenv('INVENTORY_TABLE', 'ekart-inventory-dev')
+STOCK_HOLDS_TABLE = os.getenv('STOCK_HOLDS_TABLE', 'ekart-stock-holds-dev')
+SAGAS_TABLE = os.getenv('SAGAS_TABLE', 'ekart-checkout-sagas-dev')
+ORDER_QUEUE_URL = os.getenv('ORDER_QUEUE_URL')
+STOCK_RESERVATIONS_ENABLED = os.getenv('STOCK_RESERVATIONS_ENABLED', 'false').lower() == 'true'
+PAYMENT_FUNCTION = os.getenv('PAYMENT_FUNCTION')
+NOTIFICATION_FUNCTION = os.getenv('NOTIFICATION_FUNCTION')
+# Order events written with the order change, published by outbox-relay (see orders-api)
+OUTBOX_TABLE = os.getenv('OUTBOX_TABLE', 'ekart-outbox-dev')
+OUTBOX_TTL_SECONDS = int(os.getenv('OUTBOX_TTL_SECONDS', str(7 * 86400)))
+ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# Forward steps, started together, and the step that undoes each
+COMPENSATIONS = {'reserve': 'release', 'pay': 'refund'}
+# Deliveries of a failing forward step before the saga gives up and compensates
+MAX_STEP_ATTEMPTS = int(os.getenv('MAX_STEP_ATTEMPTS', '5'))
+SAGA_TTL_SECONDS = int(os.getenv('SAGA_TTL_SECONDS', str(30 * 86400)))
+# PaymentIntent statuses that could still be charged later; a failed pay step cancels them
+OPEN_INTENT_STATUSES = ['requires_payment_method', 'requires_confirmation', 'requires_action', 'requires_capture']
+STEP_WORKERS = 10
+
+_ulid_lock = threading.Lock()
+_last_ulid = [0, 0]
+
+def new_event_id():
+    """ULID, as orders-api issues them, so outbox entries sort in the order they were written"""
+    with _ulid_lock:
+        millis = int(time.time() * 1000)
+        if millis <= _last_ulid[0]:
+            millis, randomness = _last_ulid[0], _last_ulid[1] + 1
+        else:
+            randomness = secrets.randbits(80)
+        _last_ulid[0], _last_ulid[1] = millis, randomness
+    value, chars = (millis << 80) | randomness, []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(ULID_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+def status_sort_key(status, entered_at):
+    """seller-status-index sort key (see orders-api)"""
+    return f"{status}#{entered_at}"
+
+def status_changed_event(order_id, seller_id, status, now):
+    """OrderStatusChanged outbox entry, committed in the same transaction as the status change (see orders-api)"""
+    event_id = new_event_id()
+    return {'Put': {
+        'TableName': OUTBOX_TABLE,
+        'Item': {
+            'event_id': event_id,
+            'event_type': 'OrderStatusChanged',
+            'order_id': order_id,
+            'detail': json.dumps({
+                'event_id': event_id,
+                'order_id': order_id,
+                'seller_id': seller_id,
+                'status': status,
+                'changed_at': now
+            }),
+            'created_at': now,
+            'expires_at': int(time.time()) + OUTBOX_TTL_SECONDS
+        }
+    }}
+
+def quantities_by_product(items):
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + int(item['quantity'])
+    return quantities
+
+def stock_updates(items):
+    """Conditional stock decrements, one per product"""
+    return [
+        {
+            'TableName': PRODUCTS_TABLE,
+            'Key': {'product_id': product_id},
+            'UpdateExpression': 'SET stock_quantity = stock_quantity - :q',
+            'ConditionExpression': 'stock_quantity >= :q',
+            'ExpressionAttributeValues': {':q': quantity}
+        }
+        for product_id, quantity in quantities_by_product(items).items()
+    ]
+
+def inventory_records(product_ids):
+    response = dynamodb.meta.client.batch_get_item(RequestItems={INVENTORY_TABLE: {
+        'Keys': [{'product_id': pid} for pid in product_ids],
+        'ProjectionExpression': 'product_id, available',
+        'ConsistentRead': True
+    }})
+    return {record['product_id']: record for record in response['Responses'].get(INVENTORY_TABLE, [])}
+
+def held_quantities(holder, product_ids):
+    response = dynamodb.meta.client.batch_get_item(RequestItems={STOCK_HOLDS_TABLE: {
+        'Keys': [{'product_id': pid, 'holder': holder} for pid in product_ids],
+        'ConsistentRead': True
+    }})
+    return {hold['product_id']: int(hold['quantity']) for hold in response['Responses'].get(STOCK_HOLDS_TABLE, [])}
+
+def reservation_updates(holder, items):
     """
-    Process new orders from API Gateway or SQS
+    Transaction items that confirm the buyer's cart holds (see orders-api).
+    A held line deletes its hold item; a lapsed one takes from available.
+    """
+    if not STOCK_RESERVATIONS_ENABLED:
+        return []
+    quantities = quantities_by_product(items)
+    records = inventory_records(quantities)
+    held = held_quantities(holder, records) if records else {}
+
+    updates = []
+    for product_id, quantity in quantities.items():
+        record = records.get(product_id)
+        if not record or 'available' not in record:
+            continue
+        short = quantity - held.get(product_id, 0)
+        if product_id in held:
+            updates.append({'Delete': {
+                'TableName': STOCK_HOLDS_TABLE,
+                'Key': {'product_id': product_id, 'holder': holder},
+                'ConditionExpression': 'quantity = :held',
+                'ExpressionAttributeValues': {':held': held[product_id]}
+            }})
+        if short:
+            update = {
+                'TableName': INVENTORY_TABLE,
+                'Key': {'product_id': product_id},
+                'UpdateExpression': 'SET available = available - :q',
+                'ExpressionAttributeValues': {':q': short}
+            }
+            if short > 0:
+                update['ConditionExpression'] = 'available >= :q'
+            updates.append({'Update': update})
+    return updates
+
+def stock_returns(items):
+    """Gives a released order's stock back: products, and inventory when reservations are on"""
+    quantities = quantities_by_product(items)
+    updates = [
+        {
+            'TableName': PRODUCTS_TABLE,
+            'Key': {'product_id': product_id},
+            'UpdateExpression': 'SET stock_quantity = stock_quantity + :q',
+            'ExpressionAttributeValues': {':q': quantity}
+        }
+        for product_id, quantity in quantities.items()
+    ]
+    if STOCK_RESERVATIONS_ENABLED:
+        records = inventory_records(quantities)
+        updates += [
+            {
+                'TableName': INVENTORY_TABLE,
+                'Key': {'product_id': product_id},
+                'UpdateExpression': 'SET available = available + :q',
+                'ExpressionAttributeValues': {':q': quantity}
+            }
+            for product_id, quantity in quantities.items()
+            if 'available' in records.get(product_id, {})
+        ]
+    return updates
+
+def get_order(order_id):
+    return dynamodb.meta.client.get_item(
+        TableName=ORDERS_TABLE, Key={'order_id': order_id}, ConsistentRead=True
+    ).get('Item')
+
+def get_saga(order_id):
+    return dynamodb.meta.client.get_item(
+        TableName=SAGAS_TABLE, Key={'order_id': order_id}, ConsistentRead=True
+    ).get('Item')
+
+def saga_update(order_id, field, expected, value, **attributes):
+    """Moves one saga field from `expected` to `value`; the condition makes each step apply once"""
+    names = {'#field': field}
+    values = {':expected': expected, ':value': value, ':updated': datetime.utcnow().isoformat()}
+    assignments = ['#field = :value', 'updated_at = :updated']
+    for i, (name, attribute_value) in enumerate(attributes.items()):
+        names[f"#attr{i}"] = name
+        values[f":attr{i}"] = attribute_value
+        assignments.append(f"#attr{i} = :attr{i}")
+    return {
+        'TableName': SAGAS_TABLE,
+        'Key': {'order_id': order_id},
+        'UpdateExpression': 'SET ' + ', '.join(assignments),
+        'ConditionExpression': '#field = :expected',
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+
+def apply_step(transact_items):
+    """
+    Commits a step's transaction, usually led by its saga update. Returns
+    the cancellation reason codes, or None when it committed.
     """
-    print(f"Order processor invoked with event: {json.dumps(event)}")
-    
     try:
-        # Process order logic here
-        order_data = json.loads(event.get('body', '{}')) if 'body' in event else event
-        
-        response = {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Order processed successfully',
-                'order_id': order_data.get('order_id', 'unknown'),
-                'timestamp': datetime.utcnow().isoformat()
-            })
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        return [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+    return None
+
+def apply_update(update):
+    """Conditional single update; False when the condition did not hold"""
+    try:
+        dynamodb.meta.client.update_item(**update)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return False
+
+def fail_step(order_id, step, reason):
+    """Marks a pending forward step failed; the first failure is the one the order is cancelled for"""
+    update = saga_update(order_id, f"{step}_status", 'pending', 'failed')
+    update['UpdateExpression'] += ', failure = if_not_exists(failure, :reason)'
+    update['ExpressionAttributeValues'][':reason'] = reason
+    apply_update(update)
+
+def send_steps(order_id, steps):
+    """Queues saga steps; each message is handled on its own, so they run in parallel"""
+    if not steps:
+        return
+    response = sqs.send_message_batch(
+        QueueUrl=ORDER_QUEUE_URL,
+        Entries=[
+            {'Id': str(i), 'MessageBody': json.dumps({'order_id': order_id, 'step': step})}
+            for i, step in enumerate(steps)
+        ]
+    )
+    if response.get('Failed'):
+        raise RuntimeError(f"Could not queue saga steps for {order_id}: {response['Failed']}")
+
+def invoke_payment(path, body):
+    """
+    Calls payment-processor directly. A declined card (402) is returned like
+    any other result; anything else but 200 raises so the step is retried.
+    """
+    response = lambda_client.invoke(
+        FunctionName=PAYMENT_FUNCTION,
+        Payload=json.dumps({'httpMethod': 'POST', 'path': path, 'body': json.dumps(body)})
+    )
+    result = json.loads(response['Payload'].read())
+    if result.get('statusCode') not in (200, 402):
+        raise RuntimeError(f"Payment request {path} failed: {result.get('body')}")
+    return json.loads(result['body'])
+
+def cancel_order(order_id, reason):
+    """
+    Cancels a still-pending order together with its OrderStatusChanged
+    outbox entry; a no-op if something else moved it first
+    """
+    order = get_order(order_id)
+    if not order or order['status'] != 'pending':
+        return
+    now = datetime.utcnow().isoformat()
+    reasons = apply_step([{'Update': {
+        'TableName': ORDERS_TABLE,
+        'Key': {'order_id': order_id},
+        'UpdateExpression': 'SET #status = :cancelled, status_created_at = :status_created_at, cancel_reason = :reason, updated_at = :updated',
+        'ConditionExpression': '#status = :pending',
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {
+            ':cancelled': 'cancelled',
+            ':pending': 'pending',
+            ':status_created_at': status_sort_key('cancelled', now),
+            ':reason': reason,
+            ':updated': now
         }
-        
-        return response
-        
-    except Exception as e:
-        print(f"Error processing order: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
+    }}, status_changed_event(order_id, order['seller_id'], 'cancelled', now)])
+    if reasons and reasons[0] != 'ConditionalCheckFailed':
+        raise RuntimeError(f"Cancelling {order_id} failed: {reasons}")
+
+def notify_buyer(order):
+    """Fires the order notification once the order settled as confirmed or cancelled"""
+    if order.get('notified_at') or order['status'] == 'pending' or not NOTIFICATION_FUNCTION:
+        return
+    lambda_client.invoke(
+        FunctionName=NOTIFICATION_FUNCTION,
+        InvocationType='Event',
+        Payload=json.dumps({
+            'type': f"order_{order['status']}",
+            'order_id': order['order_id'],
+            'display_id': order.get('display_id'),
+            'buyer_id': order['buyer_id'],
+            'reason': order.get('cancel_reason')
+        })
+    )
+    dynamodb.meta.client.update_item(
+        TableName=ORDERS_TABLE,
+        Key={'order_id': order['order_id']},
+        UpdateExpression='SET notified_at = :now',
+        ExpressionAttributeValues={':now': datetime.utcnow().isoformat()}
+    )
+
+def start(order_id):
+    """Creates the order's saga and queues its forward steps"""
+    saga = get_saga(order_id)
+    if not saga:
+        order = get_order(order_id)
+        if not order or order['status'] != 'pending':
+            print(f"Order {order_id} is not awaiting checkout, skipping")
+            return
+        now = datetime.utcnow().isoformat()
+        needs_payment = order.get('payment_method', 'card') == 'card' and PAYMENT_FUNCTION
+        saga = {
+            'order_id': order_id,
+            'state': 'running',
+            'reserve_status': 'pending',
+            'pay_status': 'pending' if needs_payment else 'skipped',
+            'created_at': now,
+            'updated_at': now,
+            'expires_at': int(time.time()) + SAGA_TTL_SECONDS
         }
+        try:
+            dynamodb.meta.client.put_item(
+                TableName=SAGAS_TABLE, Item=saga, ConditionExpression='attribute_not_exists(order_id)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            saga = get_saga(order_id)
+    if saga['state'] == 'running':
+        # Also covers a redelivered start whose steps were never queued
+        send_steps(order_id, [step for step in COMPENSATIONS if saga[f"{step}_status"] == 'pending'])
+    advance(order_id)
+
+def reserve(order_id):
+    """Takes the order's stock, together with marking the step done"""
+    saga = get_saga(order_id)
+    if saga['reserve_status'] == 'pending':
+        order = get_order(order_id)
+        transact_items = [{'Update': saga_update(order_id, 'reserve_status', 'pending', 'done')}]
+        transact_items += [{'Update': update} for update in stock_updates(order['items'])]
+        transact_items += reservation_updates(order['buyer_id'], order['items'])
+        reasons = apply_step(transact_items)
+        # reasons[0] failing means another delivery already finished the step
+        if reasons and reasons[0] != 'ConditionalCheckFailed':
+            if 'ConditionalCheckFailed' not in reasons[1:]:
+                raise RuntimeError(f"Stock reservation for {order_id} failed: {reasons}")
+            fail_step(order_id, 'reserve', 'out_of_stock')
+    advance(order_id)
+
+def payment_status_update(order_id, payment_status, **attributes):
+    """Order update recording where its payment stands"""
+    names = {}
+    values = {':payment_status': payment_status, ':updated': datetime.utcnow().isoformat()}
+    assignments = ['payment_status = :payment_status', 'updated_at = :updated']
+    for i, (name, value) in enumerate(attributes.items()):
+        names[f"#attr{i}"] = name
+        values[f":attr{i}"] = value
+        assignments.append(f"#attr{i} = :attr{i}")
+    return {'Update': {
+        'TableName': ORDERS_TABLE,
+        'Key': {'order_id': order_id},
+        'UpdateExpression': 'SET ' + ', '.join(assignments),
+        **({'ExpressionAttributeNames': names} if names else {}),
+        'ExpressionAttributeValues': values
+    }}
+
+def pay(order_id):
+    """
+    Charges the card: creates the payment intent and confirms it with the
+    order's payment method. The idempotency key makes a repeated call return
+    the same intent. Anything but a succeeded intent (declined, needs customer
+    action, no payment method) fails the step, and an intent left open is
+    cancelled so it can never be charged later.
+    """
+    saga = get_saga(order_id)
+    if saga['pay_status'] == 'pending':
+        order = get_order(order_id)
+        intent = {'status': 'requires_payment_method'}
+        if order.get('payment_method_id'):
+            intent = invoke_payment('/payments/create-payment-intent', {
+                'amount': int(order['total_cents']),
+                'currency': order.get('currency', 'USD').lower(),
+                'payment_method': order['payment_method_id'],
+                'idempotency_key': f"checkout-{order_id}"
+            })
+        intent_id = intent.get('payment_intent_id')
+        if intent['status'] == 'succeeded':
+            step = saga_update(order_id, 'pay_status', 'pending', 'done', payment_intent_id=intent_id)
+        else:
+            if intent_id and intent['status'] in OPEN_INTENT_STATUSES:
+                invoke_payment('/payments/cancel-payment-intent', {
+                    'payment_intent_id': intent_id,
+                    'idempotency_key': f"checkout-{order_id}-void"
+                })
+            step = saga_update(order_id, 'pay_status', 'pending', 'failed')
+            step['UpdateExpression'] += ', failure = if_not_exists(failure, :reason)'
+            step['ExpressionAttributeValues'][':reason'] = 'payment_declined'
+        reasons = apply_step([
+            {'Update': step},
+            payment_status_update(order_id, intent['status'], **({'payment_intent_id': intent_id} if intent_id else {}))
+        ])
+        if reasons and reasons[0] != 'ConditionalCheckFailed':
+            raise RuntimeError(f"Recording payment for {order_id} failed: {reasons}")
+        if reasons and intent['status'] == 'succeeded' and get_saga(order_id)['pay_status'] == 'failed':
+            # The step was given up on while this charge went through: it must not stay
+            invoke_payment('/payments/refund-payment-intent', {
+                'payment_intent_id': intent_id,
+                'idempotency_key': f"checkout-{order_id}-refund"
+            })
+    advance(order_id)
+
+def release(order_id):
+    """Compensates reserve: gives the stock back"""
+    saga = get_saga(order_id)
+    if saga['reserve_status'] == 'done':
+        order = get_order(order_id)
+        transact_items = [{'Update': saga_update(order_id, 'reserve_status', 'done', 'released')}]
+        transact_items += [{'Update': update} for update in stock_returns(order['items'])]
+        reasons = apply_step(transact_items)
+        if reasons and reasons[0] != 'ConditionalCheckFailed':
+            raise RuntimeError(f"Stock release for {order_id} failed: {reasons}")
+    advance(order_id, requeue=False)
+
+def refund(order_id):
+    """Compensates pay: refunds the captured charge"""
+    saga = get_saga(order_id)
+    if saga['pay_status'] == 'done':
+        invoke_payment('/payments/refund-payment-intent', {
+            'payment_intent_id': saga['payment_intent_id'],
+            'idempotency_key': f"checkout-{order_id}-refund"
+        })
+        reasons = apply_step([
+            {'Update': saga_update(order_id, 'pay_status', 'done', 'refunded')},
+            payment_status_update(order_id, 'refunded')
+        ])
+        if reasons and reasons[0] != 'ConditionalCheckFailed':
+            raise RuntimeError(f"Recording refund for {order_id} failed: {reasons}")
+    advance(order_id, requeue=False)
+
+def confirm(order_id):
+    """Confirms the order, with its OrderStatusChanged outbox entry, and closes the saga in one transaction"""
+    order = get_order(order_id)
+    now = datetime.utcnow().isoformat()
+    reasons = apply_step([
+        {'Update': saga_update(order_id, 'state', 'running', 'confirmed')},
+        {'Update': {
+            'TableName': ORDERS_TABLE,
+            'Key': {'order_id': order_id},
+            'UpdateExpression': 'SET #status = :confirmed, status_created_at = :status_created_at, updated_at = :updated',
+            'ConditionExpression': '#status = :pending',
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': {
+                ':confirmed': 'confirmed',
+                ':pending': 'pending',
+                ':status_created_at': status_sort_key('confirmed', now),
+                ':updated': now
+            }
+        }},
+        status_changed_event(order_id, order['seller_id'], 'confirmed', now)
+    ])
+    if not reasons or reasons[0] == 'ConditionalCheckFailed':
+        return
+    if reasons[1] != 'ConditionalCheckFailed':
+        raise RuntimeError(f"Confirming {order_id} failed: {reasons}")
+    # The seller moved the order first: keep what they decided
+    status = get_order(order_id)['status']
+    if status == 'pending':
+        raise RuntimeError(f"Confirming {order_id} failed: {reasons}")
+    if status == 'cancelled':
+        apply_update(saga_update(order_id, 'state', 'running', 'compensating', failure='order_cancelled'))
+    else:
+        apply_update(saga_update(order_id, 'state', 'running', 'confirmed'))
+
+def advance(order_id, requeue=True):
+    """
+    Moves the saga on from whatever state it is in; every step calls it last,
+    and calling it again is harmless. Compensations are queued by forward
+    steps (requeue), so a retried one queues them again if it crashed first.
+    """
+    saga = get_saga(order_id)
+    if saga['state'] == 'running':
+        statuses = [saga[f"{step}_status"] for step in COMPENSATIONS]
+        if 'pending' in statuses:
+            return
+        if all(status in ('done', 'skipped') for status in statuses):
+            confirm(order_id)
+        else:
+            apply_update(saga_update(order_id, 'state', 'running', 'compensating'))
+        saga = get_saga(order_id)
+
+    if saga['state'] == 'compensating':
+        cancel_order(order_id, saga.get('failure', 'checkout_failed'))
+        outstanding = [undo for step, undo in COMPENSATIONS.items() if saga[f"{step}_status"] == 'done']
+        if outstanding:
+            if requeue:
+                send_steps(order_id, outstanding)
+            return
+        apply_update(saga_update(order_id, 'state', 'compensating', 'cancelled'))
+        saga['state'] = 'cancelled'
+
+    if saga['state'] in ('confirmed', 'cancelled'):
+        notify_buyer(get_order(order_id))
+
+STEP_HANDLERS = {
+    'start': start,
+    'reserve': reserve,
+    'pay': pay,
+    'release': release,
+    'refund': refund
+}
+
+def process_message(record):
+    message = json.loads(record['body'])
+    if 'detail-type' in message:
+        # An OrderCreated event from the bus starts the order's saga
+        message = message['detail']
+    order_id, step = message['order_id'], message.get('step', 'start')
+    try:
+        STEP_HANDLERS[step](order_id)
+    except Exception:
+        attempts = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+        if step not in COMPENSATIONS or attempts < MAX_STEP_ATTEMPTS:
+            raise
+        # A forward step that keeps failing cancels the checkout; compensations retry until they succeed
+        print(f"Giving up on {step} for {order_id} after {attempts} attempts")
+        fail_step(order_id, step, f"{step}_failed")
+        advance(order_id)
+
+def lambda_handler(event, context):
+    """
+    Process a batch of saga step messages concurrently. Failed messages are
+    reported in batchItemFailures so SQS redelivers only those.
+    """
+    print(f"Order processor invoked with event: {json.dumps(event)}")
+
+    def run(record):
+        try:
+            process_message(record)
+            return None
+        except Exception as e:
+            print(f"Error processing order message {record.get('messageId')}: {str(e)}")
+            return {'itemIdentifier': record['messageId']}
+
+    records = event.get('Records', [])
+    # The low-level clients used throughout are thread-safe
+    with ThreadPoolExecutor(max_workers=max(1, min(len(records), STEP_WORKERS))) as executor:
+        failures = [failure for failure in executor.map(run, records) if failure]
+
+    print(f"Processed {len(records) - len(failures)} order messages, {len(failures)} failed")
+    return {'batchItemFailures': failures}
@@ -1,21 +1,91 @@
 """
 Lambda function for Orders API
-Handles: GET /orders, GET /orders/{id}, POST /orders, PUT /orders/{id}/status
+Handles: GET /orders, GET /orders/{id}, POST /orders, PUT /orders/{id}/status,
+POST /orders/status:batch, POST /orders/export, GET /orders/export/{job_id}
 """
+import csv
+import gzip
+import io
 import json
 import boto3
 import os
-import uuid
+import time
+import hashlib
+import base64
+import itertools
+import secrets
+import threading
+import zlib
 import jwt
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 
 # AWS clients
 endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
 dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+s3 = boto3.client('s3', endpoint_url=endpoint_url)
+lambda_client = boto3.client('lambda', endpoint_url=endpoint_url)
 ORDERS_TABLE = os.getenv('ORDERS_TABLE', 'ekart-orders-dev')
 CARTS_TABLE = os.getenv('CARTS_TABLE', 'ekart-carts-dev')
 PRODUCTS_TABLE = os.getenv('PRODUCTS_TABLE', 'ekart-products-dev')
+DEFAULT_CURRENCY = os.getenv('CURRENCY', 'USD')
+INVENTORY_TABLE = os.getenv('INVENTORY_TABLE', 'ekart-inventory-dev')
+STOCK_HOLDS_TABLE = os.getenv('STOCK_HOLDS_TABLE', 'ekart-stock-holds-dev')
+STOCK_RESERVATIONS_ENABLED = os.getenv('STOCK_RESERVATIONS_ENABLED', 'false').lower() == 'true'
+# Delivered orders moved out of the table by order-archiver
+ARCHIVE_BUCKET = os.getenv('ARCHIVE_BUCKET', 'ekart-order-archive-dev')
+# Archive files kept decoded per container
+ARCHIVE_CACHE_SIZE = 32
+EXPORTS_BUCKET = os.getenv('EXPORTS_BUCKET', 'ekart-exports-dev')
+EXPORT_URL_TTL_SECONDS = int(os.getenv('EXPORT_URL_TTL_SECONDS', '3600'))
+# Export jobs: accepted by the API, run by an async invocation of this function, polled for the link
+EXPORT_JOBS_TABLE = os.getenv('EXPORT_JOBS_TABLE', 'ekart-export-jobs-dev')
+EXPORT_JOB_TTL_SECONDS = int(os.getenv('EXPORT_JOB_TTL_SECONDS', '86400'))
+# A job still running after the function's longest run (Lambda's 15 minute limit) was cut off
+EXPORT_RUN_SECONDS = 900
+# Compressed bytes buffered per multipart upload part (S3's minimum part size)
+EXPORT_PART_SIZE = 5 * 1024 * 1024
+EXPORT_COLUMNS = [
+    'order_id', 'display_id', 'created_at', 'status', 'payment_status', 'currency',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'line_total', 'order_total'
+]
+# When on, checkout only records the orders and order-processor's saga does the rest
+ASYNC_CHECKOUT = os.getenv('ASYNC_CHECKOUT', 'false').lower() == 'true'
+# Order events written with the order change, published by outbox-relay
+OUTBOX_TABLE = os.getenv('OUTBOX_TABLE', 'ekart-outbox-dev')
+OUTBOX_TTL_SECONDS = int(os.getenv('OUTBOX_TTL_SECONDS', str(7 * 86400)))
+# DynamoDB limit on operations in one TransactWriteItems call
+MAX_TRANSACTION_ITEMS = 100
+# Orders per atomic batch transaction: each takes its update and its outbox entry
+ATOMIC_CHUNK_SIZE = MAX_TRANSACTION_ITEMS // 2
+# Crockford base32, as used by ULIDs: no I, L, O or U
+ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ORDER_ID_PREFIX = 'EK'
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']
+# Status -> statuses an order may move to from it; delivered and cancelled are final
+ALLOWED_TRANSITIONS = {
+    'pending': ['confirmed', 'cancelled'],
+    'confirmed': ['processing', 'cancelled'],
+    'processing': ['shipped', 'cancelled'],
+    'shipped': ['delivered'],
+    'delivered': [],
+    'cancelled': []
+}
+# Orders per POST /orders/status:batch, and how many are updated at once
+MAX_BATCH_ORDERS = 100
+BATCH_WORKERS = 16
+# Tries at a cancellation whose order changed status between the read and the write
+MAX_TRANSITION_ATTEMPTS = 3
+# Order history page size (default and maximum)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+IDEMPOTENCY_TABLE = os.getenv('IDEMPOTENCY_TABLE', 'ekart-idempotency-dev')
+# How long a checkout's Idempotency-Key is remembered
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# An in-flight marker older than this (longer than the Lambda timeout) belongs to a request that died
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', '60'))
 
 def extract_user_from_token(event):
     """Extract user ID and user type from JWT token"""
@@ -50,7 +120,7 @@ def extract_user_from_token(event):
 def decimal_default(obj):
     """JSON serializer for Decimal objects"""
     if isinstance(obj, Decimal):
-        return float(obj)
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
     raise TypeError
 
 def cors_response(status_code, body):
@@ -60,35 +130,618 @@ def cors_response(status_code, body):
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+            'Access-Control-Allow-Headers': 'Content-Type,Authorization,Idempotency-Key',
             'Access-Control-Allow-Methods': 'GET,POST,PUT,OPTIONS'
         },
         'body': json.dumps(body, default=decimal_default)
     }
 
-def get_orders(user_id, user_type):
-    """Get orders for user (buyer or seller)"""
+_ulid_lock = threading.Lock()
+_last_ulid = [0, 0]
+
+def encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ULID_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+def new_order_id():
+    """
+    ULID: 48-bit millisecond timestamp then 80 random bits, as 26 Crockford
+    base32 characters, so IDs sort by creation time. IDs issued in the same
+    millisecond by this container increment the random part to stay ordered.
+    """
+    with _ulid_lock:
+        millis = int(time.time() * 1000)
+        if millis <= _last_ulid[0]:
+            millis, randomness = _last_ulid[0], _last_ulid[1] + 1
+        else:
+            randomness = secrets.randbits(80)
+        _last_ulid[0], _last_ulid[1] = millis, randomness
+    return encode_base32(millis, 10) + encode_base32(randomness, 16)
+
+def display_order_id(order_id, created_at):
+    """Human-friendly form for receipts and support, e.g. EK-20240501-7ZQ4-KM2D"""
+    tail = order_id[-8:]
+    return f"{ORDER_ID_PREFIX}-{created_at[:10].replace('-', '')}-{tail[:4]}-{tail[4:]}"
+
+def to_cents(amount):
+    """Decimal money amount to integer minor units"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def from_cents(cents):
+    """Exact 2-decimal amount for integer minor units"""
+    return Decimal(int(cents)).scaleb(-2)
+
+def order_line(line):
+    """Cart line as an order line; older carts carry a decimal price instead of price_cents"""
+    price_cents = int(line['price_cents']) if 'price_cents' in line else to_cents(line['price'])
+    return dict(line, price_cents=price_cents, price=from_cents(price_cents))
+
+def cart_lines(cart):
+    """Cart lines as a list; carts store them in a map keyed by product_id"""
+    items = cart.get('items') or {}
+    if isinstance(items, list):
+        return items
+    return sorted(items.values(), key=lambda line: line.get('added_at', ''))
+
+def quantities_by_product(items):
+    """Total quantity per product_id across order lines"""
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + int(item['quantity'])
+    return quantities
+
+def inventory_records(product_ids):
+    """Inventory items (product_id, available) for product_ids, by product_id"""
+    product_ids = list(product_ids)
+    records = {}
+    for start in range(0, len(product_ids), 100):
+        response = dynamodb.meta.client.batch_get_item(RequestItems={INVENTORY_TABLE: {
+            'Keys': [{'product_id': pid} for pid in product_ids[start:start + 100]],
+            'ProjectionExpression': 'product_id, available',
+            'ConsistentRead': True
+        }})
+        for record in response['Responses'].get(INVENTORY_TABLE, []):
+            records[record['product_id']] = record
+    return records
+
+def held_quantities(holder, product_ids):
+    """Units of each product held by one cart (stock-holds items written by cart-api)"""
+    product_ids = list(product_ids)
+    held = {}
+    for start in range(0, len(product_ids), 100):
+        response = dynamodb.meta.client.batch_get_item(RequestItems={STOCK_HOLDS_TABLE: {
+            'Keys': [{'product_id': pid, 'holder': holder} for pid in product_ids[start:start + 100]],
+            'ConsistentRead': True
+        }})
+        for hold in response['Responses'].get(STOCK_HOLDS_TABLE, []):
+            held[hold['product_id']] = int(hold['quantity'])
+    return held
+
+def reservation_updates(holder, items):
+    """
+    Transaction items that confirm a cart's stock holds at checkout. A held
+    line deletes its hold item (available was already reduced when it was
+    taken) and settles any difference with available; a line whose hold
+    lapsed takes its units from available directly. Products that were never
+    reserved have no inventory record to update.
+    """
+    if not STOCK_RESERVATIONS_ENABLED:
+        return []
+    quantities = quantities_by_product(items)
+    records = inventory_records(quantities)
+    held = held_quantities(holder, records)
+
+    updates = []
+    for product_id, quantity in quantities.items():
+        record = records.get(product_id)
+        if not record or 'available' not in record:
+            continue
+        short = quantity - held.get(product_id, 0)
+        if product_id in held:
+            updates.append({'Delete': {
+                'TableName': STOCK_HOLDS_TABLE,
+                'Key': {'product_id': product_id, 'holder': holder},
+                'ConditionExpression': 'quantity = :held',
+                'ExpressionAttributeValues': {':held': held[product_id]}
+            }})
+        if short:
+            update = {
+                'TableName': INVENTORY_TABLE,
+                'Key': {'product_id': product_id},
+                'UpdateExpression': 'SET available = available - :q',
+                'ExpressionAttributeValues': {':q': short}
+            }
+            if short > 0:
+                update['ConditionExpression'] = 'available >= :q'
+            updates.append({'Update': update})
+    return updates
+
+def encode_token(last_key):
+    """Opaque next_token for a query's LastEvaluatedKey"""
+    return base64.urlsafe_b64encode(json.dumps(last_key, default=decimal_default).encode()).decode()
+
+def decode_token(token):
+    return json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+
+def status_sort_key(status, entered_at):
+    """
+    seller-status-index sort key: one seller's orders grouped by status, ordered
+    by when each entered it (created_at for pending). Written in the same
+    update as the status, so no read is needed to build it.
+    """
+    return f"{status}#{entered_at}"
+
+def transition_sources(status):
+    """Statuses from which an order may move to `status`"""
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+
+def created_at_condition(attribute, date_from, date_to):
+    """Condition for a from/to range; a bare date `to` covers that whole day"""
+    if date_to and 'T' not in date_to:
+        date_to += 'T23:59:59.999999'
+    if date_from and date_to:
+        return f' AND {attribute} BETWEEN :from AND :to', {':from': date_from, ':to': date_to}
+    if date_from:
+        return f' AND {attribute} >= :from', {':from': date_from}
+    if date_to:
+        return f' AND {attribute} <= :to', {':to': date_to}
+    return '', {}
+
+def orders_query(user_id, user_type, status, date_from, date_to):
+    """
+    Query arguments for a user's orders, newest first. from/to always apply to
+    created_at; a seller's ?status= is ordered by when orders entered it.
+    """
+    filters = []
+    if user_type == 'seller' and status:
+        index_name, key_name = 'seller-status-index', 'seller_id'
+        range_condition, range_values = ' AND begins_with(status_created_at, :prefix)', {':prefix': status_sort_key(status, '')}
+        # The index sorts on the time the order entered the status, not created_at
+        date_condition, date_values = created_at_condition('created_at', date_from, date_to)
+        if date_condition:
+            filters.append(date_condition[len(' AND '):])
+            range_values.update(date_values)
+    elif user_type == 'seller':
+        index_name, key_name = 'seller-created-index', 'seller_id'
+        range_condition, range_values = created_at_condition('created_at', date_from, date_to)
+    else:
+        index_name, key_name = 'buyer-created-index', 'buyer_id'
+        range_condition, range_values = created_at_condition('created_at', date_from, date_to)
+    
+    kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': f'{key_name} = :user_id{range_condition}',
+        'ExpressionAttributeValues': {':user_id': user_id, **range_values},
+        'ScanIndexForward': False
+    }
+    if status and user_type != 'seller':
+        # Buyers have few orders per status; filtering their index is cheap enough
+        filters.append('#status = :status')
+        kwargs['ExpressionAttributeNames'] = {'#status': 'status'}
+        kwargs['ExpressionAttributeValues'][':status'] = status
+    if filters:
+        kwargs['FilterExpression'] = ' AND '.join(filters)
+    return kwargs
+
+_archive_cache = {}
+
+def iter_archive(key):
+    """
+    Orders in one archive file, streamed: the file is a run of gzip members,
+    each one JSON line holding a column-major row group, so only the current
+    group is decoded in memory
+    """
+    body = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=key)['Body']
+    with gzip.GzipFile(fileobj=body) as stream:
+        for line in stream:
+            yield from group_orders(json.loads(line, parse_float=Decimal))
+
+def group_orders(group):
+    """Orders in one row group, rebuilt from its columns"""
+    data = group['data']
+    return [
+        {name: data[name][row] for name in group['columns'] if data[name][row] is not None}
+        for row in range(group['rows'])
+    ]
+
+def cache_archive(key, orders):
+    if len(_archive_cache) >= ARCHIVE_CACHE_SIZE:
+        _archive_cache.pop(next(iter(_archive_cache)))
+    _archive_cache[key] = orders
+
+def load_archive(key):
+    """Orders in one archive file, cached per container"""
+    if key not in _archive_cache:
+        cache_archive(key, list(iter_archive(key)))
+    return _archive_cache[key]
+
+def load_archive_group(key, byte_range):
+    """Orders in the one row group at byte_range (a stub's archive_range) of an archive file"""
+    if (key, byte_range) not in _archive_cache:
+        body = s3.get_object(Bucket=ARCHIVE_BUCKET, Key=key, Range=byte_range)['Body'].read()
+        cache_archive((key, byte_range), group_orders(json.loads(gzip.decompress(body), parse_float=Decimal)))
+    return _archive_cache[(key, byte_range)]
+
+def archived_order(stub):
+    """
+    The full order for an archive stub. Stubs carry the byte range of their
+    row group, so one small ranged GET serves every stub in the group; a
+    range that no longer holds the order (the archiver rewrote the file)
+    falls back to reading the whole file.
+    """
+    if 'archive_range' in stub:
+        try:
+            for order in load_archive_group(stub['archive_key'], stub['archive_range']):
+                if order['order_id'] == stub['order_id']:
+                    return order
+        except (OSError, EOFError, ValueError, zlib.error) as e:
+            print(f"Archive range {stub['archive_range']} of {stub['archive_key']} is stale: {e}")
+    for order in load_archive(stub['archive_key']):
+        if order['order_id'] == stub['order_id']:
+            return order
+    return None
+
+def hydrate(orders):
+    """Swaps archive stubs for the full orders from their archive files"""
+    result = []
+    for order in orders:
+        if 'archive_key' in order:
+            order = dict(archived_order(order) or order, archived_at=order.get('archived_at'))
+        result.append(order)
+    return result
+
+def archive_months(seller_id, date_from, date_to):
+    """The seller's archived months within [from, to], newest first"""
+    prefix = f"orders/seller_id={seller_id}/month="
+    months = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=ARCHIVE_BUCKET, Prefix=prefix, Delimiter='/'):
+        months += [p['Prefix'][len(prefix):].rstrip('/') for p in page.get('CommonPrefixes', [])]
+    return sorted(
+        (m for m in months if (not date_from or m >= date_from[:7]) and (not date_to or m <= date_to[:7])),
+        reverse=True
+    )
+
+def archive_keys(seller_id, month):
+    """Files holding one archived month of the seller's orders"""
+    prefix = f"orders/seller_id={seller_id}/month={month}/"
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=ARCHIVE_BUCKET, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            yield obj['Key']
+
+def in_date_range(order, date_from, date_to):
+    if date_to and 'T' not in date_to:
+        date_to += 'T23:59:59.999999'
+    return (not date_from or order['created_at'] >= date_from) and (not date_to or order['created_at'] <= date_to)
+
+def archived_month_orders(seller_id, month, date_from, date_to):
+    """One archived month's orders within [from, to], newest first"""
+    orders = [
+        order for key in archive_keys(seller_id, month) for order in load_archive(key)
+        if in_date_range(order, date_from, date_to)
+    ]
+    return sorted(orders, key=lambda order: order['created_at'], reverse=True)
+
+def iter_archived_from(seller_id, date_from, date_to, position):
+    """
+    Archived orders within [from, to], newest first, each with its position
+    ({archive_month, archive_offset}), starting at position (None for the newest)
+    """
+    months = archive_months(seller_id, date_from, date_to)
+    if position:
+        months = [m for m in months if m <= position['archive_month']]
+    offset = position['archive_offset'] if position else 0
+    for month in months:
+        orders = archived_month_orders(seller_id, month, date_from, date_to)
+        for i in range(offset, len(orders)):
+            yield orders[i], {'archive_month': month, 'archive_offset': i}
+        offset = 0
+
+def seller_history_page(user_id, status, date_from, date_to, cursor, limit):
+    """
+    One page of a seller's live and archived orders, newest first, and the
+    cursor for the next ({live_key, live_done, archive_month, archive_offset,
+    archive_done}, or None at the end). Without ?status= both sources are in
+    created_at order and are merged on it. With ?status=delivered the live
+    slice is in delivery order, and the archive (orders delivered at least
+    ARCHIVE_AFTER_DAYS ago) follows it.
+    """
+    live, last_key = [], None
+    live_key, live_done = cursor.get('live_key'), cursor.get('live_done', False)
+    sort_key = 'status_created_at' if status else 'created_at'
+    if not live_done:
+        kwargs = orders_query(user_id, 'seller', status, date_from, date_to)
+        kwargs['Limit'] = limit
+        if live_key:
+            kwargs['ExclusiveStartKey'] = live_key
+        response = dynamodb.Table(ORDERS_TABLE).query(**kwargs)
+        live, last_key = response.get('Items', []), response.get('LastEvaluatedKey')
+    
+    archived, archive_done = None, cursor.get('archive_done', False)
+    if not archive_done and (not status or live_done or not last_key):
+        position = {name: cursor[name] for name in ('archive_month', 'archive_offset')} if 'archive_month' in cursor else None
+        # One more than a page, to tell whether the archive continues past it
+        archived = list(itertools.islice(iter_archived_from(user_id, date_from, date_to, position), limit + 1))
+    
+    entries = [(order, None) for order in live] + [(order, position) for order, position in archived or []]
+    if not status:
+        entries.sort(key=lambda entry: entry[0]['created_at'], reverse=True)
+    page = entries[:limit]
+    
+    taken_live = sum(1 for _, position in page if position is None)
+    next_cursor = {}
+    if live_done:
+        next_cursor['live_done'] = True
+    elif taken_live < len(live):
+        last = live[taken_live - 1] if taken_live else None
+        next_cursor['live_key'] = {name: last[name] for name in ('order_id', 'seller_id', sort_key)} if last else live_key
+    elif last_key:
+        next_cursor['live_key'] = last_key
+    else:
+        next_cursor['live_done'] = True
+    
+    if archived is None:
+        next_cursor.update({name: cursor[name] for name in ('archive_month', 'archive_offset', 'archive_done') if name in cursor})
+    elif len(page) - taken_live < len(archived):
+        next_cursor.update(archived[len(page) - taken_live][1])
+    else:
+        next_cursor['archive_done'] = True
+    
+    if next_cursor.get('live_done') and next_cursor.get('archive_done'):
+        next_cursor = None
+    return [order for order, _ in page], next_cursor
+
+def iter_archived_orders(seller_id, date_from, date_to, status):
+    """Every archived order of the seller within [from, to], streamed file by file"""
+    if status and status != 'delivered':
+        return
+    for month in archive_months(seller_id, date_from, date_to):
+        for key in archive_keys(seller_id, month):
+            yield from (order for order in iter_archive(key) if in_date_range(order, date_from, date_to))
+
+def get_orders(user_id, user_type, query_params):
+    """
+    Get orders for user (buyer or seller), newest first, one page at a time.
+    A seller's ?status= reads only that slice of seller-status-index.
+    Archived orders come back in full: a buyer's appear in place as stubs in
+    buyer-created-index, a seller's are merged in from the archive files
+    (seller_history_page).
+    """
     try:
         table = dynamodb.Table(ORDERS_TABLE)
+        try:
+            limit = min(max(int(query_params.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            start_key = decode_token(query_params['next_token']) if query_params.get('next_token') else None
+        except Exception:
+            return cors_response(400, {'error': 'Invalid limit or next_token'})
+        status = query_params.get('status')
+        if status and status not in ORDER_STATUSES:
+            return cors_response(400, {'error': 'Invalid status'})
+        
+        date_from, date_to = query_params.get('from'), query_params.get('to')
+        with_archive = user_type == 'seller' and status in (None, 'delivered')
+        
+        if with_archive:
+            cursor = start_key or {}
+            if cursor and 'live_done' not in cursor and 'live_key' not in cursor:
+                # Tokens issued before the merge: a live-only key, or a position in the archive after the live orders
+                cursor = dict(cursor, live_done=True) if 'archive_month' in cursor else {'live_key': cursor}
+            orders, cursor = seller_history_page(user_id, status, date_from, date_to, cursor, limit)
+            return cors_response(200, {
+                'orders': orders,
+                'next_token': encode_token(cursor) if cursor else None
+            })
+        
+        kwargs = orders_query(user_id, user_type, status, date_from, date_to)
+        kwargs['Limit'] = limit
+        if start_key:
+            kwargs['ExclusiveStartKey'] = start_key
+        response = table.query(**kwargs)
+        orders = hydrate(response.get('Items', []))
+        
+        last_key = response.get('LastEvaluatedKey')
+        return cors_response(200, {
+            'orders': orders,
+            'next_token': encode_token(last_key) if last_key else None
+        })
+    except Exception as e:
+        print(f"Error getting orders: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def iter_orders(query_kwargs):
+    """Yields every order a query matches, one page in memory at a time"""
+    table = dynamodb.Table(ORDERS_TABLE)
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs = dict(query_kwargs, ExclusiveStartKey=response['LastEvaluatedKey'])
+
+def iter_export_rows(orders):
+    """CSV lines for the export: a header, then one row per order line"""
+    line = io.StringIO()
+    writer = csv.writer(line)
+    
+    def render(row):
+        line.seek(0)
+        line.truncate()
+        writer.writerow(row)
+        return line.getvalue()
+    
+    yield render(EXPORT_COLUMNS)
+    for order in orders:
+        for item in order.get('items', []):
+            item = order_line(item)
+            yield render([
+                order['order_id'], order.get('display_id', ''), order.get('created_at', ''),
+                order.get('status', ''), order.get('payment_status', ''),
+                order.get('currency', DEFAULT_CURRENCY), item['product_id'], item.get('product_name', ''),
+                int(item['quantity']), item['price'], from_cents(item['price_cents'] * int(item['quantity'])),
+                order.get('total_amount', '')
+            ])
+
+def upload_gzip_parts(key, lines):
+    """
+    Gzips lines into an S3 multipart upload. Only the current part's
+    compressed bytes are held in memory. Returns the number of lines written.
+    """
+    upload_id = s3.create_multipart_upload(
+        Bucket=EXPORTS_BUCKET, Key=key, ContentType='text/csv', ContentEncoding='gzip'
+    )['UploadId']
+    parts = []
+    buffer = io.BytesIO()
+    
+    def flush():
+        response = s3.upload_part(
+            Bucket=EXPORTS_BUCKET, Key=key, UploadId=upload_id,
+            PartNumber=len(parts) + 1, Body=buffer.getvalue()
+        )
+        parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+        buffer.seek(0)
+        buffer.truncate()
+    
+    try:
+        count = 0
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+            for text in lines:
+                compressed.write(text.encode('utf-8'))
+                count += 1
+                if buffer.tell() >= EXPORT_PART_SIZE:
+                    flush()
+        # Closing the gzip stream wrote its trailer; the last part may be small
+        flush()
+        s3.complete_multipart_upload(
+            Bucket=EXPORTS_BUCKET, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+        return count
+    except Exception:
+        s3.abort_multipart_upload(Bucket=EXPORTS_BUCKET, Key=key, UploadId=upload_id)
+        raise
+
+def start_export(user_id, user_type, body):
+    """
+    Accept an export of the seller's orders (optionally filtered by
+    from/to/status) and return 202 with the job to poll. The export itself
+    runs in an async invocation of this function (run_export), outside the
+    API Gateway timeout.
+    """
+    try:
+        if user_type != 'seller':
+            return cors_response(403, {'error': 'Seller account required'})
+        status = body.get('status')
+        if status and status not in ORDER_STATUSES:
+            return cors_response(400, {'error': 'Invalid status'})
         
-        # Query based on user type
-        if user_type == 'seller':
-            response = table.query(
-                IndexName='seller-index',
-                KeyConditionExpression='seller_id = :seller_id',
-                ExpressionAttributeValues={':seller_id': user_id}
+        now = datetime.utcnow().isoformat()
+        job = {
+            'job_id': new_order_id(),
+            'seller_id': user_id,
+            'status': 'pending',
+            'filters': {name: body[name] for name in ('from', 'to', 'status') if body.get(name)},
+            'created_at': now,
+            'updated_at': now,
+            'expires_at': int(time.time()) + EXPORT_JOB_TTL_SECONDS
+        }
+        table = dynamodb.Table(EXPORT_JOBS_TABLE)
+        table.put_item(Item=job)
+        try:
+            lambda_client.invoke(
+                FunctionName=os.getenv('AWS_LAMBDA_FUNCTION_NAME', 'ekart-orders-api'),
+                InvocationType='Event',
+                Payload=json.dumps({'export_job_id': job['job_id']})
             )
-        else:
-            response = table.query(
-                IndexName='buyer-index',
-                KeyConditionExpression='buyer_id = :buyer_id',
-                ExpressionAttributeValues={':buyer_id': user_id}
+        except Exception as e:
+            table.update_item(
+                Key={'job_id': job['job_id']},
+                UpdateExpression='SET #status = :failed, #error = :error',
+                ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+                ExpressionAttributeValues={':failed': 'failed', ':error': 'Export could not be started'}
             )
+            raise
+        return cors_response(202, {'job_id': job['job_id'], 'status': job['status']})
+    except Exception as e:
+        print(f"Error starting order export: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def run_export(job_id):
+    """
+    Runs one export job: orders are paged in from DynamoDB and the archive
+    and streamed out as a gzip CSV in multipart parts, so memory stays
+    bounded however many orders there are. Claiming the job (pending ->
+    running) makes a redelivered invocation a no-op.
+    """
+    table = dynamodb.Table(EXPORT_JOBS_TABLE)
+    try:
+        job = table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET #status = :running, started_at = :now, updated_at = :now',
+            ConditionExpression='#status = :pending',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':running': 'running', ':pending': 'pending', ':now': datetime.utcnow().isoformat()},
+            ReturnValues='ALL_NEW'
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"Export job {job_id} was already claimed")
+        return
+    
+    seller_id, filters = job['seller_id'], job.get('filters', {})
+    try:
+        key = f"orders/{seller_id}/{job_id}.csv.gz"
+        query_kwargs = orders_query(seller_id, 'seller', filters.get('status'), filters.get('from'), filters.get('to'))
+        # Archived orders are out of the seller indexes, so they follow the live ones
+        orders = itertools.chain(
+            iter_orders(query_kwargs),
+            iter_archived_orders(seller_id, filters.get('from'), filters.get('to'), filters.get('status'))
+        )
+        rows = upload_gzip_parts(key, iter_export_rows(orders)) - 1
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET #status = :completed, export_key = :key, #rows = :rows, updated_at = :now',
+            ExpressionAttributeNames={'#status': 'status', '#rows': 'rows'},
+            ExpressionAttributeValues={':completed': 'completed', ':key': key, ':rows': rows, ':now': datetime.utcnow().isoformat()}
+        )
+        print(f"Export job {job_id} wrote {rows} rows to {key}")
+    except Exception as e:
+        print(f"Error exporting orders for job {job_id}: {e}")
+        table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET #status = :failed, #error = :error, updated_at = :now',
+            ExpressionAttributeNames={'#status': 'status', '#error': 'error'},
+            ExpressionAttributeValues={':failed': 'failed', ':error': str(e), ':now': datetime.utcnow().isoformat()}
+        )
+
+def get_export(job_id, user_id):
+    """An export job's status, with a presigned download link once it has completed"""
+    try:
+        job = dynamodb.Table(EXPORT_JOBS_TABLE).get_item(Key={'job_id': job_id}).get('Item')
+        if not job or job['seller_id'] != user_id:
+            return cors_response(404, {'error': 'Export not found'})
         
-        orders = response.get('Items', [])
-        return cors_response(200, orders)
+        result = {'job_id': job_id, 'status': job['status'], 'created_at': job['created_at']}
+        if job['status'] == 'running':
+            started = datetime.fromisoformat(job['started_at'])
+            if (datetime.utcnow() - started).total_seconds() > EXPORT_RUN_SECONDS:
+                result.update(status='failed', error='Export timed out')
+        elif job['status'] == 'failed':
+            result['error'] = job.get('error')
+        elif job['status'] == 'completed':
+            result.update(
+                rows=job['rows'],
+                url=s3.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': EXPORTS_BUCKET, 'Key': job['export_key']},
+                    ExpiresIn=EXPORT_URL_TTL_SECONDS
+                ),
+                expires_in=EXPORT_URL_TTL_SECONDS
+            )
+        return cors_response(200, result)
     except Exception as e:
-        print(f"Error getting orders: {e}")
+        print(f"Error getting order export: {e}")
         return cors_response(500, {'error': str(e)})
 
 def get_order_by_id(order_id, user_id):
@@ -100,7 +753,7 @@ def get_order_by_id(order_id, user_id):
         if 'Item' not in response:
             return cors_response(404, {'error': 'Order not found'})
         
-        order = response['Item']
+        order = hydrate([response['Item']])[0]
         
         # Verify user has access to this order
         if order['buyer_id'] != user_id and order.get('seller_id') != user_id:
@@ -111,22 +764,151 @@ def get_order_by_id(order_id, user_id):
         print(f"Error getting order: {e}")
         return cors_response(500, {'error': str(e)})
 
+def stock_updates(items):
+    """Conditional stock decrements, one per product, that fail the checkout when stock ran out"""
+    return [
+        {
+            'TableName': PRODUCTS_TABLE,
+            'Key': {'product_id': product_id},
+            'UpdateExpression': 'SET stock_quantity = stock_quantity - :q',
+            'ConditionExpression': 'stock_quantity >= :q',
+            'ExpressionAttributeValues': {':q': quantity}
+        }
+        for product_id, quantity in quantities_by_product(items).items()
+    ]
+
+def stock_returns(items):
+    """Gives a cancelled order's stock back: products, and inventory when reservations are on"""
+    quantities = quantities_by_product(items)
+    updates = [
+        {
+            'TableName': PRODUCTS_TABLE,
+            'Key': {'product_id': product_id},
+            'UpdateExpression': 'SET stock_quantity = stock_quantity + :q',
+            'ExpressionAttributeValues': {':q': quantity}
+        }
+        for product_id, quantity in quantities.items()
+    ]
+    if STOCK_RESERVATIONS_ENABLED:
+        records = inventory_records(quantities)
+        updates += [
+            {
+                'TableName': INVENTORY_TABLE,
+                'Key': {'product_id': product_id},
+                'UpdateExpression': 'SET available = available + :q',
+                'ExpressionAttributeValues': {':q': quantity}
+            }
+            for product_id, quantity in quantities.items()
+            if 'available' in records.get(product_id, {})
+        ]
+    return updates
+
+def holds_stock(order):
+    """
+    Whether the order has taken its stock, which cancelling it gives back.
+    Checkout takes it up front, except for a pending order still in its
+    checkout saga (checkout = saga), whose stock the saga releases itself.
+    """
+    return order['status'] in ('confirmed', 'processing') or (order['status'] == 'pending' and order.get('checkout') != 'saga')
+
+def cancellation_reasons(error, operations):
+    """Maps TransactionCanceledException reasons back to what failed"""
+    reasons = []
+    for reason, (kind, key) in zip(error.response.get('CancellationReasons', []), operations):
+        if reason.get('Code') in (None, 'None'):
+            continue
+        if reason['Code'] == 'ConditionalCheckFailed':
+            reasons.append({'type': kind, 'id': key, 'reason': {
+                'stock': 'out_of_stock',
+                'reservation': 'out_of_stock',
+                'cart': 'cart_changed',
+                'order': 'duplicate_order'
+            }[kind]})
+        else:
+            reasons.append({'type': kind, 'id': key, 'reason': reason['Code']})
+    return reasons
+
+def outbox_put(event_type, detail, now):
+    """
+    Transaction item recording an order event in the outbox. It commits or
+    fails together with the order write; outbox-relay publishes it from the
+    table stream. event_id is a ULID, so entries sort in the order they were written.
+    """
+    event_id = new_order_id()
+    return {'Put': {
+        'TableName': OUTBOX_TABLE,
+        'Item': {
+            'event_id': event_id,
+            'event_type': event_type,
+            'order_id': detail['order_id'],
+            'detail': json.dumps({'event_id': event_id, **detail}, default=decimal_default),
+            'created_at': now,
+            'expires_at': int(time.time()) + OUTBOX_TTL_SECONDS
+        }
+    }}
+
+def order_created_event(order):
+    """
+    OrderCreated outbox entry; the shipping address stays out of the event.
+    An asynchronous checkout's entry (checkout = saga) is also what starts
+    its saga: the bus routes it to the orders queue.
+    """
+    return outbox_put('OrderCreated', {
+        'order_id': order['order_id'],
+        'display_id': order['display_id'],
+        'buyer_id': order['buyer_id'],
+        'seller_id': order['seller_id'],
+        'status': order['status'],
+        'items': order['items'],
+        'total_cents': order['total_cents'],
+        'currency': order['currency'],
+        'payment_method': order['payment_method'],
+        'created_at': order['created_at'],
+        **({'checkout': order['checkout']} if 'checkout' in order else {})
+    }, order['created_at'])
+
+def status_changed_event(order_id, seller_id, status, now):
+    """OrderStatusChanged outbox entry; consumers read the order for anything beyond the new status"""
+    return outbox_put('OrderStatusChanged', {
+        'order_id': order_id,
+        'seller_id': seller_id,
+        'status': status,
+        'changed_at': now
+    }, now)
+
 def create_order(user_id, body):
-    """Create new order from cart"""
+    """
+    Create new orders from the cart in one transaction: an order per seller
+    with its OrderCreated outbox entry, a conditional stock decrement per
+    product, stock hold confirmations and the cart delete (conditional on the
+    cart version that was read) all commit or none do.
+
+    With ASYNC_CHECKOUT on, checkout is asynchronous: the transaction only
+    puts the orders (marked checkout = saga) with their outbox entries and
+    deletes the cart, and the request returns 202. The committed OrderCreated
+    entries reach order-processor through the bus and the orders queue, so
+    no order is left without its saga; the saga then commits stock (or
+    cancels the order), takes payment and sends the notification.
+    """
     try:
         # Get user's cart
         carts_table = dynamodb.Table(CARTS_TABLE)
-        cart_response = carts_table.get_item(Key={'user_id': user_id})
+        cart_response = carts_table.get_item(Key={'user_id': user_id}, ConsistentRead=True)
         
         if 'Item' not in cart_response or not cart_response['Item'].get('items'):
             return cors_response(400, {'error': 'Cart is empty'})
         
         cart = cart_response['Item']
-        items = cart['items']
+        items = [order_line(line) for line in cart_lines(cart)]
+        currency = cart.get('currency', DEFAULT_CURRENCY)
         
         # Get shipping info from body
         shipping_address = body.get('shipping_address', {})
         payment_method = body.get('payment_method', 'card')
+        # Stripe PaymentMethod the checkout saga charges for card orders
+        payment_method_id = body.get('payment_method_id')
+        if ASYNC_CHECKOUT and payment_method == 'card' and not payment_method_id:
+            return cors_response(400, {'error': 'payment_method_id is required for card payments'})
         
         # Group items by seller
         orders_by_seller = {}
@@ -138,32 +920,77 @@ def create_order(user_id, body):
         
         # Create separate orders for each seller
         created_orders = []
-        orders_table = dynamodb.Table(ORDERS_TABLE)
-        
+        now = datetime.utcnow().isoformat()
         for seller_id, seller_items in orders_by_seller.items():
-            order_id = str(uuid.uuid4())
-            total = sum(Decimal(str(item['price'])) * item['quantity'] for item in seller_items)
-            now = datetime.utcnow().isoformat()
-            
-            order = {
+            total_cents = sum(item['price_cents'] * int(item['quantity']) for item in seller_items)
+            order_id = new_order_id()
+            created_orders.append({
                 'order_id': order_id,
+                'display_id': display_order_id(order_id, now),
                 'buyer_id': user_id,
                 'seller_id': seller_id,
                 'items': seller_items,
-                'total_amount': total,
+                'total_cents': total_cents,
+                'total_amount': from_cents(total_cents),
+                'currency': currency,
                 'status': 'pending',
+                'status_created_at': status_sort_key('pending', now),
                 'payment_method': payment_method,
                 'payment_status': 'pending',
                 'shipping_address': shipping_address,
                 'created_at': now,
-                'updated_at': now
-            }
-            
-            orders_table.put_item(Item=order)
-            created_orders.append(order)
+                'updated_at': now,
+                **({'checkout': 'saga'} if ASYNC_CHECKOUT else {}),
+                **({'payment_method_id': payment_method_id} if payment_method_id else {})
+            })
+        
+        # (kind, id) per transaction item, in order, to explain cancellations
+        operations = []
+        transact_items = []
+        for order in created_orders:
+            operations.append(('order', order['order_id']))
+            transact_items.append({'Put': {
+                'TableName': ORDERS_TABLE,
+                'Item': order,
+                'ConditionExpression': 'attribute_not_exists(order_id)'
+            }})
+            event = order_created_event(order)
+            operations.append(('outbox', event['Put']['Item']['event_id']))
+            transact_items.append(event)
+        if not ASYNC_CHECKOUT:
+            for update in stock_updates(items):
+                operations.append(('stock', update['Key']['product_id']))
+                transact_items.append({'Update': update})
+            for write in reservation_updates(user_id, items):
+                operations.append(('reservation', next(iter(write.values()))['Key']['product_id']))
+                transact_items.append(write)
+        cart_delete = {'TableName': CARTS_TABLE, 'Key': {'user_id': user_id}}
+        if 'version' in cart:
+            cart_delete['ConditionExpression'] = 'version = :version'
+            cart_delete['ExpressionAttributeValues'] = {':version': cart['version']}
+        else:
+            cart_delete['ConditionExpression'] = 'attribute_not_exists(version)'
+        operations.append(('cart', user_id))
+        transact_items.append({'Delete': cart_delete})
         
-        # Clear cart
-        carts_table.delete_item(Key={'user_id': user_id})
+        if len(transact_items) > MAX_TRANSACTION_ITEMS:
+            return cors_response(400, {'error': 'Too many products for one checkout, please split the order'})
+        
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            return cors_response(409, {
+                'error': 'Checkout could not be completed',
+                'reasons': cancellation_reasons(e, operations)
+            })
+        
+        if ASYNC_CHECKOUT:
+            return cors_response(202, {
+                'message': 'Orders accepted for processing',
+                'orders': created_orders
+            })
         
         return cors_response(201, {
             'message': 'Orders created successfully',
@@ -174,50 +1001,285 @@ def create_order(user_id, body):
         print(f"Error creating order: {e}")
         return cors_response(500, {'error': str(e)})
 
+def read_orders(order_ids):
+    """Consistent reads of orders by order_id; missing orders are left out"""
+    orders = {}
+    request = {ORDERS_TABLE: {'Keys': [{'order_id': order_id} for order_id in order_ids], 'ConsistentRead': True}}
+    while request:
+        response = dynamodb.meta.client.batch_get_item(RequestItems=request)
+        for order in response['Responses'].get(ORDERS_TABLE, []):
+            orders[order['order_id']] = order
+        request = response.get('UnprocessedKeys')
+    return orders
+
+def status_update(order_id, user_id, status, now, current=None):
+    """
+    update_item arguments moving one order to `status`. Existence, ownership
+    and the allowed transition are all conditions of the write, so two
+    concurrent updates cannot both move the order from the same status.
+    With `current` (a status it may move from), the order must still be in
+    that status: the one its stock return was decided on. Orders in a
+    checkout saga (checkout = saga) are only confirmed by the saga, once
+    their stock and payment are secured.
+    """
+    sources = transition_sources(status)
+    if current in sources:
+        sources = [current]
+    source_values = {f":from{i}": source for i, source in enumerate(sources)}
+    condition = f"seller_id = :seller_id AND #status IN ({', '.join(source_values)})"
+    if status == 'confirmed':
+        condition += ' AND attribute_not_exists(checkout)'
+    return {
+        'TableName': ORDERS_TABLE,
+        'Key': {'order_id': order_id},
+        'UpdateExpression': 'SET #status = :status, status_created_at = :status_created_at, updated_at = :updated',
+        'ConditionExpression': condition,
+        'ExpressionAttributeNames': {'#status': 'status'},
+        'ExpressionAttributeValues': {
+            ':status': status,
+            ':status_created_at': status_sort_key(status, now),
+            ':updated': now,
+            ':seller_id': user_id,
+            **source_values
+        },
+        'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+    }
+
+def transition_failure(order, user_id, status):
+    """(status code, body) for a failed transition, from the item the failed write returned"""
+    if not order:
+        return 404, {'error': 'Order not found'}
+    if 'archive_key' in order:
+        return 409, {'error': 'Order is archived'}
+    if order['seller_id']['S'] != user_id:
+        return 403, {'error': 'Not authorized to update this order'}
+    current = order['status']['S']
+    if status == 'confirmed' and current == 'pending' and 'checkout' in order:
+        return 409, {'error': 'Order is confirmed by checkout once its stock and payment are secured', 'status': current}
+    return 409, {
+        'error': f"Cannot change order status from {current} to {status}",
+        'status': current,
+        'allowed': ALLOWED_TRANSITIONS.get(current, [])
+    }
+
+def lost_race(order, user_id, status):
+    """Whether a cancel pinned to the status it read failed only because the order moved on to another cancellable status"""
+    return bool(order) and 'archive_key' not in order and order['seller_id']['S'] == user_id \
+        and order['status']['S'] in transition_sources(status)
+
+def cancellation_returns(orders):
+    """Stock returns for the orders being cancelled that hold stock, merged per product (a transaction writes each item once)"""
+    return [{'Update': update} for update in stock_returns([
+        item for order in orders if holds_stock(order) for item in order.get('items', [])
+    ])]
+
+def transition_order(order_id, user_id, status):
+    """
+    Applies one status transition together with its OrderStatusChanged outbox
+    entry and, for a cancellation, the order's stock returns. Returns (status code, body)
+    """
+    if not transition_sources(status):
+        return 409, {'error': f"Orders cannot move to {status}"}
+    for attempt in range(MAX_TRANSITION_ATTEMPTS):
+        now = datetime.utcnow().isoformat()
+        order = read_orders([order_id]).get(order_id) if status == 'cancelled' else None
+        try:
+            # The low-level client is thread-safe, which the batch update relies on
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Update': status_update(order_id, user_id, status, now, order and order['status'])},
+                status_changed_event(order_id, user_id, status, now),
+                *cancellation_returns([order] if order else [])
+            ])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reason = (e.response.get('CancellationReasons') or [{}])[0]
+            if reason.get('Code') != 'ConditionalCheckFailed':
+                raise
+            if order and attempt + 1 < MAX_TRANSITION_ATTEMPTS and lost_race(reason.get('Item'), user_id, status):
+                continue
+            return transition_failure(reason.get('Item'), user_id, status)
+        return 200, {'message': 'Order status updated', 'status': status}
+
 def update_order_status(order_id, user_id, body):
-    """Update order status (seller only)"""
+    """Update order status (seller only), in one conditional transaction with its outbox entry"""
     try:
         status = body.get('status')
         
-        if status not in ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled']:
+        if status not in ORDER_STATUSES:
             return cors_response(400, {'error': 'Invalid status'})
         
-        # Get order
-        table = dynamodb.Table(ORDERS_TABLE)
-        response = table.get_item(Key={'order_id': order_id})
-        
-        if 'Item' not in response:
-            return cors_response(404, {'error': 'Order not found'})
+        return cors_response(*transition_order(order_id, user_id, status))
         
-        order = response['Item']
+    except Exception as e:
+        print(f"Error updating order: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def cancellation_chunks(order_ids):
+    """
+    Splits orders to cancel into transactions that fit MAX_TRANSACTION_ITEMS:
+    each order takes its update and outbox entry, and each distinct product
+    its stock return (two with reservations on), whether or not the order
+    turns out to hold stock when it is cancelled.
+    """
+    orders = read_orders(order_ids)
+    per_product = 2 if STOCK_RESERVATIONS_ENABLED else 1
+    chunks, chunk, products = [], [], set()
+    for order_id in order_ids:
+        order_products = {item['product_id'] for item in orders.get(order_id, {}).get('items', [])}
+        if chunk and 2 * (len(chunk) + 1) + per_product * len(products | order_products) > MAX_TRANSACTION_ITEMS:
+            chunks.append(chunk)
+            chunk, products = [], set()
+        chunk.append(order_id)
+        products |= order_products
+    return chunks + [chunk]
+
+def transition_chunk(order_ids, user_id, status):
+    """
+    Applies one transition to a chunk of orders in a single transaction: all
+    move or none do. Cancellations give back the stock of every order that
+    holds it in the same transaction. Returns (order_id, status code, body) per order.
+    """
+    for attempt in range(MAX_TRANSITION_ATTEMPTS):
+        now = datetime.utcnow().isoformat()
+        orders = read_orders(order_ids) if status == 'cancelled' else {}
+        updates = [
+            {'Update': status_update(order_id, user_id, status, now, orders.get(order_id, {}).get('status'))}
+            for order_id in order_ids
+        ]
+        # Outbox entries and stock returns go after the updates, so cancellation reasons line up with order_ids
+        events = [status_changed_event(order_id, user_id, status, now) for order_id in order_ids]
+        try:
+            dynamodb.meta.client.transact_write_items(
+                TransactItems=updates + events + cancellation_returns(orders.values())
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            reasons = list(zip(order_ids, e.response.get('CancellationReasons', [])))
+            failed = [reason.get('Item') for _, reason in reasons if reason.get('Code') == 'ConditionalCheckFailed']
+            if orders and failed and attempt + 1 < MAX_TRANSITION_ATTEMPTS \
+                    and all(lost_race(order, user_id, status) for order in failed):
+                continue
+            results = []
+            for order_id, reason in reasons:
+                if reason.get('Code') == 'ConditionalCheckFailed':
+                    results.append((order_id, *transition_failure(reason.get('Item'), user_id, status)))
+                else:
+                    results.append((order_id, 409, {'error': 'Not updated: another order in the transaction failed'}))
+            return results
+        return [(order_id, 200, {'message': 'Order status updated', 'status': status}) for order_id in order_ids]
+
+def batch_update_order_status(user_id, body):
+    """
+    Update many orders to one status (seller only). Each order is its own
+    conditional write, run concurrently; with "atomic": true the orders are
+    written in transactional chunks of ATOMIC_CHUNK_SIZE instead, each
+    committing entirely or not at all (cancellations are chunked smaller when
+    their stock returns need the room). Results are reported per order.
+    """
+    try:
+        status = body.get('status')
+        order_ids = list(dict.fromkeys(body.get('order_ids') or []))
         
-        # Verify seller owns this order
-        if order.get('seller_id') != user_id:
-            return cors_response(403, {'error': 'Not authorized to update this order'})
+        if status not in ORDER_STATUSES:
+            return cors_response(400, {'error': 'Invalid status'})
+        if not order_ids:
+            return cors_response(400, {'error': 'order_ids is required'})
+        if len(order_ids) > MAX_BATCH_ORDERS:
+            return cors_response(400, {'error': f"At most {MAX_BATCH_ORDERS} orders per batch"})
+        if not transition_sources(status):
+            return cors_response(409, {'error': f"Orders cannot move to {status}"})
         
-        # Update status
-        table.update_item(
-            Key={'order_id': order_id},
-            UpdateExpression='SET #status = :status, updated_at = :updated',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': status,
-                ':updated': datetime.utcnow().isoformat()
-            }
-        )
+        if body.get('atomic'):
+            chunks = [order_ids[i:i + ATOMIC_CHUNK_SIZE] for i in range(0, len(order_ids), ATOMIC_CHUNK_SIZE)]
+            if status == 'cancelled':
+                chunks = [part for chunk in chunks for part in cancellation_chunks(chunk)]
+            with ThreadPoolExecutor(max_workers=min(len(chunks), BATCH_WORKERS)) as executor:
+                outcomes = [result for chunk in executor.map(
+                    lambda chunk: transition_chunk(chunk, user_id, status), chunks
+                ) for result in chunk]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(order_ids), BATCH_WORKERS)) as executor:
+                outcomes = list(executor.map(
+                    lambda order_id: (order_id, *transition_order(order_id, user_id, status)), order_ids
+                ))
         
-        return cors_response(200, {'message': 'Order status updated', 'status': status})
+        results = [{'order_id': order_id, 'status_code': code, **result} for order_id, code, result in outcomes]
+        updated = sum(1 for result in results if result['status_code'] == 200)
+        return cors_response(200, {'results': results, 'updated': updated, 'failed': len(results) - updated})
         
     except Exception as e:
-        print(f"Error updating order: {e}")
+        print(f"Error updating orders: {e}")
         return cors_response(500, {'error': str(e)})
 
+def idempotent(user_id, key, body, handler):
+    """
+    Runs handler() at most once per (user, Idempotency-Key). The first request
+    claims the key with a conditional put of an in-flight marker; its response
+    is stored on the marker. Retries get the stored response back, 409 while the
+    first request is still running, or 422 if the body differs. A 5xx releases
+    the key so the client can retry for real, as does a marker left behind by a
+    request that never finished.
+    """
+    table = dynamodb.Table(IDEMPOTENCY_TABLE)
+    record_key = {'idempotency_key': f"{user_id}#{key}"}
+    fingerprint = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={
+                **record_key,
+                'status': 'in_progress',
+                'fingerprint': fingerprint,
+                'created_at': now,
+                'expires_at': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(idempotency_key) OR (#status = :in_progress AND created_at < :stale)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':in_progress': 'in_progress', ':stale': now - IDEMPOTENCY_LEASE_SECONDS}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        record = table.get_item(Key=record_key, ConsistentRead=True).get('Item', {})
+        if record.get('fingerprint') != fingerprint:
+            return cors_response(422, {'error': 'Idempotency-Key was already used with a different request'})
+        if record.get('status') != 'completed':
+            return cors_response(409, {'error': 'A request with this Idempotency-Key is still in progress'})
+        response = cors_response(int(record['status_code']), {})
+        response['body'] = record['response_body']
+        response['headers']['Idempotent-Replayed'] = 'true'
+        return response
+
+    response = handler()
+    try:
+        if response['statusCode'] >= 500:
+            table.delete_item(Key=record_key)
+        else:
+            table.update_item(
+                Key=record_key,
+                UpdateExpression='SET #status = :completed, status_code = :code, response_body = :body',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':completed': 'completed',
+                    ':code': response['statusCode'],
+                    ':body': response['body']
+                }
+            )
+    except Exception as e:
+        print(f"Error recording idempotent response: {e}")
+    return response
+
 def lambda_handler(event, context):
     """
     Main Lambda handler for Orders API
     """
     print(f"Event: {json.dumps(event)}")
     
+    if 'export_job_id' in event:
+        return run_export(event['export_job_id'])
+    
     try:
         http_method = event.get('httpMethod', event.get('requestContext', {}).get('http', {}).get('method'))
         path = event.get('path', '')
@@ -242,13 +1304,28 @@ def lambda_handler(event, context):
             body = json.loads(event['body'])
         
         # Route to appropriate handler
-        if http_method == 'GET':
+        if '/orders/export' in path:
+            job_id = path.rstrip('/').split('/orders/export')[-1].strip('/')
+            if http_method == 'POST' and not job_id:
+                return start_export(user_id, user_type, body)
+            if http_method == 'GET' and job_id:
+                return get_export(job_id, user_id)
+            return cors_response(405, {'error': 'Method not allowed'})
+        
+        elif http_method == 'GET':
             if order_id:
                 return get_order_by_id(order_id, user_id)
             else:
-                return get_orders(user_id, user_type)
+                return get_orders(user_id, user_type, event.get('queryStringParameters') or {})
+        
+        elif http_method == 'POST' and path.rstrip('/').endswith('/status:batch'):
+            return batch_update_order_status(user_id, body)
         
         elif http_method == 'POST' and not order_id:
+            headers = event.get('headers') or {}
+            idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+            if idempotency_key:
+                return idempotent(user_id, idempotency_key, body, lambda: create_order(user_id, body))
             return create_order(user_id, body)
         
         elif http_method == 'PUT' and order_id and '/status' in path:
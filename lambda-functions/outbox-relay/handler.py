@@ -0,0 +1,70 @@
+"""
+Outbox relay
+Consumes the outbox table stream and publishes the order events orders-api
+wrote there to EventBridge, up to ten entries per PutEvents call. An outbox
+entry commits in the same transaction as the order change it describes, so
+every change is published at least once; a retried batch can publish an
+event again, and consumers dedupe on the event_id in its detail.
+"""
+import json
+import boto3
+import os
+
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+events = boto3.client('events', endpoint_url=endpoint_url)
+EVENT_BUS_NAME = os.getenv('EVENT_BUS_NAME', 'ekart-events-dev')
+EVENT_SOURCE = 'ekart.orders'
+
+# EventBridge limit on entries in one PutEvents call
+MAX_PUT_EVENTS_ENTRIES = 10
+
+def event_entry(record):
+    """PutEvents entry for a new outbox item, or None for other stream records (TTL deletes)"""
+    if record['eventName'] != 'INSERT':
+        return None
+    item = record['dynamodb']['NewImage']
+    return {
+        'Source': EVENT_SOURCE,
+        'DetailType': item['event_type']['S'],
+        'Detail': item['detail']['S'],
+        'EventBusName': EVENT_BUS_NAME
+    }
+
+def publish(entries):
+    """Sends up to MAX_PUT_EVENTS_ENTRIES entries. Returns the index of the first one EventBridge rejected, or None"""
+    response = events.put_events(Entries=entries)
+    if not response.get('FailedEntryCount'):
+        return None
+    for i, result in enumerate(response['Entries']):
+        if result.get('ErrorCode'):
+            print(f"Event rejected: {result['ErrorCode']} {result.get('ErrorMessage', '')}")
+            return i
+    return None
+
+def lambda_handler(event, context):
+    """
+    Publish a batch of outbox stream records. Stream batches are ordered, so
+    the first record that was not published is reported in batchItemFailures
+    and the batch resumes from there.
+    """
+    pending = []
+    for record in event.get('Records', []):
+        entry = event_entry(record)
+        if entry:
+            pending.append((record['dynamodb']['SequenceNumber'], entry))
+
+    published = 0
+    for start in range(0, len(pending), MAX_PUT_EVENTS_ENTRIES):
+        chunk = pending[start:start + MAX_PUT_EVENTS_ENTRIES]
+        try:
+            failed = publish([entry for _, entry in chunk])
+        except Exception as e:
+            print(f"Error publishing order events: {str(e)}")
+            failed = 0
+        if failed is not None:
+            print(f"Published {published} order events, retrying from {chunk[failed][0]}")
+            return {'batchItemFailures': [{'itemIdentifier': chunk[failed][0]}]}
+        published += len(chunk)
+
+    print(f"Published {published} order events from {len(event.get('Records', []))} records")
+    return {'batchItemFailures': []}
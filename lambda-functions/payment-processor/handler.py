@@ -15,30 +15,58 @@ def cors_response(status_code, body):
         'body': json.dumps(body)
     }
 
-def create_payment_intent(amount_cents: int, currency: str):
+class StripeError(RuntimeError):
+    """A Stripe API error response; `error` is Stripe's error object"""
+    def __init__(self, status: int, error: dict):
+        super().__init__(f"Stripe error {status}: {error.get('message', '')}")
+        self.status = status
+        self.error = error
+
+def stripe_post(path: str, fields: dict, idempotency_key: str = None):
     base_url = os.getenv('STRIPE_BASE_URL')
     api_key = os.getenv('STRIPE_API_KEY')
     if not base_url or not api_key:
         raise RuntimeError('Stripe configuration missing')
 
-    url = f"{base_url}/v1/payment_intents"
-    data = parse.urlencode({
-        'amount': str(amount_cents),
-        'currency': currency
-    }).encode('utf-8')
+    url = f"{base_url}{path}"
+    data = parse.urlencode(fields).encode('utf-8')
 
     # Basic auth with API key
     auth_token = base64.b64encode(f"{api_key}:".encode('utf-8')).decode('utf-8')
     req = request.Request(url, data=data, method='POST')
     req.add_header('Authorization', f'Basic {auth_token}')
     req.add_header('Content-Type', 'application/x-www-form-urlencoded')
+    if idempotency_key:
+        # Stripe replays the first result for a repeated key instead of acting twice
+        req.add_header('Idempotency-Key', idempotency_key)
     try:
         with request.urlopen(req, timeout=10) as resp:
             payload = resp.read().decode('utf-8')
             return json.loads(payload)
     except error.HTTPError as e:
         detail = e.read().decode('utf-8') if e.fp else ''
-        raise RuntimeError(f"Stripe error {e.code}: {detail}")
+        try:
+            stripe_error = json.loads(detail).get('error') or {}
+        except ValueError:
+            stripe_error = {'message': detail}
+        raise StripeError(e.code, stripe_error)
+
+def create_payment_intent(amount_cents: int, currency: str, idempotency_key: str = None, payment_method: str = None):
+    """Creates an intent; with payment_method it is also confirmed, which charges the card"""
+    fields = {
+        'amount': str(amount_cents),
+        'currency': currency
+    }
+    if payment_method:
+        fields.update({'payment_method': payment_method, 'payment_method_types[]': 'card', 'confirm': 'true'})
+    return stripe_post('/v1/payment_intents', fields, idempotency_key)
+
+def cancel_payment_intent(intent_id: str, idempotency_key: str = None):
+    return stripe_post(f"/v1/payment_intents/{parse.quote(intent_id)}/cancel", {}, idempotency_key)
+
+def refund_payment_intent(intent_id: str, idempotency_key: str = None):
+    """Refunds the whole charge of a succeeded intent"""
+    return stripe_post('/v1/refunds', {'payment_intent': intent_id}, idempotency_key)
 
 def lambda_handler(event, context):
     print(f"Payment processor invoked with event: {json.dumps(event)}")
@@ -50,12 +78,45 @@ def lambda_handler(event, context):
         body = {}
         if event.get('body'):
             body = json.loads(event['body'])
+
+        path = (event.get('path') or '').rstrip('/')
+        if path.endswith('/cancel-payment-intent'):
+            if not body.get('payment_intent_id'):
+                return cors_response(400, {'error': 'payment_intent_id is required'})
+            intent = cancel_payment_intent(body['payment_intent_id'], body.get('idempotency_key'))
+            return cors_response(200, {
+                'payment_intent_id': intent.get('id'),
+                'status': intent.get('status')
+            })
+
+        if path.endswith('/refund-payment-intent'):
+            if not body.get('payment_intent_id'):
+                return cors_response(400, {'error': 'payment_intent_id is required'})
+            refund = refund_payment_intent(body['payment_intent_id'], body.get('idempotency_key'))
+            return cors_response(200, {
+                'payment_intent_id': body['payment_intent_id'],
+                'refund_id': refund.get('id'),
+                'status': refund.get('status')
+            })
+
         amount = int(body.get('amount', 0))
         currency = body.get('currency', 'usd')
         if amount <= 0:
             return cors_response(400, {'error': 'Invalid amount'})
 
-        intent = create_payment_intent(amount, currency)
+        try:
+            intent = create_payment_intent(amount, currency, body.get('idempotency_key'), body.get('payment_method'))
+        except StripeError as e:
+            if e.status != 402:
+                raise
+            # Card declined on confirmation: a final answer, not an error to retry
+            declined = e.error.get('payment_intent') or {}
+            return cors_response(402, {
+                'error': e.error.get('message', 'Card declined'),
+                'decline_code': e.error.get('decline_code'),
+                'payment_intent_id': declined.get('id'),
+                'status': declined.get('status', 'requires_payment_method')
+            })
         # Return client_secret for frontend confirmation if needed
         return cors_response(200, {
             'payment_intent_id': intent.get('id'),
@@ -1,78 +1,402 @@
 """
 Lambda function for Products API
-Handles: GET /products, GET /products/{id}, POST /products, PUT /products/{id}, DELETE /products/{id}
+Handles: GET /products, GET /products/trending, GET /products/summary, GET /products/{id}, POST /products, PUT /products/{id}, DELETE /products/{id}
 """
 import json
 import boto3
 import os
+import time
+import zlib
+import hashlib
 from decimal import Decimal
 from datetime import datetime
+from botocore.exceptions import ClientError
 
 # AWS clients
 endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
 dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+sqs = boto3.client('sqs', endpoint_url=endpoint_url)
 PRODUCTS_TABLE = os.getenv('PRODUCTS_TABLE', 'ekart-products-dev')
+SEARCH_CACHE_TABLE = os.getenv('SEARCH_CACHE_TABLE', 'ekart-search-cache-dev')
+TRENDING_TABLE = os.getenv('TRENDING_TABLE', 'ekart-trending-dev')
+SELLER_STATS_TABLE = os.getenv('SELLER_STATS_TABLE', 'ekart-seller-stats-dev')
+INVENTORY_TABLE = os.getenv('INVENTORY_TABLE', 'ekart-inventory-dev')
+LOW_STOCK_THRESHOLD = int(os.getenv('LOW_STOCK_THRESHOLD', '5'))
+# Recounts of a seller's counters before falling back to the delta-maintained values
+MAX_REBUILD_ATTEMPTS = 3
+ACTIVITY_QUEUE_URL = os.getenv('ACTIVITY_QUEUE_URL')
+TRENDING_WINDOWS = ('1h', '24h')
+
+# Search result cache settings (seconds)
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '60'))
+SEARCH_CACHE_LEASE = int(os.getenv('SEARCH_CACHE_LEASE', '5'))
+SEARCH_CACHE_WAIT = float(os.getenv('SEARCH_CACHE_WAIT', '2'))
 
 def decimal_default(obj):
     """JSON serializer for Decimal objects"""
     if isinstance(obj, Decimal):
-        return float(obj)
+        # Keep counters and quantities integral in JSON
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
     raise TypeError
 
-def cors_response(status_code, body):
+def cors_response(status_code, body, headers=None):
     """Return response with CORS headers"""
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+    }
+    if headers:
+        response_headers['Access-Control-Expose-Headers'] = ','.join(headers)
+        response_headers.update(headers)
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        },
+        'headers': response_headers,
         'body': json.dumps(body, default=decimal_default)
     }
 
+def normalize_search_params(query_params):
+    """Normalize the parameters that influence a product listing"""
+    return {
+        'category': (query_params.get('category') or '').strip(),
+        'seller_id': (query_params.get('seller_id') or '').strip(),
+        'search': ' '.join((query_params.get('search') or '').lower().split()),
+        'cursor': query_params.get('cursor') or '',
+        'limit': (query_params.get('limit') or '').strip()
+    }
+
+def search_cache_key(params):
+    """Hash normalized listing parameters into a cache key"""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def compress_ids(product_ids):
+    """Pack an ordered list of product IDs into a compressed blob"""
+    return zlib.compress(','.join(product_ids).encode('utf-8'))
+
+def decompress_ids(blob):
+    """Unpack a blob produced by compress_ids"""
+    raw = zlib.decompress(getattr(blob, 'value', blob)).decode('utf-8')
+    return raw.split(',') if raw else []
+
+def read_search_cache(cache_key):
+    """Return a live cache entry, or None if missing, expired or still being computed"""
+    table = dynamodb.Table(SEARCH_CACHE_TABLE)
+    response = table.get_item(Key={'cache_key': cache_key})
+    entry = response.get('Item')
+    if not entry or 'ids' not in entry:
+        return None
+    # TTL deletion is lazy, so expired entries can still be returned
+    if entry.get('expires_at', 0) < int(time.time()):
+        return None
+    return entry
+
+def acquire_search_lease(cache_key):
+    """
+    Claim the right to recompute a cache entry.
+    Only one container wins; the others wait for its result instead of
+    running the same query.
+    """
+    table = dynamodb.Table(SEARCH_CACHE_TABLE)
+    now = int(time.time())
+    try:
+        table.put_item(
+            Item={'cache_key': cache_key, 'expires_at': now + SEARCH_CACHE_LEASE},
+            ConditionExpression='attribute_not_exists(cache_key) OR expires_at < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+def wait_for_search_cache(cache_key):
+    """Poll for a result being computed by another container"""
+    deadline = time.time() + SEARCH_CACHE_WAIT
+    while time.time() < deadline:
+        time.sleep(0.1)
+        entry = read_search_cache(cache_key)
+        if entry:
+            return entry
+    return None
+
+def write_search_cache(cache_key, product_ids, cursor):
+    """Store a computed result, replacing the lease item"""
+    table = dynamodb.Table(SEARCH_CACHE_TABLE)
+    entry = {
+        'cache_key': cache_key,
+        'ids': compress_ids(product_ids),
+        'count': len(product_ids),
+        'expires_at': int(time.time()) + SEARCH_CACHE_TTL
+    }
+    if cursor:
+        entry['cursor'] = cursor
+    table.put_item(Item=entry)
+
+def fetch_products_by_ids(product_ids):
+    """Load products with BatchGetItem, preserving the order of product_ids"""
+    found = {}
+    for start in range(0, len(product_ids), 100):
+        request = {PRODUCTS_TABLE: {'Keys': [{'product_id': pid} for pid in product_ids[start:start + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(PRODUCTS_TABLE, []):
+                found[item['product_id']] = item
+            request = response.get('UnprocessedKeys') or None
+    return [found[pid] for pid in product_ids if pid in found]
+
+def encode_cursor(last_key):
+    """Encode a DynamoDB LastEvaluatedKey as an opaque cursor"""
+    if not last_key:
+        return ''
+    return json.dumps(last_key, default=decimal_default, separators=(',', ':'))
+
+def run_product_search(params):
+    """Run the listing query against the products table"""
+    table = dynamodb.Table(PRODUCTS_TABLE)
+    
+    category = params['category']
+    seller_id = params['seller_id']
+    search = params['search']
+    
+    kwargs = {}
+    if params['cursor']:
+        kwargs['ExclusiveStartKey'] = json.loads(params['cursor'])
+    if params['limit']:
+        kwargs['Limit'] = int(params['limit'])
+    
+    # Scan or query based on parameters
+    if category:
+        response = table.query(
+            IndexName='category-index',
+            KeyConditionExpression='category = :category',
+            ExpressionAttributeValues={':category': category},
+            **kwargs
+        )
+    elif seller_id:
+        response = table.query(
+            IndexName='seller-index',
+            KeyConditionExpression='seller_id = :seller_id',
+            ExpressionAttributeValues={':seller_id': seller_id},
+            **kwargs
+        )
+    else:
+        response = table.scan(**kwargs)
+    
+    items = response.get('Items', [])
+    
+    # Apply search filter if provided
+    if search:
+        items = [
+            item for item in items
+            if search in item.get('name', '').lower() or 
+               search in item.get('description', '').lower()
+        ]
+    
+    return items, encode_cursor(response.get('LastEvaluatedKey'))
+
+def products_page_response(items, cursor, cache_status):
+    """Listing response; the continuation cursor travels in a header so the body stays a plain array"""
+    headers = {'X-Cache': cache_status}
+    if cursor:
+        headers['X-Next-Cursor'] = cursor
+    return cors_response(200, items, headers)
+
 def get_all_products(query_params):
-    """Get all products with optional filtering"""
+    """Get all products with optional filtering, served from the shared result cache when possible"""
     try:
-        table = dynamodb.Table(PRODUCTS_TABLE)
+        params = normalize_search_params(query_params)
+        if params['limit'] and (not params['limit'].isdigit() or int(params['limit']) <= 0):
+            return cors_response(400, {'error': 'limit must be a positive integer'})
+        cache_key = search_cache_key(params)
         
-        # Get query parameters
-        category = query_params.get('category')
-        seller_id = query_params.get('seller_id')
-        search = query_params.get('search', '').lower()
-        
-        # Scan or query based on parameters
-        if category:
-            response = table.query(
-                IndexName='category-index',
-                KeyConditionExpression='category = :category',
-                ExpressionAttributeValues={':category': category}
-            )
-        elif seller_id:
-            response = table.query(
-                IndexName='seller-index',
-                KeyConditionExpression='seller_id = :seller_id',
-                ExpressionAttributeValues={':seller_id': seller_id}
-            )
-        else:
-            response = table.scan()
-        
-        items = response.get('Items', [])
+        # Check the shared cache; if another container is already computing
+        # this key, wait for its result instead of repeating the query
+        entry = None
+        leased = False
+        try:
+            entry = read_search_cache(cache_key)
+            if entry is None:
+                leased = acquire_search_lease(cache_key)
+                if not leased:
+                    entry = wait_for_search_cache(cache_key)
+        except Exception as e:
+            print(f"Search cache unavailable: {e}")
         
-        # Apply search filter if provided
-        if search:
-            items = [
-                item for item in items
-                if search in item.get('name', '').lower() or 
-                   search in item.get('description', '').lower()
-            ]
+        if entry is not None:
+            items = fetch_products_by_ids(decompress_ids(entry['ids']))
+            return products_page_response(items, entry.get('cursor', ''), 'HIT')
         
-        return cors_response(200, items)
+        items, cursor = run_product_search(params)
+        if leased:
+            try:
+                write_search_cache(cache_key, [item['product_id'] for item in items], cursor)
+            except Exception as e:
+                print(f"Error writing search cache: {e}")
+        return products_page_response(items, cursor, 'MISS')
     except Exception as e:
         print(f"Error getting products: {e}")
         return cors_response(500, {'error': str(e)})
 
+def publish_activity(event_type, product_id):
+    """Send a view/add-to-cart event to the trending worker (best effort)"""
+    if not ACTIVITY_QUEUE_URL:
+        return
+    try:
+        sqs.send_message(
+            QueueUrl=ACTIVITY_QUEUE_URL,
+            MessageBody=json.dumps({'type': event_type, 'product_id': product_id, 'ts': int(time.time())})
+        )
+    except Exception as e:
+        print(f"Error publishing activity event: {e}")
+
+def get_trending_products(query_params):
+    """Get the precomputed trending ranking for a window (1h or 24h)"""
+    try:
+        window = query_params.get('window', '1h')
+        if window not in TRENDING_WINDOWS:
+            return cors_response(400, {'error': f"window must be one of {', '.join(TRENDING_WINDOWS)}"})
+        
+        table = dynamodb.Table(TRENDING_TABLE)
+        response = table.get_item(Key={'sketch_id': f'trending#{window}'})
+        item = response.get('Item', {})
+        
+        return cors_response(200, {
+            'window': window,
+            'products': item.get('products', []),
+            'updated_at': item.get('updated_at')
+        })
+    except Exception as e:
+        print(f"Error getting trending products: {e}")
+        return cors_response(500, {'error': str(e)})
+
+# The low-stock predicate, shared by the incremental counters and the recount
+# (a product without stock_quantity counts as having none)
+LOW_STOCK_FILTER = 'attribute_not_exists(stock_quantity) OR stock_quantity <= :threshold'
+
+def is_low_stock(product):
+    """Whether a product counts toward the seller's low-stock total (LOW_STOCK_FILTER, evaluated in Python)"""
+    return 'stock_quantity' not in product or int(product['stock_quantity']) <= LOW_STOCK_THRESHOLD
+
+def adjust_seller_counters(seller_id, products=0, active=0, low_stock=0):
+    """Apply deltas to the seller's catalog counters (best effort)"""
+    deltas = {'product_count': products, 'active_count': active, 'low_stock_count': low_stock}
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    try:
+        table = dynamodb.Table(SELLER_STATS_TABLE)
+        table.update_item(
+            Key={'seller_id': seller_id},
+            UpdateExpression='ADD ' + ', '.join(f'{name} :{name}' for name in deltas) + ', version :one SET updated_at = :updated',
+            # Counters that were never initialized are rebuilt by the summary route
+            ConditionExpression='attribute_exists(seller_id)',
+            ExpressionAttributeValues={
+                **{f':{name}': delta for name, delta in deltas.items()},
+                ':one': 1,
+                ':updated': datetime.utcnow().isoformat()
+            }
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Error updating seller counters: {e}")
+    except Exception as e:
+        print(f"Error updating seller counters: {e}")
+
+def count_seller_products(seller_id, filter_expression=None, filter_values=None):
+    """Count a seller's products on seller-index with Select='COUNT'"""
+    table = dynamodb.Table(PRODUCTS_TABLE)
+    kwargs = {
+        'IndexName': 'seller-index',
+        'KeyConditionExpression': 'seller_id = :seller_id',
+        'ExpressionAttributeValues': {':seller_id': seller_id, **(filter_values or {})},
+        'Select': 'COUNT'
+    }
+    if filter_expression:
+        kwargs['FilterExpression'] = filter_expression
+    
+    total = 0
+    while True:
+        response = table.query(**kwargs)
+        total += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return total
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def rebuild_seller_counters(seller_id):
+    """
+    Recount a seller's catalog and store the result as the new counters. The
+    write is conditional on the counters' version being unchanged since the
+    recount started, so a delta applied meanwhile is never overwritten; the
+    recount is retried, and after MAX_REBUILD_ATTEMPTS the delta-maintained
+    counters are returned as they are.
+    """
+    table = dynamodb.Table(SELLER_STATS_TABLE)
+    for attempt in range(MAX_REBUILD_ATTEMPTS):
+        current = table.get_item(Key={'seller_id': seller_id}, ConsistentRead=True).get('Item')
+        stats = {
+            'seller_id': seller_id,
+            'product_count': count_seller_products(seller_id),
+            'active_count': count_seller_products(seller_id, 'is_active = :active', {':active': True}),
+            'low_stock_count': count_seller_products(seller_id, LOW_STOCK_FILTER, {':threshold': LOW_STOCK_THRESHOLD}),
+            'version': int((current or {}).get('version', 0)) + 1,
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        if current is None:
+            condition = {'ConditionExpression': 'attribute_not_exists(seller_id)'}
+        elif 'version' not in current:
+            condition = {'ConditionExpression': 'attribute_not_exists(version)'}
+        else:
+            condition = {'ConditionExpression': 'version = :version', 'ExpressionAttributeValues': {':version': current['version']}}
+        try:
+            table.put_item(Item=stats, **condition)
+            return stats
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            print(f"Seller counters for {seller_id} changed during the recount, retrying")
+    return table.get_item(Key={'seller_id': seller_id}, ConsistentRead=True).get('Item') or stats
+
+def adjust_available_stock(product_id, delta):
+    """Keeps the reservation counter (stock minus cart holds) in step with restocks"""
+    if not delta:
+        return
+    try:
+        # Only products that have been reserved have a counter; it is seeded from stock_quantity
+        dynamodb.Table(INVENTORY_TABLE).update_item(
+            Key={'product_id': product_id},
+            UpdateExpression='ADD available :delta',
+            ConditionExpression='attribute_exists(available)',
+            ExpressionAttributeValues={':delta': delta}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Error adjusting available stock for {product_id}: {e}")
+
+def get_seller_summary(seller_id, query_params):
+    """Get product, active and low-stock counts for a seller"""
+    try:
+        stats = None
+        if query_params.get('refresh') != 'true':
+            table = dynamodb.Table(SELLER_STATS_TABLE)
+            stats = table.get_item(Key={'seller_id': seller_id}).get('Item')
+        if stats is None:
+            stats = rebuild_seller_counters(seller_id)
+        
+        return cors_response(200, {
+            'seller_id': seller_id,
+            'product_count': stats.get('product_count', 0),
+            'active_count': stats.get('active_count', 0),
+            'low_stock_count': stats.get('low_stock_count', 0),
+            'low_stock_threshold': LOW_STOCK_THRESHOLD,
+            'updated_at': stats.get('updated_at')
+        })
+    except Exception as e:
+        print(f"Error getting seller summary: {e}")
+        return cors_response(500, {'error': str(e)})
+
 def get_product_by_id(product_id):
     """Get single product by ID"""
     try:
@@ -82,6 +406,7 @@ def get_product_by_id(product_id):
         if 'Item' not in response:
             return cors_response(404, {'error': 'Product not found'})
         
+        publish_activity('view', product_id)
         return cors_response(200, response['Item'])
     except Exception as e:
         print(f"Error getting product: {e}")
@@ -111,6 +436,7 @@ def create_product(body, user_id):
         }
         
         table.put_item(Item=product)
+        adjust_seller_counters(user_id, products=1, active=1, low_stock=int(is_low_stock(product)))
         return cors_response(201, product)
     except Exception as e:
         print(f"Error creating product: {e}")
@@ -126,7 +452,8 @@ def update_product(product_id, body, user_id):
         if 'Item' not in response:
             return cors_response(404, {'error': 'Product not found'})
         
-        if response['Item']['seller_id'] != user_id:
+        existing = response['Item']
+        if existing['seller_id'] != user_id:
             return cors_response(403, {'error': 'Not authorized to update this product'})
         
         # Update product
@@ -168,7 +495,10 @@ def update_product(product_id, body, user_id):
             kwargs['ExpressionAttributeNames'] = expr_names
         
         response = table.update_item(**kwargs)
-        return cors_response(200, response['Attributes'])
+        updated = response['Attributes']
+        adjust_seller_counters(user_id, low_stock=int(is_low_stock(updated)) - int(is_low_stock(existing)))
+        adjust_available_stock(product_id, int(updated.get('stock_quantity', 0)) - int(existing.get('stock_quantity', 0)))
+        return cors_response(200, updated)
     except Exception as e:
         print(f"Error updating product: {e}")
         return cors_response(500, {'error': str(e)})
@@ -183,10 +513,18 @@ def delete_product(product_id, user_id):
         if 'Item' not in response:
             return cors_response(404, {'error': 'Product not found'})
         
-        if response['Item']['seller_id'] != user_id:
+        existing = response['Item']
+        if existing['seller_id'] != user_id:
             return cors_response(403, {'error': 'Not authorized to delete this product'})
         
         table.delete_item(Key={'product_id': product_id})
+        dynamodb.Table(INVENTORY_TABLE).delete_item(Key={'product_id': product_id})
+        adjust_seller_counters(
+            user_id,
+            products=-1,
+            active=-int(bool(existing.get('is_active'))),
+            low_stock=-int(is_low_stock(existing))
+        )
         return cors_response(200, {'message': 'Product deleted successfully'})
     except Exception as e:
         print(f"Error deleting product: {e}")
@@ -223,7 +561,16 @@ def lambda_handler(event, context):
             body = json.loads(event['body'])
         
         # Route to appropriate handler
-        if http_method == 'GET':
+        if http_method == 'GET' and path.rstrip('/').endswith('/trending'):
+            return get_trending_products(query_params)
+        
+        elif http_method == 'GET' and path.rstrip('/').endswith('/summary'):
+            seller_id = query_params.get('seller_id') or user_id
+            if not seller_id:
+                return cors_response(400, {'error': 'seller_id required'})
+            return get_seller_summary(seller_id, query_params)
+        
+        elif http_method == 'GET':
             if product_id:
                 return get_product_by_id(product_id)
             else:
@@ -0,0 +1,276 @@
+"""
+Seller analytics
+Consumes the orders table stream and keeps per-seller daily rollups, then
+serves GET /sellers/analytics from them. Rollup rows live under the seller:
+
+  day#<YYYY-MM-DD>                  revenue_cents, units, order_count
+  day#<YYYY-MM-DD>#product#<id>     the same per product, plus its name
+  applied#<order_id>#<event>        marker that makes stream redelivery a no-op
+
+so a date range is one query on the seller's partition, however many
+orders it covers. Orders count on the day they were placed; a cancellation
+takes them back out of that day. Deleted (archived) orders stay counted.
+"""
+import json
+import boto3
+import os
+import time
+import jwt
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timedelta
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+ANALYTICS_TABLE = os.getenv('SELLER_ANALYTICS_TABLE', 'ekart-seller-analytics-dev')
+DEFAULT_CURRENCY = os.getenv('CURRENCY', 'USD')
+
+# Redelivered stream records arrive within the stream's 24h retention
+APPLIED_MARKER_TTL_SECONDS = 7 * 86400
+DEFAULT_RANGE_DAYS = 30
+TOP_PRODUCTS = 10
+# DynamoDB limit on operations in one TransactWriteItems call
+MAX_TRANSACTION_ITEMS = 100
+
+deserializer = TypeDeserializer()
+
+def decimal_default(obj):
+    """JSON serializer for Decimal objects"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError
+
+def cors_response(status_code, body):
+    """Return response with CORS headers"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+            'Access-Control-Allow-Methods': 'GET,OPTIONS'
+        },
+        'body': json.dumps(body, default=decimal_default)
+    }
+
+def extract_user_from_token(event):
+    """Extract user ID and user type from JWT token"""
+    try:
+        headers = event.get('headers') or {}
+        auth_header = headers.get('Authorization') or headers.get('authorization')
+        if not auth_header:
+            return None, None
+        parts = auth_header.split(' ')
+        if len(parts) != 2 or parts[0].lower() != 'bearer':
+            return None, None
+        # Decode token without verification (LocalStack doesn't have proper keys)
+        decoded = jwt.decode(parts[1], options={"verify_signature": False})
+        return decoded.get('sub') or decoded.get('username'), decoded.get('custom:user_type', 'customer')
+    except Exception as e:
+        print(f"Token extraction error: {str(e)}")
+        return None, None
+
+def image(record, name):
+    raw = record['dynamodb'].get(name)
+    return {key: deserializer.deserialize(value) for key, value in raw.items()} if raw else None
+
+def order_event(record):
+    """('placed' | 'cancelled', order) for stream records that change the rollups, else None"""
+    new, old = image(record, 'NewImage'), image(record, 'OldImage')
+    if record['eventName'] == 'INSERT' and new.get('status') != 'cancelled':
+        return 'placed', new
+    if record['eventName'] == 'MODIFY' and new.get('status') == 'cancelled' and old.get('status') != 'cancelled':
+        return 'cancelled', new
+    return None
+
+def line_cents(line):
+    """Line total in cents; older orders carry a decimal price instead of price_cents"""
+    if 'price_cents' in line:
+        price_cents = int(line['price_cents'])
+    else:
+        price_cents = int((Decimal(str(line['price'])) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    return price_cents * int(line['quantity'])
+
+def rollup_update(seller_id, rollup_key, revenue_cents, units, orders, extra=None):
+    names = {'#orders': 'order_count'}
+    values = {':revenue': revenue_cents, ':units': units, ':orders': orders}
+    assignments = []
+    for i, (name, value) in enumerate((extra or {}).items()):
+        names[f"#extra{i}"] = name
+        values[f":extra{i}"] = value
+        assignments.append(f"#extra{i} = :extra{i}")
+    return {'Update': {
+        'TableName': ANALYTICS_TABLE,
+        'Key': {'seller_id': seller_id, 'rollup_key': rollup_key},
+        'UpdateExpression': ('SET ' + ', '.join(assignments) + ' ' if assignments else '')
+            + 'ADD revenue_cents :revenue, units :units, #orders :orders',
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }}
+
+def apply_order_event(kind, order):
+    """
+    Adds (placed) or subtracts (cancelled) one order in a single transaction
+    together with its applied marker, so the same event never counts twice
+    """
+    sign = 1 if kind == 'placed' else -1
+    seller_id = order['seller_id']
+    day = order['created_at'][:10]
+
+    by_product = {}
+    for line in order.get('items', []):
+        product = by_product.setdefault(line['product_id'], {'revenue': 0, 'units': 0, 'name': line.get('product_name', '')})
+        product['revenue'] += line_cents(line)
+        product['units'] += int(line['quantity'])
+
+    transact_items = [
+        {'Put': {
+            'TableName': ANALYTICS_TABLE,
+            'Item': {
+                'seller_id': seller_id,
+                'rollup_key': f"applied#{order['order_id']}#{kind}",
+                'expires_at': int(time.time()) + APPLIED_MARKER_TTL_SECONDS
+            },
+            'ConditionExpression': 'attribute_not_exists(rollup_key)'
+        }},
+        rollup_update(
+            seller_id, f"day#{day}",
+            sign * sum(p['revenue'] for p in by_product.values()),
+            sign * sum(p['units'] for p in by_product.values()),
+            sign,
+            {'currency': order.get('currency', DEFAULT_CURRENCY)}
+        )
+    ]
+    # Day totals above are always exact; product rows past the transaction
+    # limit are left out (checkout keeps orders well under it)
+    for product_id, product in list(by_product.items())[:MAX_TRANSACTION_ITEMS - len(transact_items)]:
+        transact_items.append(rollup_update(
+            seller_id, f"day#{day}#product#{product_id}",
+            sign * product['revenue'], sign * product['units'], sign,
+            {'product_name': product['name']}
+        ))
+
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+        if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+            return False  # already applied
+        raise
+    return True
+
+def process_stream(records):
+    """Applies a batch of order stream records; failures go back as batchItemFailures"""
+    applied = 0
+    for record in records:
+        try:
+            event = order_event(record)
+            if event:
+                applied += int(apply_order_event(*event))
+        except Exception as e:
+            print(f"Error applying order record {record.get('eventID')}: {str(e)}")
+            # Stream batches are ordered: report the first failure and stop there
+            return {'batchItemFailures': [{'itemIdentifier': record['dynamodb']['SequenceNumber']}]}
+    print(f"Applied {applied} order events from {len(records)} records")
+    return {'batchItemFailures': []}
+
+def get_analytics(seller_id, query_params):
+    """Seller totals, daily series and top products for [from, to] (default: last 30 days)"""
+    try:
+        today = datetime.utcnow().date()
+        date_to = query_params.get('to') or today.isoformat()
+        date_from = query_params.get('from') or (today - timedelta(days=DEFAULT_RANGE_DAYS - 1)).isoformat()
+        try:
+            datetime.strptime(date_from, '%Y-%m-%d')
+            datetime.strptime(date_to, '%Y-%m-%d')
+        except ValueError:
+            return cors_response(400, {'error': 'from and to must be YYYY-MM-DD dates'})
+
+        table = dynamodb.Table(ANALYTICS_TABLE)
+        kwargs = {
+            'KeyConditionExpression': 'seller_id = :seller_id AND rollup_key BETWEEN :from AND :to',
+            'ExpressionAttributeValues': {
+                ':seller_id': seller_id,
+                ':from': f"day#{date_from}",
+                # '~' sorts after the '#product#...' suffixes of the last day
+                ':to': f"day#{date_to}~"
+            }
+        }
+        daily, products = [], {}
+        currency = DEFAULT_CURRENCY
+        while True:
+            response = table.query(**kwargs)
+            for row in response.get('Items', []):
+                parts = row['rollup_key'].split('#')
+                if len(parts) == 2:
+                    currency = row.get('currency', currency)
+                    daily.append({
+                        'date': parts[1],
+                        'sales_cents': row['revenue_cents'],
+                        'sales': Decimal(int(row['revenue_cents'])).scaleb(-2),
+                        'orders': row['order_count'],
+                        'units': row['units']
+                    })
+                else:
+                    product = products.setdefault(parts[3], {
+                        'product_id': parts[3], 'name': row.get('product_name', ''),
+                        'sales_cents': 0, 'units': 0, 'orders': 0
+                    })
+                    product['sales_cents'] += int(row['revenue_cents'])
+                    product['units'] += int(row['units'])
+                    product['orders'] += int(row['order_count'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        top_products = sorted(products.values(), key=lambda p: p['sales_cents'], reverse=True)[:TOP_PRODUCTS]
+        for product in top_products:
+            product['sales'] = Decimal(product['sales_cents']).scaleb(-2)
+        total_cents = sum(int(day['sales_cents']) for day in daily)
+        return cors_response(200, {
+            'from': date_from,
+            'to': date_to,
+            'currency': currency,
+            'total_sales_cents': total_cents,
+            'total_sales': Decimal(total_cents).scaleb(-2),
+            'total_orders': sum(int(day['orders']) for day in daily),
+            'units_sold': sum(int(day['units']) for day in daily),
+            'products_sold': sum(1 for product in products.values() if product['units'] > 0),
+            'daily': daily,
+            'top_products': top_products
+        })
+    except Exception as e:
+        print(f"Error getting analytics: {e}")
+        return cors_response(500, {'error': str(e)})
+
+def lambda_handler(event, context):
+    """
+    Orders stream records update the rollups; API Gateway requests read them
+    """
+    if 'Records' in event:
+        return process_stream(event['Records'])
+
+    print(f"Event: {json.dumps(event)}")
+    try:
+        http_method = event.get('httpMethod', event.get('requestContext', {}).get('http', {}).get('method'))
+        path = event.get('path', '')
+
+        if http_method == 'OPTIONS':
+            return cors_response(200, {})
+
+        user_id, user_type = extract_user_from_token(event)
+        if not user_id:
+            return cors_response(401, {'error': 'Authentication required'})
+        if user_type != 'seller':
+            return cors_response(403, {'error': 'Seller account required'})
+
+        if http_method == 'GET' and path.rstrip('/').endswith('/analytics'):
+            return get_analytics(user_id, event.get('queryStringParameters') or {})
+
+        return cors_response(405, {'error': 'Method not allowed'})
+    except Exception as e:
+        print(f"Lambda handler error: {e}")
+        return cors_response(500, {'error': str(e)})
@@ -0,0 +1,261 @@
+"""
+Trending products worker
+Consumes product view and add-to-cart events from SQS and maintains
+count-min sketches with top-k candidates per time bucket. After every
+batch the 1h and 24h rankings are published as small items that the
+Products API reads with a single get_item. Each message is counted once per
+window: its applied marker is written in the same transaction as the bucket,
+so a redelivered message is skipped and only messages whose bucket kept
+conflicting are reported back for redelivery.
+"""
+import json
+import boto3
+import os
+import time
+import zlib
+import hashlib
+from array import array
+from collections import defaultdict
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+endpoint_url = os.getenv('AWS_ENDPOINT_URL') or None
+dynamodb = boto3.resource('dynamodb', endpoint_url=endpoint_url)
+TRENDING_TABLE = os.getenv('TRENDING_TABLE', 'ekart-trending-dev')
+PRODUCTS_TABLE = os.getenv('PRODUCTS_TABLE', 'ekart-products-dev')
+
+# Sketch dimensions: error is about total_events / SKETCH_WIDTH with
+# probability 1 - 0.5 ** SKETCH_DEPTH
+SKETCH_DEPTH = int(os.getenv('SKETCH_DEPTH', '4'))
+SKETCH_WIDTH = int(os.getenv('SKETCH_WIDTH', '1024'))
+TOP_K = int(os.getenv('TRENDING_TOP_K', '20'))
+
+# Candidates kept per bucket; more than TOP_K so items that trend across
+# several buckets are not lost at bucket boundaries
+CANDIDATES_PER_BUCKET = TOP_K * 4
+
+EVENT_WEIGHTS = {
+    'view': 1,
+    'add_to_cart': 3
+}
+
+# window name -> (window length, bucket length) in seconds
+WINDOWS = {
+    '1h': (3600, 300),
+    '24h': (86400, 3600)
+}
+
+MAX_WRITE_ATTEMPTS = 3
+# A bucket write plus one applied marker per message must fit one TransactWriteItems call (100 items)
+MAX_MESSAGES_PER_WRITE = 99
+# Applied markers outlive any redelivery (SQS keeps messages for at most 4 days by default)
+APPLIED_TTL_SECONDS = int(os.getenv('APPLIED_TTL_SECONDS', str(4 * 86400)))
+
+def new_sketch():
+    """Empty count-min sketch as a flat array of depth x width counters"""
+    return array('I', bytes(4 * SKETCH_DEPTH * SKETCH_WIDTH))
+
+def sketch_slots(product_id):
+    """Counter index for product_id in each row of the sketch"""
+    slots = []
+    for row in range(SKETCH_DEPTH):
+        digest = hashlib.blake2b(f"{row}:{product_id}".encode('utf-8'), digest_size=8).digest()
+        slots.append(row * SKETCH_WIDTH + int.from_bytes(digest, 'big') % SKETCH_WIDTH)
+    return slots
+
+def sketch_add(sketch, product_id, count):
+    for slot in sketch_slots(product_id):
+        sketch[slot] += count
+
+def sketch_estimate(sketch, product_id):
+    return min(sketch[slot] for slot in sketch_slots(product_id))
+
+def merge_sketches(sketches):
+    merged = new_sketch()
+    for sketch in sketches:
+        for i, value in enumerate(sketch):
+            if value:
+                merged[i] += value
+    return merged
+
+def pack_sketch(sketch):
+    return zlib.compress(sketch.tobytes())
+
+def unpack_sketch(blob):
+    sketch = array('I')
+    sketch.frombytes(zlib.decompress(getattr(blob, 'value', blob)))
+    if len(sketch) != SKETCH_DEPTH * SKETCH_WIDTH:
+        # Dimensions changed since the bucket was written; start over
+        return new_sketch()
+    return sketch
+
+def top_candidates(scores, limit):
+    return dict(sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit])
+
+def bucket_id(window, bucket_start):
+    return f"bucket#{window}#{bucket_start}"
+
+def applied_id(window, message_id):
+    return f"applied#{window}#{message_id}"
+
+def parse_events(records):
+    """(message_id, timestamp seconds, product_id, weight) for each usable SQS record"""
+    events = []
+    for record in records:
+        try:
+            body = json.loads(record['body'])
+            weight = EVENT_WEIGHTS.get(body.get('type'))
+            product_id = body.get('product_id')
+            if not weight or not product_id:
+                continue
+            ts = body.get('ts') or int(record.get('attributes', {}).get('SentTimestamp', 0)) / 1000
+            events.append((record['messageId'], int(ts or time.time()), product_id, weight))
+        except Exception as e:
+            print(f"Skipping malformed activity event: {e}")
+    return events
+
+def unapplied(window, message_ids):
+    """The messages not yet counted in the window"""
+    keys = [{'sketch_id': applied_id(window, mid)} for mid in message_ids]
+    applied = set()
+    request = {TRENDING_TABLE: {'Keys': keys, 'ProjectionExpression': 'sketch_id', 'ConsistentRead': True}}
+    while request:
+        response = dynamodb.batch_get_item(RequestItems=request)
+        applied.update(item['sketch_id'] for item in response.get('Responses', {}).get(TRENDING_TABLE, []))
+        request = response.get('UnprocessedKeys') or None
+    return [mid for mid in message_ids if applied_id(window, mid) not in applied]
+
+def update_bucket(window, bucket_start, contributions, expires_at):
+    """
+    Add up to MAX_MESSAGES_PER_WRITE messages' counts ({message_id:
+    {product_id: weight}}) to a bucket sketch. One transaction writes the
+    sketch with an optimistic version check and an applied marker per
+    message, so a message is counted exactly once. Returns False when
+    concurrent writers kept winning.
+    """
+    table = dynamodb.Table(TRENDING_TABLE)
+    key = {'sketch_id': bucket_id(window, bucket_start)}
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        pending = unapplied(window, list(contributions))
+        if not pending:
+            return True
+        item = table.get_item(Key=key, ConsistentRead=True).get('Item')
+        version = int(item['version']) if item else 0
+        sketch = unpack_sketch(item['sketch']) if item else new_sketch()
+        candidates = {pid: int(v) for pid, v in (item or {}).get('candidates', {}).items()}
+        
+        for message_id in pending:
+            for product_id, count in contributions[message_id].items():
+                sketch_add(sketch, product_id, count)
+                candidates[product_id] = sketch_estimate(sketch, product_id)
+        
+        bucket = {
+            'TableName': TRENDING_TABLE,
+            'Item': {
+                **key,
+                'sketch': pack_sketch(sketch),
+                'candidates': top_candidates(candidates, CANDIDATES_PER_BUCKET),
+                'version': version + 1,
+                'expires_at': expires_at
+            }
+        }
+        if item:
+            bucket.update(ConditionExpression='version = :v', ExpressionAttributeValues={':v': version})
+        else:
+            bucket['ConditionExpression'] = 'attribute_not_exists(sketch_id)'
+        markers = [
+            {'Put': {
+                'TableName': TRENDING_TABLE,
+                'Item': {'sketch_id': applied_id(window, mid), 'expires_at': int(time.time()) + APPLIED_TTL_SECONDS},
+                'ConditionExpression': 'attribute_not_exists(sketch_id)'
+            }}
+            for mid in pending
+        ]
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[{'Put': bucket}] + markers)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            print(f"Version conflict on {key['sketch_id']} (attempt {attempt + 1})")
+    print(f"Could not update {key['sketch_id']} after {MAX_WRITE_ATTEMPTS} attempts")
+    return False
+
+def load_buckets(window, now):
+    """Fetch every bucket that overlaps the window ending at now"""
+    length, step = WINDOWS[window]
+    first = (now - length) // step * step + step
+    keys = [{'sketch_id': bucket_id(window, start)} for start in range(first, now + 1, step)]
+    buckets = []
+    for i in range(0, len(keys), 100):
+        request = {TRENDING_TABLE: {'Keys': keys[i:i + 100]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            buckets.extend(response.get('Responses', {}).get(TRENDING_TABLE, []))
+            request = response.get('UnprocessedKeys') or None
+    return buckets
+
+def describe_products(product_ids):
+    """Small product projection so the published item is self-contained"""
+    if not product_ids:
+        return {}
+    response = dynamodb.batch_get_item(RequestItems={
+        PRODUCTS_TABLE: {
+            'Keys': [{'product_id': pid} for pid in product_ids],
+            'ProjectionExpression': 'product_id, title, #n, price, category, image_url',
+            'ExpressionAttributeNames': {'#n': 'name'}
+        }
+    })
+    return {p['product_id']: p for p in response.get('Responses', {}).get(PRODUCTS_TABLE, [])}
+
+def publish_window(window, now):
+    """Merge the window's buckets and publish its top-k ranking"""
+    buckets = load_buckets(window, now)
+    merged = merge_sketches(unpack_sketch(b['sketch']) for b in buckets)
+    candidates = set()
+    for bucket in buckets:
+        candidates.update(bucket.get('candidates', {}).keys())
+    
+    scores = {pid: sketch_estimate(merged, pid) for pid in candidates}
+    ranking = top_candidates(scores, TOP_K)
+    details = describe_products(list(ranking))
+    
+    products = []
+    for product_id, score in ranking.items():
+        entry = dict(details.get(product_id, {'product_id': product_id}))
+        entry['score'] = score
+        products.append(entry)
+    
+    dynamodb.Table(TRENDING_TABLE).put_item(Item={
+        'sketch_id': f"trending#{window}",
+        'window': window,
+        'products': products,
+        'updated_at': datetime.utcnow().isoformat()
+    })
+
+def lambda_handler(event, context):
+    """
+    Process a batch of activity events from SQS
+    """
+    print(f"Trending worker invoked with {len(event.get('Records', []))} records")
+    
+    events = parse_events(event.get('Records', []))
+    now = int(time.time())
+    failed = set()
+    
+    for window, (length, step) in WINDOWS.items():
+        # bucket start -> message_id -> product_id -> weight
+        by_bucket = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        for message_id, ts, product_id, weight in events:
+            if ts > now - length:
+                by_bucket[ts // step * step][message_id][product_id] += weight
+        for bucket_start, contributions in by_bucket.items():
+            message_ids = list(contributions)
+            for start in range(0, len(message_ids), MAX_MESSAGES_PER_WRITE):
+                chunk = message_ids[start:start + MAX_MESSAGES_PER_WRITE]
+                if not update_bucket(window, bucket_start, {mid: contributions[mid] for mid in chunk}, bucket_start + step + length):
+                    failed.update(chunk)
+        publish_window(window, now)
+    
+    print(f"Counted {len(events)} activity events, {len(failed)} messages left for redelivery")
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in sorted(failed)]}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Backfill status_created_at - the seller-status-index sort key - on orders
+written before it existed. Without it an order never shows up in a seller's
+status-filtered order list. Runs a parallel scan and sets the key on every
+order that lacks one.
+"""
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+from botocore.exceptions import ClientError
+
+PROJECT_ROOT = Path(__file__).parent.parent
+CONFIG_PATH = PROJECT_ROOT / 'serverless-config.json'
+with open(CONFIG_PATH, 'r') as _cfg_file:
+    _CFG = json.load(_cfg_file)
+
+ENDPOINT = _CFG.get('endpoint')
+REGION = _CFG.get('region', 'us-east-1')
+ENV = _CFG.get('env', 'dev')
+TABLE_NAME = f'ekart-orders-{ENV}'
+
+dynamodb = boto3.resource(
+    'dynamodb',
+    endpoint_url=ENDPOINT,
+    region_name=REGION,
+    aws_access_key_id='test',
+    aws_secret_access_key='test'
+)
+
+def status_created_at(order):
+    """
+    Sort key as orders-api writes it: <status>#<time the order entered it>.
+    A pending order entered its status when it was created; for any other
+    status the last update is the closest record of when it did.
+    """
+    entered_at = order['created_at'] if order['status'] == 'pending' else order.get('updated_at', order['created_at'])
+    return f"{order['status']}#{entered_at}"
+
+def backfill_segment(segment, total_segments, dry_run):
+    """Scan one segment and key its orders. Returns (scanned, updated)"""
+    table = dynamodb.Table(TABLE_NAME)
+    scanned = updated = 0
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': 'order_id, #status, created_at, updated_at',
+        # Archive stubs have no seller_id and stay out of the seller indexes
+        'FilterExpression': 'attribute_not_exists(status_created_at) AND attribute_exists(seller_id)',
+        'ExpressionAttributeNames': {'#status': 'status'}
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        scanned += response.get('ScannedCount', 0)
+        for order in response.get('Items', []):
+            if dry_run:
+                updated += 1
+                continue
+            try:
+                # Conditional on the status read: an order that moved since has its key written by that move
+                table.update_item(
+                    Key={'order_id': order['order_id']},
+                    UpdateExpression='SET status_created_at = :key',
+                    ConditionExpression='attribute_not_exists(status_created_at) AND #status = :status',
+                    ExpressionAttributeNames={'#status': 'status'},
+                    ExpressionAttributeValues={':key': status_created_at(order), ':status': order['status']}
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            return scanned, updated
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill status_created_at on EKart orders')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel scan segments (one thread each)')
+    parser.add_argument('--dry-run', action='store_true', help='Count orders missing the key without updating them')
+    args = parser.parse_args()
+
+    print(f"🔑 Backfilling status_created_at on {TABLE_NAME} ({args.segments} segments)...")
+    with ThreadPoolExecutor(max_workers=args.segments) as executor:
+        results = list(executor.map(
+            lambda segment: backfill_segment(segment, args.segments, args.dry_run),
+            range(args.segments)
+        ))
+
+    scanned = sum(r[0] for r in results)
+    updated = sum(r[1] for r in results)
+    action = 'would update' if args.dry_run else 'updated'
+    print(f"  ✓ Scanned {scanned} orders, {action} {updated}")
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,32 @@ def create_aws_clients():
         's3': boto3.client('s3', **config)
     }
 
+def add_missing_indexes(dynamodb, table_config):
+    """
+    Adds the GSIs declared for an existing table that it does not have yet.
+    DynamoDB builds one new index per update_table, so they are added one at
+    a time, each waited on until ACTIVE. An index whose key schema changes
+    needs a new name: existing indexes are never modified.
+    """
+    table_name = table_config['TableName']
+    existing = dynamodb.describe_table(TableName=table_name)['Table'].get('GlobalSecondaryIndexes', [])
+    present = {index['IndexName'] for index in existing}
+    attributes = {a['AttributeName']: a for a in table_config['AttributeDefinitions']}
+    for index in table_config.get('GlobalSecondaryIndexes', []):
+        if index['IndexName'] in present:
+            continue
+        dynamodb.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[attributes[key['AttributeName']] for key in index['KeySchema']],
+            GlobalSecondaryIndexUpdates=[{'Create': index}]
+        )
+        while True:
+            indexes = dynamodb.describe_table(TableName=table_name)['Table'].get('GlobalSecondaryIndexes', [])
+            if all(i['IndexStatus'] == 'ACTIVE' for i in indexes if i['IndexName'] == index['IndexName']):
+                break
+            time.sleep(5)
+        debug(f"✓ Added index {index['IndexName']} to {table_name}")
+
 def create_dynamodb_tables(dynamodb):
     debug("Creating DynamoDB tables...")
     tables = [
@@ -80,7 +106,9 @@ def create_dynamodb_tables(dynamodb):
             'AttributeDefinitions': [
                 {'AttributeName': 'order_id', 'AttributeType': 'S'},
                 {'AttributeName': 'buyer_id', 'AttributeType': 'S'},
-                {'AttributeName': 'seller_id', 'AttributeType': 'S'}
+                {'AttributeName': 'seller_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'},
+                {'AttributeName': 'status_created_at', 'AttributeType': 'S'}
             ],
             'GlobalSecondaryIndexes': [
                 {
@@ -92,8 +120,35 @@ def create_dynamodb_tables(dynamodb):
                     'IndexName': 'seller-index',
                     'KeySchema': [{'AttributeName': 'seller_id', 'KeyType': 'HASH'}],
                     'Projection': {'ProjectionType': 'ALL'}
+                },
+                # Indexes below are added to existing tables by add_missing_indexes
+                {
+                    'IndexName': 'buyer-created-index',
+                    'KeySchema': [
+                        {'AttributeName': 'buyer_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                {
+                    'IndexName': 'seller-created-index',
+                    'KeySchema': [
+                        {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                {
+                    'IndexName': 'seller-status-index',
+                    'KeySchema': [
+                        {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'status_created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
                 }
             ],
+            # seller-analytics consumes the order stream
+            'StreamSpecification': {'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'},
             'BillingMode': 'PAY_PER_REQUEST'
         },
         {
@@ -107,18 +162,112 @@ def create_dynamodb_tables(dynamodb):
             'KeySchema': [{'AttributeName': 'product_id', 'KeyType': 'HASH'}],
             'AttributeDefinitions': [{'AttributeName': 'product_id', 'AttributeType': 'S'}],
             'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-stock-holds-{ENV}',
+            'KeySchema': [
+                {'AttributeName': 'product_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'holder', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'product_id', 'AttributeType': 'S'},
+                {'AttributeName': 'holder', 'AttributeType': 'S'}
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-search-cache-{ENV}',
+            'KeySchema': [{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-trending-{ENV}',
+            'KeySchema': [{'AttributeName': 'sketch_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'sketch_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-seller-stats-{ENV}',
+            'KeySchema': [{'AttributeName': 'seller_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'seller_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-idempotency-{ENV}',
+            'KeySchema': [{'AttributeName': 'idempotency_key', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'idempotency_key', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-seller-analytics-{ENV}',
+            'KeySchema': [
+                {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'rollup_key', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'seller_id', 'AttributeType': 'S'},
+                {'AttributeName': 'rollup_key', 'AttributeType': 'S'}
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-outbox-{ENV}',
+            'KeySchema': [{'AttributeName': 'event_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'event_id', 'AttributeType': 'S'}],
+            # outbox-relay publishes each new entry from the stream
+            'StreamSpecification': {'StreamEnabled': True, 'StreamViewType': 'NEW_IMAGE'},
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-checkout-sagas-{ENV}',
+            'KeySchema': [{'AttributeName': 'order_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'order_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-export-jobs-{ENV}',
+            'KeySchema': [{'AttributeName': 'job_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'job_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
         }
     ]
 
+    # Tables whose items expire via DynamoDB TTL (table name -> attribute)
+    ttl_attributes = {
+        f'ekart-carts-{ENV}': 'expires_at',
+        f'ekart-search-cache-{ENV}': 'expires_at',
+        f'ekart-trending-{ENV}': 'expires_at',
+        f'ekart-idempotency-{ENV}': 'expires_at',
+        f'ekart-seller-analytics-{ENV}': 'expires_at',
+        f'ekart-outbox-{ENV}': 'expires_at',
+        f'ekart-checkout-sagas-{ENV}': 'expires_at',
+        f'ekart-export-jobs-{ENV}': 'expires_at'
+    }
+
     for table_config in tables:
         try:
             dynamodb.create_table(**table_config)
             debug(f"✓ Created table: {table_config['TableName']}")
         except dynamodb.exceptions.ResourceInUseException:
             debug(f"⚠ Table already exists: {table_config['TableName']}")
+            try:
+                add_missing_indexes(dynamodb, table_config)
+            except Exception as e:
+                debug(f"✗ Error adding indexes to {table_config['TableName']}: {e}")
         except Exception as e:
             debug(f"✗ Error creating table {table_config['TableName']}: {e}")
 
+    for table_name, attribute_name in ttl_attributes.items():
+        try:
+            dynamodb.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={'Enabled': True, 'AttributeName': attribute_name}
+            )
+            debug(f"✓ Enabled TTL on {table_name} ({attribute_name})")
+        except Exception as e:
+            debug(f"⚠ Could not enable TTL on {table_name}: {e}")
+
 def create_cognito_user_pool(cognito):
     debug("Creating Cognito user pool...")
     try:
@@ -10,6 +10,7 @@ import zipfile
 import os
 import subprocess
 from pathlib import Path
+from urllib.parse import urlparse
 
 # LocalStack configuration (read from serverless-config.json)
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -21,6 +22,10 @@ ENDPOINT = _CFG.get('endpoint')
 REGION = _CFG.get('region')
 ENV = _CFG.get('env', 'dev')
 LAMBDA_ENDPOINT = _CFG.get('lambda_endpoint', 'http://localhost.localstack.cloud:4566')
+# Shared by cart-api (signs guest cart IDs) and auth-api (verifies them on login)
+GUEST_CART_SECRET = os.getenv('GUEST_CART_SECRET', 'ekart-dev-guest-cart-secret')
+# Soft stock holds on add-to-cart (cart-api, orders-api, auth-api merges); off unless enabled here
+STOCK_RESERVATIONS_ENABLED = os.getenv('STOCK_RESERVATIONS_ENABLED', 'false')
 
 def create_aws_clients():
     """Create AWS clients for LocalStack"""
@@ -37,9 +42,37 @@ def create_aws_clients():
         's3': boto3.client('s3', **config),
         'lambda_client': boto3.client('lambda', **config),
         'apigateway': boto3.client('apigateway', **config),
-        'iam': boto3.client('iam', **config)
+        'iam': boto3.client('iam', **config),
+        'sqs': boto3.client('sqs', **config),
+        'events': boto3.client('events', **config)
     }
 
+def add_missing_indexes(dynamodb, table_config):
+    """
+    Adds the GSIs declared for an existing table that it does not have yet.
+    DynamoDB builds one new index per update_table, so they are added one at
+    a time, each waited on until ACTIVE. An index whose key schema changes
+    needs a new name: existing indexes are never modified.
+    """
+    table_name = table_config['TableName']
+    existing = dynamodb.describe_table(TableName=table_name)['Table'].get('GlobalSecondaryIndexes', [])
+    present = {index['IndexName'] for index in existing}
+    attributes = {a['AttributeName']: a for a in table_config['AttributeDefinitions']}
+    for index in table_config.get('GlobalSecondaryIndexes', []):
+        if index['IndexName'] in present:
+            continue
+        dynamodb.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[attributes[key['AttributeName']] for key in index['KeySchema']],
+            GlobalSecondaryIndexUpdates=[{'Create': index}]
+        )
+        while True:
+            indexes = dynamodb.describe_table(TableName=table_name)['Table'].get('GlobalSecondaryIndexes', [])
+            if all(i['IndexStatus'] == 'ACTIVE' for i in indexes if i['IndexName'] == index['IndexName']):
+                break
+            time.sleep(5)
+        print(f"  ✓ Added index {index['IndexName']} to {table_name}")
+
 def create_dynamodb_tables(dynamodb):
     """Create DynamoDB tables"""
     print("📦 Creating DynamoDB tables...")
@@ -87,7 +120,9 @@ def create_dynamodb_tables(dynamodb):
             'AttributeDefinitions': [
                 {'AttributeName': 'order_id', 'AttributeType': 'S'},
                 {'AttributeName': 'buyer_id', 'AttributeType': 'S'},
-                {'AttributeName': 'seller_id', 'AttributeType': 'S'}
+                {'AttributeName': 'seller_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'},
+                {'AttributeName': 'status_created_at', 'AttributeType': 'S'}
             ],
             'GlobalSecondaryIndexes': [
                 {
@@ -99,8 +134,35 @@ def create_dynamodb_tables(dynamodb):
                     'IndexName': 'seller-index',
                     'KeySchema': [{'AttributeName': 'seller_id', 'KeyType': 'HASH'}],
                     'Projection': {'ProjectionType': 'ALL'}
+                },
+                # Indexes below are added to existing tables by add_missing_indexes
+                {
+                    'IndexName': 'buyer-created-index',
+                    'KeySchema': [
+                        {'AttributeName': 'buyer_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                {
+                    'IndexName': 'seller-created-index',
+                    'KeySchema': [
+                        {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                },
+                {
+                    'IndexName': 'seller-status-index',
+                    'KeySchema': [
+                        {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'status_created_at', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
                 }
             ],
+            # seller-analytics consumes the order stream
+            'StreamSpecification': {'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'},
             'BillingMode': 'PAY_PER_REQUEST'
         },
         {
@@ -114,17 +176,111 @@ def create_dynamodb_tables(dynamodb):
             'KeySchema': [{'AttributeName': 'product_id', 'KeyType': 'HASH'}],
             'AttributeDefinitions': [{'AttributeName': 'product_id', 'AttributeType': 'S'}],
             'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-stock-holds-{ENV}',
+            'KeySchema': [
+                {'AttributeName': 'product_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'holder', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'product_id', 'AttributeType': 'S'},
+                {'AttributeName': 'holder', 'AttributeType': 'S'}
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-search-cache-{ENV}',
+            'KeySchema': [{'AttributeName': 'cache_key', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'cache_key', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-trending-{ENV}',
+            'KeySchema': [{'AttributeName': 'sketch_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'sketch_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-seller-stats-{ENV}',
+            'KeySchema': [{'AttributeName': 'seller_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'seller_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-idempotency-{ENV}',
+            'KeySchema': [{'AttributeName': 'idempotency_key', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'idempotency_key', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-seller-analytics-{ENV}',
+            'KeySchema': [
+                {'AttributeName': 'seller_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'rollup_key', 'KeyType': 'RANGE'}
+            ],
+            'AttributeDefinitions': [
+                {'AttributeName': 'seller_id', 'AttributeType': 'S'},
+                {'AttributeName': 'rollup_key', 'AttributeType': 'S'}
+            ],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-outbox-{ENV}',
+            'KeySchema': [{'AttributeName': 'event_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'event_id', 'AttributeType': 'S'}],
+            # outbox-relay publishes each new entry from the stream
+            'StreamSpecification': {'StreamEnabled': True, 'StreamViewType': 'NEW_IMAGE'},
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-checkout-sagas-{ENV}',
+            'KeySchema': [{'AttributeName': 'order_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'order_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
+        },
+        {
+            'TableName': f'ekart-export-jobs-{ENV}',
+            'KeySchema': [{'AttributeName': 'job_id', 'KeyType': 'HASH'}],
+            'AttributeDefinitions': [{'AttributeName': 'job_id', 'AttributeType': 'S'}],
+            'BillingMode': 'PAY_PER_REQUEST'
         }
     ]
     
+    # Tables whose items expire via DynamoDB TTL (table name -> attribute)
+    ttl_attributes = {
+        f'ekart-carts-{ENV}': 'expires_at',
+        f'ekart-search-cache-{ENV}': 'expires_at',
+        f'ekart-trending-{ENV}': 'expires_at',
+        f'ekart-idempotency-{ENV}': 'expires_at',
+        f'ekart-seller-analytics-{ENV}': 'expires_at',
+        f'ekart-outbox-{ENV}': 'expires_at',
+        f'ekart-checkout-sagas-{ENV}': 'expires_at',
+        f'ekart-export-jobs-{ENV}': 'expires_at'
+    }
+    
     for table_config in tables:
         try:
             dynamodb.create_table(**table_config)
             print(f"  ✓ Created table: {table_config['TableName']}")
         except dynamodb.exceptions.ResourceInUseException:
             print(f"  ⚠ Table already exists: {table_config['TableName']}")
+            try:
+                add_missing_indexes(dynamodb, table_config)
+            except Exception as e:
+                print(f"  ✗ Error adding indexes to {table_config['TableName']}: {e}")
         except Exception as e:
             print(f"  ✗ Error creating table {table_config['TableName']}: {e}")
+    
+    for table_name, attribute_name in ttl_attributes.items():
+        try:
+            dynamodb.update_time_to_live(
+                TableName=table_name,
+                TimeToLiveSpecification={'Enabled': True, 'AttributeName': attribute_name}
+            )
+            print(f"  ✓ Enabled TTL on {table_name} ({attribute_name})")
+        except Exception as e:
+            print(f"  ⚠ Could not enable TTL on {table_name}: {e}")
 
 def create_cognito_user_pool(cognito):
     """Create Cognito user pool with custom attributes"""
@@ -207,7 +363,7 @@ def create_s3_buckets(s3):
     """Create S3 buckets"""
     print("🪣 Creating S3 buckets...")
     
-    buckets = [f'ekart-product-images-{ENV}', f'ekart-lambda-code-{ENV}']
+    buckets = [f'ekart-product-images-{ENV}', f'ekart-lambda-code-{ENV}', f'ekart-exports-{ENV}', f'ekart-order-archive-{ENV}']
     
     for bucket_name in buckets:
         try:
@@ -218,6 +374,33 @@ def create_s3_buckets(s3):
         except Exception as e:
             print(f"  ✗ Error creating bucket {bucket_name}: {e}")
 
+def create_sqs_queues(sqs):
+    """Create SQS queues and return {queue name: {'url', 'lambda_url', 'arn'}}"""
+    print("📨 Creating SQS queues...")
+    
+    queue_attributes = {
+        f'ekart-activity-events-{ENV}': {},
+        # Visibility well above order-processor's 30s timeout so a slow batch is not redelivered mid-run
+        f'ekart-orders-{ENV}': {'VisibilityTimeout': '180'}
+    }
+    queues = {}
+    
+    for queue_name, attributes in queue_attributes.items():
+        try:
+            queue_url = sqs.create_queue(QueueName=queue_name, Attributes=attributes)['QueueUrl']
+            attributes = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=['QueueArn'])
+            queues[queue_name] = {
+                'url': queue_url,
+                # Lambdas reach LocalStack through LAMBDA_ENDPOINT, not localhost
+                'lambda_url': f"{LAMBDA_ENDPOINT}{urlparse(queue_url).path}",
+                'arn': attributes['Attributes']['QueueArn']
+            }
+            print(f"  ✓ Queue ready: {queue_name}")
+        except Exception as e:
+            print(f"  ✗ Error creating queue {queue_name}: {e}")
+    
+    return queues
+
 def create_lambda_role(iam):
     """Create IAM role for Lambda functions"""
     print("👤 Creating Lambda execution role...")
@@ -276,10 +459,13 @@ def create_lambda_deployment_package(function_dir):
 
     return zip_path
 
-def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
+def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id, queues):
     """Deploy all Lambda functions"""
     print("🚀 Deploying Lambda functions...")
     
+    def queue_url(name):
+        return queues.get(f'{name}-{ENV}', {}).get('lambda_url', '')
+    
     functions = [
         {
             'name': 'ekart-auth-api',
@@ -289,6 +475,10 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
                 'USER_POOL_ID': user_pool_id,
                 'CLIENT_ID': client_id,
                 'USERS_TABLE': f'ekart-users-{ENV}',
+                'CARTS_TABLE': f'ekart-carts-{ENV}',
+                'GUEST_CART_SECRET': GUEST_CART_SECRET,
+                'STOCK_HOLDS_TABLE': f'ekart-stock-holds-{ENV}',
+                'STOCK_RESERVATIONS_ENABLED': STOCK_RESERVATIONS_ENABLED,
                 'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
             }
         },
@@ -298,6 +488,11 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
             'handler': 'handler.lambda_handler',
             'env': {
                 'PRODUCTS_TABLE': f'ekart-products-{ENV}',
+                'SEARCH_CACHE_TABLE': f'ekart-search-cache-{ENV}',
+                'TRENDING_TABLE': f'ekart-trending-{ENV}',
+                'ACTIVITY_QUEUE_URL': queue_url('ekart-activity-events'),
+                'SELLER_STATS_TABLE': f'ekart-seller-stats-{ENV}',
+                'INVENTORY_TABLE': f'ekart-inventory-{ENV}',
                 'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
             }
         },
@@ -308,6 +503,11 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
             'env': {
                 'CARTS_TABLE': f'ekart-carts-{ENV}',
                 'PRODUCTS_TABLE': f'ekart-products-{ENV}',
+                'ACTIVITY_QUEUE_URL': queue_url('ekart-activity-events'),
+                'GUEST_CART_SECRET': GUEST_CART_SECRET,
+                'INVENTORY_TABLE': f'ekart-inventory-{ENV}',
+                'STOCK_HOLDS_TABLE': f'ekart-stock-holds-{ENV}',
+                'STOCK_RESERVATIONS_ENABLED': STOCK_RESERVATIONS_ENABLED,
                 'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
             }
         },
@@ -315,10 +515,66 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
             'name': 'ekart-orders-api',
             'dir': 'orders-api',
             'handler': 'handler.lambda_handler',
+            # Order exports run in an async invocation of this function; API calls stay within API Gateway's 29s
+            'timeout': 900,
             'env': {
                 'ORDERS_TABLE': f'ekart-orders-{ENV}',
                 'CARTS_TABLE': f'ekart-carts-{ENV}',
                 'PRODUCTS_TABLE': f'ekart-products-{ENV}',
+                'INVENTORY_TABLE': f'ekart-inventory-{ENV}',
+                'STOCK_HOLDS_TABLE': f'ekart-stock-holds-{ENV}',
+                'STOCK_RESERVATIONS_ENABLED': STOCK_RESERVATIONS_ENABLED,
+                'IDEMPOTENCY_TABLE': f'ekart-idempotency-{ENV}',
+                # Checkout saga runs when there is a queue to start it from
+                'ASYNC_CHECKOUT': 'true' if queue_url('ekart-orders') else 'false',
+                'EXPORTS_BUCKET': f'ekart-exports-{ENV}',
+                'EXPORT_JOBS_TABLE': f'ekart-export-jobs-{ENV}',
+                'ARCHIVE_BUCKET': f'ekart-order-archive-{ENV}',
+                'OUTBOX_TABLE': f'ekart-outbox-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-outbox-relay',
+            'dir': 'outbox-relay',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'EVENT_BUS_NAME': f'ekart-events-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-order-processor',
+            'dir': 'order-processor',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'ORDERS_TABLE': f'ekart-orders-{ENV}',
+                'PRODUCTS_TABLE': f'ekart-products-{ENV}',
+                'INVENTORY_TABLE': f'ekart-inventory-{ENV}',
+                'STOCK_HOLDS_TABLE': f'ekart-stock-holds-{ENV}',
+                'SAGAS_TABLE': f'ekart-checkout-sagas-{ENV}',
+                'OUTBOX_TABLE': f'ekart-outbox-{ENV}',
+                'ORDER_QUEUE_URL': queue_url('ekart-orders'),
+                'STOCK_RESERVATIONS_ENABLED': STOCK_RESERVATIONS_ENABLED,
+                'PAYMENT_FUNCTION': 'ekart-payment-processor',
+                'NOTIFICATION_FUNCTION': 'ekart-notification-sender',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-seller-analytics',
+            'dir': 'seller-analytics',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'SELLER_ANALYTICS_TABLE': f'ekart-seller-analytics-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-notification-sender',
+            'dir': 'notification-sender',
+            'handler': 'handler.lambda_handler',
+            'env': {
                 'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
             }
         },
@@ -331,6 +587,36 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
                 'STRIPE_BASE_URL': f"{LAMBDA_ENDPOINT}/stripe",
                 'STRIPE_API_KEY': 'sk_test_12345'
             }
+        },
+        {
+            'name': 'ekart-trending-worker',
+            'dir': 'trending-worker',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'TRENDING_TABLE': f'ekart-trending-{ENV}',
+                'PRODUCTS_TABLE': f'ekart-products-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-inventory-updater',
+            'dir': 'inventory-updater',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'INVENTORY_TABLE': f'ekart-inventory-{ENV}',
+                'STOCK_HOLDS_TABLE': f'ekart-stock-holds-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
+        },
+        {
+            'name': 'ekart-order-archiver',
+            'dir': 'order-archiver',
+            'handler': 'handler.lambda_handler',
+            'env': {
+                'ORDERS_TABLE': f'ekart-orders-{ENV}',
+                'ARCHIVE_BUCKET': f'ekart-order-archive-{ENV}',
+                'AWS_ENDPOINT_URL': LAMBDA_ENDPOINT
+            }
         }
     ]
     
@@ -365,7 +651,7 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
                 Handler=func['handler'],
                 Code={'ZipFile': zip_content},
                 Environment={'Variables': func['env']},
-                Timeout=30,
+                Timeout=func.get('timeout', 30),
                 MemorySize=256
             )
             print(f"  ✓ Created function: {function_name}")
@@ -379,6 +665,183 @@ def deploy_lambda_functions(lambda_client, role_arn, user_pool_id, client_id):
     
     return deployed_functions
 
+def create_event_source_mappings(lambda_client, lambda_functions, queues):
+    """Connect queue consumers to their SQS queues"""
+    print("🔗 Creating event source mappings...")
+    
+    mappings = [
+        {'lambda_key': 'trending-worker', 'queue': f'ekart-activity-events-{ENV}', 'batch_size': 100, 'partial_failures': True},
+        {'lambda_key': 'order-processor', 'queue': f'ekart-orders-{ENV}', 'batch_size': 10, 'partial_failures': True}
+    ]
+    
+    for mapping in mappings:
+        if mapping['lambda_key'] not in lambda_functions or mapping['queue'] not in queues:
+            print(f"  ⚠ Skipping mapping: {mapping['queue']} → {mapping['lambda_key']}")
+            continue
+        try:
+            params = {
+                'EventSourceArn': queues[mapping['queue']]['arn'],
+                'FunctionName': lambda_functions[mapping['lambda_key']],
+                'BatchSize': mapping['batch_size']
+            }
+            if mapping['batch_size'] > 10:
+                # SQS only allows batches above 10 with a batching window
+                params['MaximumBatchingWindowInSeconds'] = 5
+            if mapping.get('partial_failures'):
+                # Only the messages listed in batchItemFailures are redelivered
+                params['FunctionResponseTypes'] = ['ReportBatchItemFailures']
+            lambda_client.create_event_source_mapping(**params)
+            print(f"  ✓ Mapped {mapping['queue']} → {mapping['lambda_key']}")
+        except lambda_client.exceptions.ResourceConflictException:
+            print(f"  ⚠ Mapping already exists: {mapping['queue']} → {mapping['lambda_key']}")
+        except Exception as e:
+            print(f"  ✗ Error mapping {mapping['queue']}: {e}")
+
+def create_stream_mappings(dynamodb, lambda_client, lambda_functions):
+    """Connect stream consumers to their DynamoDB table streams"""
+    print("🔗 Creating stream mappings...")
+    
+    mappings = [
+        {'lambda_key': 'seller-analytics', 'table': f'ekart-orders-{ENV}', 'batch_size': 100},
+        {'lambda_key': 'outbox-relay', 'table': f'ekart-outbox-{ENV}', 'batch_size': 100}
+    ]
+    
+    for mapping in mappings:
+        if mapping['lambda_key'] not in lambda_functions:
+            print(f"  ⚠ Skipping mapping: {mapping['table']} → {mapping['lambda_key']}")
+            continue
+        try:
+            stream_arn = dynamodb.describe_table(TableName=mapping['table'])['Table']['LatestStreamArn']
+            lambda_client.create_event_source_mapping(
+                EventSourceArn=stream_arn,
+                FunctionName=lambda_functions[mapping['lambda_key']],
+                BatchSize=mapping['batch_size'],
+                StartingPosition='TRIM_HORIZON',
+                # The consumer reports the first record it could not apply; earlier ones are not retried
+                FunctionResponseTypes=['ReportBatchItemFailures']
+            )
+            print(f"  ✓ Mapped {mapping['table']} stream → {mapping['lambda_key']}")
+        except lambda_client.exceptions.ResourceConflictException:
+            print(f"  ⚠ Mapping already exists: {mapping['table']} → {mapping['lambda_key']}")
+        except Exception as e:
+            print(f"  ✗ Error mapping {mapping['table']} stream: {e}")
+
+def create_schedules(events, lambda_client, lambda_functions):
+    """Run periodic jobs from EventBridge rules"""
+    print("⏰ Creating schedules...")
+    
+    schedules = [
+        {'lambda_key': 'inventory-updater', 'rule': f'ekart-release-stock-holds-{ENV}', 'expression': 'rate(1 minute)'},
+        {'lambda_key': 'order-archiver', 'rule': f'ekart-archive-orders-{ENV}', 'expression': 'rate(1 day)'}
+    ]
+    
+    for schedule in schedules:
+        if schedule['lambda_key'] not in lambda_functions:
+            print(f"  ⚠ Skipping schedule: {schedule['rule']}")
+            continue
+        try:
+            function_arn = lambda_functions[schedule['lambda_key']]
+            rule_arn = events.put_rule(
+                Name=schedule['rule'],
+                ScheduleExpression=schedule['expression'],
+                State='ENABLED'
+            )['RuleArn']
+            try:
+                lambda_client.add_permission(
+                    FunctionName=function_arn,
+                    StatementId=f"{schedule['rule']}-invoke",
+                    Action='lambda:InvokeFunction',
+                    Principal='events.amazonaws.com',
+                    SourceArn=rule_arn
+                )
+            except lambda_client.exceptions.ResourceConflictException:
+                pass
+            events.put_targets(Rule=schedule['rule'], Targets=[{'Id': '1', 'Arn': function_arn}])
+            print(f"  ✓ Scheduled {schedule['lambda_key']} ({schedule['expression']})")
+        except Exception as e:
+            print(f"  ✗ Error creating schedule {schedule['rule']}: {e}")
+
+def create_event_bus(events, sqs, lambda_client, lambda_functions, queues):
+    """
+    Create the order events bus (fed by outbox-relay) and the rules that fan
+    out from it, to a Lambda (lambda_key) or an SQS queue (queue)
+    """
+    print("📣 Creating event bus...")
+    
+    bus_name = f'ekart-events-{ENV}'
+    try:
+        events.create_event_bus(Name=bus_name)
+        print(f"  ✓ Created event bus: {bus_name}")
+    except events.exceptions.ResourceAlreadyExistsException:
+        print(f"  ⚠ Event bus already exists: {bus_name}")
+    except Exception as e:
+        print(f"  ✗ Error creating event bus {bus_name}: {e}")
+        return
+    
+    rules = [
+        {
+            'lambda_key': 'notification-sender',
+            'rule': f'ekart-notify-order-shipped-{ENV}',
+            'pattern': {
+                'source': ['ekart.orders'],
+                'detail-type': ['OrderStatusChanged'],
+                'detail': {'status': ['shipped', 'delivered']}
+            }
+        },
+        {
+            # Starts each asynchronous checkout's saga from its committed OrderCreated entry
+            'queue': f'ekart-orders-{ENV}',
+            'rule': f'ekart-start-checkout-{ENV}',
+            'pattern': {
+                'source': ['ekart.orders'],
+                'detail-type': ['OrderCreated'],
+                'detail': {'checkout': ['saga']}
+            }
+        }
+    ]
+    
+    for rule in rules:
+        if rule.get('lambda_key') not in lambda_functions and rule.get('queue') not in queues:
+            print(f"  ⚠ Skipping rule: {rule['rule']}")
+            continue
+        try:
+            rule_arn = events.put_rule(
+                Name=rule['rule'],
+                EventBusName=bus_name,
+                EventPattern=json.dumps(rule['pattern']),
+                State='ENABLED'
+            )['RuleArn']
+            if 'queue' in rule:
+                queue = queues[rule['queue']]
+                sqs.set_queue_attributes(QueueUrl=queue['url'], Attributes={'Policy': json.dumps({
+                    'Version': '2012-10-17',
+                    'Statement': [{
+                        'Effect': 'Allow',
+                        'Principal': {'Service': 'events.amazonaws.com'},
+                        'Action': 'sqs:SendMessage',
+                        'Resource': queue['arn'],
+                        'Condition': {'ArnEquals': {'aws:SourceArn': rule_arn}}
+                    }]
+                })})
+                events.put_targets(Rule=rule['rule'], EventBusName=bus_name, Targets=[{'Id': '1', 'Arn': queue['arn']}])
+                print(f"  ✓ Routed {rule['rule']} → {rule['queue']}")
+                continue
+            function_arn = lambda_functions[rule['lambda_key']]
+            try:
+                lambda_client.add_permission(
+                    FunctionName=function_arn,
+                    StatementId=f"{rule['rule']}-invoke",
+                    Action='lambda:InvokeFunction',
+                    Principal='events.amazonaws.com',
+                    SourceArn=rule_arn
+                )
+            except lambda_client.exceptions.ResourceConflictException:
+                pass
+            events.put_targets(Rule=rule['rule'], EventBusName=bus_name, Targets=[{'Id': '1', 'Arn': function_arn}])
+            print(f"  ✓ Routed {rule['rule']} → {rule['lambda_key']}")
+        except Exception as e:
+            print(f"  ✗ Error creating rule {rule['rule']}: {e}")
+
 def create_api_gateway(apigateway, lambda_client, lambda_functions, user_pool_id):
     """Create API Gateway with all routes"""
     print("🌐 Creating API Gateway...")
@@ -424,7 +887,8 @@ def create_api_gateway(apigateway, lambda_client, lambda_functions, user_pool_id
             {'path': 'products', 'lambda_key': 'products-api', 'methods': ['GET', 'POST', 'PUT', 'DELETE']},
             {'path': 'cart', 'lambda_key': 'cart-api', 'methods': ['GET', 'POST', 'PUT', 'DELETE']},
             {'path': 'orders', 'lambda_key': 'orders-api', 'methods': ['GET', 'POST', 'PUT']},
-            {'path': 'payments', 'lambda_key': 'payment-processor', 'methods': ['POST']}
+            {'path': 'payments', 'lambda_key': 'payment-processor', 'methods': ['POST']},
+            {'path': 'sellers', 'lambda_key': 'seller-analytics', 'methods': ['GET']}
         ]
         
         for route in routes:
@@ -600,6 +1064,10 @@ def main():
         create_s3_buckets(clients['s3'])
         print()
         
+        # Create SQS queues
+        queues = create_sqs_queues(clients['sqs'])
+        print()
+        
         # Create Lambda role
         role_arn = create_lambda_role(clients['iam'])
         print()
@@ -609,10 +1077,24 @@ def main():
             clients['lambda_client'],
             role_arn,
             user_pool_id,
-            client_id
+            client_id,
+            queues
         )
         print()
         
+        # Wire queue consumers
+        create_event_source_mappings(clients['lambda_client'], lambda_functions, queues)
+        create_stream_mappings(clients['dynamodb'], clients['lambda_client'], lambda_functions)
+        print()
+        
+        # Schedule periodic jobs
+        create_schedules(clients['events'], clients['lambda_client'], lambda_functions)
+        print()
+        
+        # Order events bus
+        create_event_bus(clients['events'], clients['sqs'], clients['lambda_client'], lambda_functions, queues)
+        print()
+        
         # Create API Gateway
         api_id, api_url = create_api_gateway(
             clients['apigateway'],
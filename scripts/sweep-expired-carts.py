@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Sweep expired carts - delete carts whose expires_at TTL has passed
+DynamoDB TTL deletes them eventually; LocalStack may not enforce TTL at all,
+so this runs a parallel scan and deletes what is due.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+from botocore.exceptions import ClientError
+
+PROJECT_ROOT = Path(__file__).parent.parent
+CONFIG_PATH = PROJECT_ROOT / 'serverless-config.json'
+with open(CONFIG_PATH, 'r') as _cfg_file:
+    _CFG = json.load(_cfg_file)
+
+ENDPOINT = _CFG.get('endpoint')
+REGION = _CFG.get('region', 'us-east-1')
+ENV = _CFG.get('env', 'dev')
+TABLE_NAME = f'ekart-carts-{ENV}'
+
+dynamodb = boto3.resource(
+    'dynamodb',
+    endpoint_url=ENDPOINT,
+    region_name=REGION,
+    aws_access_key_id='test',
+    aws_secret_access_key='test'
+)
+
+def sweep_segment(segment, total_segments, now, dry_run):
+    """Scan one segment and delete its expired carts. Returns (scanned, deleted)"""
+    table = dynamodb.Table(TABLE_NAME)
+    scanned = deleted = 0
+    scan_kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'ProjectionExpression': 'user_id',
+        'FilterExpression': 'expires_at < :now',
+        'ExpressionAttributeValues': {':now': now}
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        scanned += response.get('ScannedCount', 0)
+        for cart in response.get('Items', []):
+            if dry_run:
+                deleted += 1
+                continue
+            try:
+                # Re-checked on delete: a cart touched since the scan has a fresh expires_at
+                table.delete_item(
+                    Key={'user_id': cart['user_id']},
+                    ConditionExpression='expires_at < :now',
+                    ExpressionAttributeValues={':now': now}
+                )
+                deleted += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            return scanned, deleted
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete expired EKart carts')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel scan segments (one thread each)')
+    parser.add_argument('--dry-run', action='store_true', help='Count expired carts without deleting them')
+    args = parser.parse_args()
+
+    now = int(time.time())
+    print(f"🧹 Sweeping expired carts from {TABLE_NAME} ({args.segments} segments)...")
+    with ThreadPoolExecutor(max_workers=args.segments) as executor:
+        results = list(executor.map(
+            lambda segment: sweep_segment(segment, args.segments, now, args.dry_run),
+            range(args.segments)
+        ))
+
+    scanned = sum(r[0] for r in results)
+    deleted = sum(r[1] for r in results)
+    action = 'would delete' if args.dry_run else 'deleted'
+    print(f"  ✓ Scanned {scanned} carts, {action} {deleted}")
+
+if __name__ == '__main__':
+    main()
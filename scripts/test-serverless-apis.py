@@ -6,6 +6,8 @@ Tests all Lambda functions through API Gateway
 import requests
 import json
 import sys
+import time
+import uuid
 
 # Load config
 with open('serverless-config.json', 'r') as f:
@@ -203,6 +205,75 @@ def test_orders_api(token):
     
     return all_passed
 
+def login_as(user_type):
+    """Registers a fresh user of user_type and returns its access token, or None"""
+    user_data = {
+        'email': f"{user_type}-{uuid.uuid4().hex[:8]}@example.com",
+        'password': 'TestPass123!',
+        'first_name': 'Test',
+        'last_name': user_type.title(),
+        'user_type': user_type
+    }
+    requests.post(f"{BASE_URL}/auth/register", json=user_data)
+    r = requests.post(f"{BASE_URL}/auth/login", json={'email': user_data['email'], 'password': user_data['password']})
+    if r.status_code != 200:
+        return None
+    return r.json().get('access_token')
+
+def test_order_cancellation():
+    """Cancelling a confirmed order gives its stock back"""
+    print("\n↩️  Testing order cancellation...")
+    all_passed = True
+    
+    seller_token = login_as('seller')
+    buyer_token = login_as('customer')
+    if not seller_token or not buyer_token:
+        return print_test("Register seller and buyer", False)
+    seller_headers = {'Authorization': f'Bearer {seller_token}'}
+    buyer_headers = {'Authorization': f'Bearer {buyer_token}'}
+    
+    product = {
+        'name': 'Cancellation Test Product',
+        'description': 'Created by test-serverless-apis.py',
+        'price': 9.99,
+        'category': 'test',
+        'stock_quantity': 10
+    }
+    r = requests.post(f"{BASE_URL}/products", headers=seller_headers, json=product)
+    all_passed &= print_test(f"POST /products - Status: {r.status_code}", r.status_code == 201)
+    if r.status_code != 201:
+        return all_passed
+    product_id = r.json()['product_id']
+    
+    r = requests.post(f"{BASE_URL}/cart/items", headers=buyer_headers, json={'product_id': product_id, 'quantity': 3})
+    all_passed &= print_test(f"POST /cart/items - Status: {r.status_code}", r.status_code == 200)
+    r = requests.post(f"{BASE_URL}/orders", headers=buyer_headers, json={'payment_method': 'cod'})
+    all_passed &= print_test(f"POST /orders - Status: {r.status_code}", r.status_code in [201, 202])
+    if r.status_code not in [201, 202]:
+        return all_passed
+    order_id = r.json()['orders'][0]['order_id']
+    
+    # Asynchronous checkout confirms the order from the saga; otherwise the seller does
+    status = 'pending'
+    for _ in range(30 if r.status_code == 202 else 0):
+        status = requests.get(f"{BASE_URL}/orders/{order_id}", headers=buyer_headers).json().get('status')
+        if status != 'pending':
+            break
+        time.sleep(1)
+    if status == 'pending':
+        r = requests.put(f"{BASE_URL}/orders/{order_id}/status", headers=seller_headers, json={'status': 'confirmed'})
+        all_passed &= print_test(f"PUT /orders/{{id}}/status confirmed - Status: {r.status_code}", r.status_code == 200)
+    
+    stock = requests.get(f"{BASE_URL}/products/{product_id}").json().get('stock_quantity')
+    all_passed &= print_test(f"Checkout took the stock - stock_quantity: {stock}", stock == 7)
+    
+    r = requests.put(f"{BASE_URL}/orders/{order_id}/status", headers=seller_headers, json={'status': 'cancelled'})
+    all_passed &= print_test(f"PUT /orders/{{id}}/status cancelled - Status: {r.status_code}", r.status_code == 200)
+    stock = requests.get(f"{BASE_URL}/products/{product_id}").json().get('stock_quantity')
+    all_passed &= print_test(f"Cancel gave the stock back - stock_quantity: {stock}", stock == 10)
+    
+    return all_passed
+
 def test_payments_api():
     """Test Payments API via LocalStack Stripe"""
     print("\n💳 Testing Payments API...")
@@ -244,6 +315,9 @@ def main():
     # Test Orders API (requires auth)
     all_tests_passed &= test_orders_api(token)
     
+    # Test seller cancellation returns stock (registers its own users)
+    all_tests_passed &= test_order_cancellation()
+    
     # Test Payments API (Stripe via LocalStack)
     all_tests_passed &= test_payments_api()
     